@@ -0,0 +1,76 @@
+# Sequence packing for ml/trainer.py --packing: examples laid end to end in max-length blocks,
+# separated by position_ids that restart at 0 (flash-attention varlen style), no 4D attention mask
+import torch
+
+def pack_examples(sequences, max_length, eos_token_id):
+    # each example ends in eos; an example that does not fit is split and its continuation starts the
+    # next block at position 0; the last, shorter block is kept (the collator pads it)
+    blocks, positions, ids, pos = [], [], [], []
+    for seq in sequences:
+        if not seq or seq[-1] != eos_token_id:
+            seq = seq + [eos_token_id]
+        while seq:
+            take = seq[:max_length - len(ids)]
+            ids += take
+            pos += range(len(take))
+            seq = seq[len(take):]
+            if len(ids) == max_length:
+                blocks.append(ids); positions.append(pos)
+                ids, pos = [], []
+    if ids:
+        blocks.append(ids); positions.append(pos)
+    return {'input_ids': blocks, 'position_ids': positions}
+
+class PackedCollator:
+    # input_ids / position_ids / labels only: the first token of each example is not predicted from the
+    # previous one, short blocks are padded at the end (causal attention never looks at the padding) and
+    # pad positions continue the last example so position_ids == 0 marks exactly the example starts
+    def __init__(self, pad_token_id):
+        self.pad_token_id = pad_token_id
+    def __call__(self, features):
+        n = max(len(f['input_ids']) for f in features)
+        input_ids = torch.full((len(features), n), self.pad_token_id, dtype=torch.long)
+        position_ids = torch.zeros((len(features), n), dtype=torch.long)
+        labels = torch.full((len(features), n), -100, dtype=torch.long)
+        for row, f in enumerate(features):
+            k = len(f['input_ids'])
+            input_ids[row, :k] = torch.tensor(f['input_ids'])
+            position_ids[row, :k] = torch.tensor(f['position_ids'])
+            position_ids[row, k:] = position_ids[row, k - 1] + 1 + torch.arange(n - k)
+            labels[row, :k] = input_ids[row, :k].masked_fill(position_ids[row, :k] == 0, -100)
+        return {'input_ids': input_ids, 'position_ids': position_ids, 'labels': labels}
+
+def padding_count(inputs):
+    # padded positions of a training batch: from the attention mask, or for packed batches the
+    # ignored labels that are not example starts
+    mask = inputs.get('attention_mask')
+    if mask is not None and mask.dim() == 2:
+        return int((mask == 0).sum())
+    if 'position_ids' in inputs and 'labels' in inputs:
+        return int((inputs['labels'] == -100).sum() - (inputs['position_ids'] == 0).sum())
+    return 0
+
+def packed_attention(fp16):
+    # attention implementation that keeps packed examples apart using position_ids alone: flash_attention_2
+    # (transformers >= 4.44 detects packed rows from position_ids). Any other implementation would let each
+    # example attend to the ones before it in its block, so a RuntimeError names what is missing instead
+    missing = []
+    try:
+        import flash_attn  # noqa: F401
+    except ImportError:
+        missing.append('flash-attn')
+    if not torch.cuda.is_available():
+        missing.append('a CUDA device')
+    if not fp16:
+        missing.append('--fp16 1')
+    try:
+        import transformers
+        from packaging.version import Version
+        too_old = Version(transformers.__version__) < Version('4.44')
+    except ImportError:
+        too_old = True
+    if too_old:
+        missing.append('transformers>=4.44')
+    if missing:
+        raise RuntimeError('packed examples are kept apart only by flash_attention_2, which needs ' + ', '.join(missing))
+    return 'flash_attention_2'
@@ -0,0 +1,102 @@
+"""
+Tests for ml/packing.py (sequence packing used by trainer.py --packing)
+Usage: python -m pytest ml/test_packing.py
+"""
+
+import sys
+import types
+import unittest
+from unittest import mock
+
+import torch
+
+from packing import PackedCollator, pack_examples, packed_attention, padding_count
+
+EOS = 0
+PAD = 0
+
+
+class PackExamplesTest(unittest.TestCase):
+    def test_blocks_restart_positions_at_each_example(self):
+        packed = pack_examples([[5, 6, 0], [7, 8, 9]], max_length=4, eos_token_id=EOS)
+        # [5 6 0 7] [8 9 0]: the second example is split and its continuation starts at position 0
+        self.assertEqual(packed['input_ids'], [[5, 6, 0, 7], [8, 9, 0]])
+        self.assertEqual(packed['position_ids'], [[0, 1, 2, 0], [0, 1, 2]])
+
+    def test_keeps_the_tail(self):
+        sequences = [[1, 2, 3]] * 5
+        packed = pack_examples(sequences, max_length=6, eos_token_id=EOS)
+        tokens = sum(len(block) for block in packed['input_ids'])
+        self.assertEqual(tokens, 5 * 4)
+        self.assertEqual([len(block) for block in packed['input_ids']], [6, 6, 6, 2])
+
+    def test_long_example_spans_several_blocks(self):
+        packed = pack_examples([list(range(1, 10))], max_length=4, eos_token_id=EOS)
+        self.assertEqual(packed['input_ids'], [[1, 2, 3, 4], [5, 6, 7, 8], [9, 0]])
+        self.assertTrue(all(pos[0] == 0 for pos in packed['position_ids']))
+
+
+class PackedCollatorTest(unittest.TestCase):
+    def setUp(self):
+        packed = pack_examples([[5, 6, 0], [7, 8, 9, 0], [4]], max_length=5, eos_token_id=EOS)
+        self.features = [{'input_ids': ids, 'position_ids': pos}
+                         for ids, pos in zip(packed['input_ids'], packed['position_ids'])]
+        self.batch = PackedCollator(PAD)(self.features)
+
+    def test_no_attention_mask(self):
+        self.assertEqual(set(self.batch), {'input_ids', 'position_ids', 'labels'})
+        self.assertEqual(self.batch['input_ids'].shape, (2, 5))
+        self.assertEqual(self.batch['input_ids'].dtype, torch.long)
+
+    def test_labels_ignore_example_starts_and_padding(self):
+        labels = self.batch['labels'].tolist()
+        # [5 6 0 7 8] / [9 0 4 0 <pad>]
+        self.assertEqual(labels[0], [-100, 6, 0, -100, 8])
+        self.assertEqual(labels[1], [-100, 0, -100, 0, -100])
+
+    def test_padding_continues_last_example(self):
+        positions = self.batch['position_ids'].tolist()
+        self.assertEqual(positions[1], [0, 1, 0, 1, 2])
+        self.assertEqual(padding_count(self.batch), 1)
+
+    def test_padding_count_from_attention_mask(self):
+        inputs = {'input_ids': torch.ones(2, 3), 'attention_mask': torch.tensor([[1, 1, 0], [1, 0, 0]])}
+        self.assertEqual(padding_count(inputs), 3)
+
+
+class PackedAttentionTest(unittest.TestCase):
+    def available(self, flash_attn=True, cuda=True, transformers_version='4.44.0'):
+        """Pretend flash-attn / CUDA / transformers are (or are not) installed"""
+        modules = {'flash_attn': types.ModuleType('flash_attn') if flash_attn else None,
+                   'transformers': types.SimpleNamespace(__version__=transformers_version)}
+        stack = mock.patch.dict(sys.modules, modules)
+        stack.start()
+        self.addCleanup(stack.stop)
+        cuda_patch = mock.patch.object(torch.cuda, 'is_available', return_value=cuda)
+        cuda_patch.start()
+        self.addCleanup(cuda_patch.stop)
+
+    def test_flash_attention_when_everything_is_available(self):
+        self.available()
+        self.assertEqual(packed_attention(fp16=True), 'flash_attention_2')
+
+    def test_refuses_without_mixed_precision(self):
+        self.available()
+        with self.assertRaisesRegex(RuntimeError, '--fp16 1'):
+            packed_attention(fp16=False)
+
+    def test_refuses_without_flash_attn_or_cuda(self):
+        self.available(flash_attn=False, cuda=False)
+        with self.assertRaises(RuntimeError) as raised:
+            packed_attention(fp16=True)
+        self.assertIn('flash-attn', str(raised.exception))
+        self.assertIn('CUDA', str(raised.exception))
+
+    def test_refuses_old_transformers(self):
+        self.available(transformers_version='4.43.2')
+        with self.assertRaisesRegex(RuntimeError, 'transformers>=4.44'):
+            packed_attention(fp16=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,20 @@
-import argparse, os
+import argparse, json, os, shutil, sys, tempfile, threading, time
+from datetime import datetime
+import torch
 from datasets import load_from_disk, load_dataset
-from transformers import AutoTokenizer, AutoModelForCausalLM, TrainingArguments, Trainer, DataCollatorForLanguageModeling
+from datasets.fingerprint import Hasher
+from transformers import AutoTokenizer, AutoModelForCausalLM, TrainingArguments, Trainer, DataCollatorForLanguageModeling, TrainerCallback
+from transformers.trainer_utils import get_last_checkpoint
+from packing import PackedCollator, pack_examples, packed_attention, padding_count
 try:
     from peft import LoraConfig, get_peft_model
     USE_LORA = True
 except:
     USE_LORA = False
+try:
+    import psutil
+except ImportError:
+    psutil = None
 
 p = argparse.ArgumentParser()
 p.add_argument('--model', required=True)
@@ -15,62 +24,285 @@ p.add_argument('--epochs', type=int, default=3)
 p.add_argument('--lr', type=float, default=2e-5)
 p.add_argument('--batch', type=int, default=4)
 p.add_argument('--fp16', type=int, default=1)
+p.add_argument('--max-length', type=int, default=1024)
+batching = p.add_mutually_exclusive_group()
+batching.add_argument('--packing', action='store_true', help='concatenate examples into max-length blocks (needs flash-attn, CUDA and --fp16 1 so attention stays within each example)')
+batching.add_argument('--group-by-length', action='store_true', help='batch examples of similar length to cut padding')
+p.add_argument('--num-proc', type=int, default=os.cpu_count() or 1, help='processes for tokenization / packing')
+p.add_argument('--tokenized-cache', default=os.getenv('TOKENIZED_CACHE_DIR', os.path.expanduser('~/.cache/persian-ml-tokenized')))
+p.add_argument('--pretokenize-only', action='store_true', help='tokenize into the cache and exit without loading the model')
+p.add_argument('--streaming', action='store_true', help='iterate the dataset with on-the-fly tokenization instead of materializing it')
+p.add_argument('--shuffle-buffer', type=int, default=10000, help='shuffle buffer size in --streaming mode')
+p.add_argument('--max-steps', type=int, default=-1, help='total optimizer steps (required with --streaming)')
+p.add_argument('--logging-steps', type=int, default=10)
+p.add_argument('--progress-fd', type=int, help='write JSON-lines progress events to this inherited file descriptor')
+p.add_argument('--control-stdin', action='store_true', help='read pause/resume/stop commands from stdin')
 args = p.parse_args()
+if args.streaming and args.max_steps <= 0:
+    p.error('--streaming needs --max-steps (an iterable dataset has no length)')
+if args.streaming and (args.group_by_length or args.pretokenize_only):
+    p.error('--group-by-length and --pretokenize-only need a materialized dataset')
+# packed examples attend only within themselves under flash_attention_2; refuse to train on packed blocks
+# with any other attention implementation instead of letting examples attend across their boundaries
+attn = None
+if args.packing and not args.pretokenize_only:
+    try:
+        attn = packed_attention(args.fp16)
+    except RuntimeError as e:
+        p.error(f'--packing: {e}; use --group-by-length instead')
+
+# structured events (same schema as server/training_worker.py) go to --progress-fd, one JSON object per line;
+# without it the plain-text lines below are printed on stdout
+progress_out = os.fdopen(args.progress_fd, 'w', buffering=1) if args.progress_fd is not None else None
+TEXT_EVENTS = {
+    'progress': lambda e: f"PROGRESS step={e['metrics']['step']}/{e['total']} loss={e['metrics']['trainLoss']:.4f}",
+    'paused': lambda e: "PAUSED",
+    'resumed': lambda e: "RESUMED",
+    'stopped': lambda e: "STOPPED",
+    'completed': lambda e: "DONE",
+}
+
+def emit(event, **fields):
+    if progress_out is not None:
+        progress_out.write(json.dumps({'event': event, **fields}) + '\n')
+    elif event in TEXT_EVENTS:
+        print(TEXT_EVENTS[event](fields), flush=True)
 
 os.makedirs(args.output, exist_ok=True)
+# auto-resume from the newest checkpoint-* in the output directory
+resume = get_last_checkpoint(args.output)
 tokenizer = AutoTokenizer.from_pretrained(args.model, use_fast=True)
 if tokenizer.pad_token is None:
     tokenizer.pad_token = tokenizer.eos_token
 
 if os.path.isdir(args.dataset):
     ds = load_from_disk(args.dataset)
+    if args.streaming:
+        ds = {split: d.to_iterable_dataset(num_shards=max(1, args.num_proc)) for split, d in ds.items()}
 else:
-    ds = load_dataset(args.dataset)
+    ds = load_dataset(args.dataset, streaming=args.streaming)
 
 def tok(ex):
-    return tokenizer(ex['text'], truncation=True, max_length=1024)
-cols = [c for c in ds['train'].column_names if c != 'text']
-ds = ds.map(tok, batched=True, remove_columns=cols)
+    out = tokenizer(ex['text'], truncation=True, max_length=args.max_length)
+    out['length'] = [len(ids) for ids in out['input_ids']]
+    return out
+
+def pack(batch):
+    # max_length blocks with position_ids restarting at every example (see packing.py); the tail of each
+    # map batch becomes one shorter block instead of being dropped
+    return pack_examples(batch['input_ids'], args.max_length, tokenizer.eos_token_id)
+
+def stream(split, skip=0):
+    # shuffle buffer -> skip already consumed samples -> tokenize (-> pack) lazily, one batch at a time;
+    # without packing the skip happens before tokenization, so resuming does not re-tokenize consumed samples
+    d = ds[split].shuffle(seed=42, buffer_size=args.shuffle_buffer) if split == 'train' else ds[split]
+    if skip and not args.packing:
+        d = d.skip(skip)
+    d = d.map(tok, batched=True).select_columns(['input_ids', 'attention_mask'])
+    if args.packing:
+        d = d.map(pack, batched=True, remove_columns=['input_ids', 'attention_mask'])
+        if skip:
+            d = d.skip(skip)
+    return d
+
+if args.streaming:
+    consumed = 0
+    if resume:
+        with open(os.path.join(resume, 'trainer_state.json')) as f:
+            # samples (or packed blocks) the checkpointed run already trained on
+            consumed = json.load(f)['global_step'] * args.batch
+        print(f"Resuming stream after {consumed} consumed samples", flush=True)
+    ds = {split: stream(split, consumed if split == 'train' else 0) for split in ds}
+else:
+    # bump when tok/pack change what they produce
+    TOKENIZED_CACHE_VERSION = 2
+    # tokenized (and packed) splits are saved once per tokenizer + dataset fingerprint + max_length + packing,
+    # so restarts, auto-resume and other training nodes load them memory-mapped instead of re-tokenizing
+    key = Hasher.hash([Hasher.hash(tokenizer), {split: d._fingerprint for split, d in ds.items()},
+                       args.max_length, args.packing, TOKENIZED_CACHE_VERSION])
+    cache_dir = os.path.join(args.tokenized_cache, key)
+    if os.path.isdir(cache_dir):
+        ds = load_from_disk(cache_dir)
+        print(f"Loaded tokenized dataset from {cache_dir}", flush=True)
+    else:
+        if args.num_proc > 1:
+            os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+        num_proc = args.num_proc if args.num_proc > 1 else None
+        cols = [c for c in ds['train'].column_names if c != 'text']
+        ds = ds.map(tok, batched=True, remove_columns=cols, num_proc=num_proc)
+        if args.packing:
+            ds = ds.map(pack, batched=True, remove_columns=ds['train'].column_names, num_proc=num_proc)
+        os.makedirs(args.tokenized_cache, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=args.tokenized_cache, prefix=f'.{key}-')
+        try:
+            ds.save_to_disk(tmp)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        try:
+            os.rename(tmp, cache_dir)
+        except OSError:
+            # another node saved the same key first
+            shutil.rmtree(tmp, ignore_errors=True)
+        ds = load_from_disk(cache_dir)
+        print(f"Saved tokenized dataset to {cache_dir}", flush=True)
 
-model = AutoModelForCausalLM.from_pretrained(args.model)
+if args.pretokenize_only:
+    print(f"TOKENIZED path={cache_dir} " + " ".join(f"{split}={len(d)}" for split, d in ds.items()), flush=True)
+    sys.exit(0)
+
+# safetensors weights are read straight from the file instead of unpickled, and low_cpu_mem_usage skips the
+# random init; each process still copies the tensors into its own parameters (no sharing between workers)
+has_safetensors = os.path.isdir(args.model) and any(f.endswith('.safetensors') for f in os.listdir(args.model))
+model = AutoModelForCausalLM.from_pretrained(args.model, use_safetensors=True if has_safetensors else None,
+                                             low_cpu_mem_usage=True, **({'attn_implementation': attn} if attn else {}))
 if USE_LORA:
     cfg = LoraConfig(r=8, lora_alpha=16, lora_dropout=0.05, bias="none", task_type="CAUSAL_LM")
     model = get_peft_model(model, cfg)
 
-collator = DataCollatorForLanguageModeling(tokenizer=tokenizer, mlm=False)
+collator = PackedCollator(tokenizer.pad_token_id) if args.packing else DataCollatorForLanguageModeling(tokenizer=tokenizer, mlm=False)
 train_args = TrainingArguments(
     output_dir=args.output,
     per_device_train_batch_size=args.batch,
     num_train_epochs=args.epochs,
     learning_rate=args.lr,
     fp16=bool(args.fp16),
-    logging_steps=10,
+    logging_steps=args.logging_steps,
     save_steps=200,
     save_total_limit=2,
+    max_steps=args.max_steps,
+    # in --streaming mode the stream itself skips consumed samples on resume
+    ignore_data_skip=args.streaming,
+    group_by_length=args.group_by_length,
+    length_column_name='length',
     report_to=[]
 )
 
-class ProgCb:
-    def on_log(self, args2, state, control):
-        if state.log_history and 'loss' in state.log_history[-1] and 'step' in state.log_history[-1]:
-            lh = state.log_history[-1]
-            total = state.max_steps if state.max_steps is not None else 0
-            print(f"PROGRESS step={lh['step']}/{total} loss={lh['loss']:.4f}", flush=True)
+class StatsTrainer(Trainer):
+    # counts real vs padded positions of every training batch; tokens/sec and padding ratio go into the logs
+    def __init__(self, *a, **kw):
+        super().__init__(*a, **kw)
+        self.tokens = self.padding = 0
+        self.started = None
+    def training_step(self, model, inputs, *a, **kw):
+        if self.started is None:
+            self.started = time.perf_counter()
+        total = inputs['input_ids'].numel()
+        pad = padding_count(inputs)
+        self.tokens += total - pad
+        self.padding += pad
+        return super().training_step(model, inputs, *a, **kw)
+    def throughput(self):
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        seen = self.tokens + self.padding
+        return (self.tokens / elapsed if elapsed else 0.0), (self.padding / seen if seen else 0.0)
+    def log(self, logs, *a, **kw):
+        if 'loss' in logs:
+            logs['tokens_per_sec'], logs['padding_ratio'] = self.throughput()
+        super().log(logs, *a, **kw)
+
+def memory_mb():
+    # current (not peak) memory: allocated CUDA memory, else the process RSS; omitted without psutil
+    if torch.cuda.is_available():
+        return torch.cuda.memory_allocated() / 2**20
+    return psutil.Process().memory_info().rss / 2**20 if psutil is not None else None
+
+class ProgCb(TrainerCallback):
+    # one progress event per logging step: loss, LR, grad norm, tokens/s (StatsTrainer), samples/s, memory, ETA
+    def on_train_begin(self, args2, state, control, **kwargs):
+        self.started, self.first_step = time.perf_counter(), state.global_step
+        self.loss = self.val_loss = None
+        emit('started', message='Training started')
+    def on_evaluate(self, args2, state, control, metrics=None, **kwargs):
+        self.val_loss = (metrics or {}).get('eval_loss', self.val_loss)
+    def on_log(self, args2, state, control, logs=None, **kwargs):
+        logs = logs or {}
+        if 'loss' not in logs:
+            return
+        step, total = state.global_step, state.max_steps or 0
+        elapsed = time.perf_counter() - self.started
+        steps_per_sec = (step - self.first_step) / elapsed if elapsed > 0 else 0.0
+        metrics = {
+            'step': step,
+            'epoch': state.epoch,
+            'trainLoss': logs['loss'],
+            'valLoss': self.val_loss,
+            'learningRate': logs.get('learning_rate'),
+            'gradientNorm': logs.get('grad_norm'),
+            'throughput': logs.get('tokens_per_sec'),
+            'paddingRatio': logs.get('padding_ratio'),
+            'samplesPerSec': steps_per_sec * args2.per_device_train_batch_size * args2.gradient_accumulation_steps,
+            'memoryMb': memory_mb(),
+            'etaSeconds': (total - step) / steps_per_sec if steps_per_sec and total else None,
+        }
+        self.loss = logs['loss']
+        emit('progress', progress=step / total * 100 if total else 0, total=total,
+             message=f"Training step {step}/{total}...", metrics={k: v for k, v in metrics.items() if v is not None})
+    def on_save(self, args2, state, control, **kwargs):
+        path = os.path.join(args2.output_dir, f"checkpoint-{state.global_step}")
+        size = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+        job = os.path.basename(os.path.normpath(args2.output_dir))
+        metrics = {'step': state.global_step, 'trainLoss': self.loss, 'valLoss': self.val_loss}
+        emit('checkpoint', checkpoint={
+            'id': f"ckpt-{job}-{state.global_step}",
+            'name': f"{job}-step-{state.global_step}",
+            'path': path,
+            'createdAt': datetime.now().isoformat(),
+            'size': size,
+            'metrics': {k: v for k, v in metrics.items() if v is not None},
+        })
 
-trainer = Trainer(
+class ControlCb(TrainerCallback):
+    # pause/resume/stop from the training scheduler, one command per line on stdin
+    def __init__(self):
+        self.stopped = threading.Event()
+        self.running = threading.Event()
+        self.running.set()
+        threading.Thread(target=self.listen, daemon=True).start()
+    def listen(self):
+        for line in sys.stdin:
+            cmd = line.strip()
+            if cmd == 'pause':
+                self.running.clear()
+            elif cmd == 'resume':
+                self.running.set()
+            elif cmd == 'stop':
+                break
+        self.stopped.set()
+        self.running.set()
+    def on_step_end(self, args2, state, control, **kwargs):
+        if not self.running.is_set():
+            emit('paused')
+            self.running.wait()
+            if not self.stopped.is_set():
+                emit('resumed')
+        if self.stopped.is_set():
+            # checkpoint so a later run resumes from this step
+            control.should_save = True
+            control.should_training_stop = True
+        return control
+
+callbacks = [ProgCb()]
+ctl = ControlCb() if args.control_stdin else None
+if ctl:
+    callbacks.append(ctl)
+
+trainer = StatsTrainer(
     model=model,
     args=train_args,
     train_dataset=ds['train'],
     eval_dataset=ds['validation'] if 'validation' in ds else None,
     data_collator=collator,
     tokenizer=tokenizer,
-    callbacks=[ProgCb()]
+    callbacks=callbacks
 )
 
-resume = None
-if os.path.exists(os.path.join(args.output, 'trainer_state.json')):
-    resume = True
 trainer.train(resume_from_checkpoint=resume)
 trainer.save_model(args.output)
 tokenizer.save_pretrained(args.output)
-print("DONE", flush=True)
+tokens_per_sec, padding_ratio = trainer.throughput()
+print(f"THROUGHPUT tokens_per_sec={tokens_per_sec:.1f} padding_ratio={padding_ratio:.4f} tokens={trainer.tokens}", flush=True)
+if ctl and ctl.stopped.is_set():
+    emit('stopped', message='Training stopped')
+else:
+    emit('completed', message='Training completed successfully!')
@@ -0,0 +1,210 @@
+"""
+Auto-tuning jobs for the ML Training Platform
+هر study در پس‌زمینه اجرا می‌شود و trialها به‌صورت موازی در process pool ارزیابی می‌شوند
+"""
+
+import asyncio
+import importlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+from loguru import logger
+
+# optuna فقط هنگام اجرای اولین study بارگذاری می‌شود (نه هنگام شروع سرور و نه در worker ها)
+if TYPE_CHECKING:
+    import optuna
+
+MAX_CONCURRENT_JOBS = int(os.getenv("AUTOTUNING_MAX_CONCURRENT_JOBS", "2"))
+MAX_QUEUED_JOBS = int(os.getenv("AUTOTUNING_MAX_QUEUED_JOBS", "20"))
+MAX_PARALLEL_TRIALS = int(os.getenv("AUTOTUNING_MAX_PARALLEL_TRIALS", str(os.cpu_count() or 2)))
+# job های تمام‌شده‌ی قدیمی‌تر از این تعداد از حافظه حذف می‌شوند
+MAX_FINISHED_JOBS = int(os.getenv("AUTOTUNING_MAX_FINISHED_JOBS", "100"))
+
+FINISHED_STATES = ("completed", "failed", "cancelled")
+
+
+def evaluate_trial(params: Dict[str, Any]) -> float:
+    """Score one hyperparameter configuration (runs inside a worker process)"""
+    # Simulate training with these hyperparameters
+    # In real implementation, this would actually train the model
+    return params["learningRate"] * 100 + (1 / params["batchSize"]) * 10
+
+
+def suggest_params(trial: "optuna.trial.Trial", search_space: Dict[str, List[Any]]) -> Dict[str, Any]:
+    """Sample hyperparameters from search space"""
+    return {
+        "learningRate": trial.suggest_float("learningRate", 1e-5, 1e-2, log=True),
+        "batchSize": trial.suggest_categorical("batchSize", search_space.get("batchSize", [16, 32, 64])),
+        "optimizer": trial.suggest_categorical("optimizer", search_space.get("optimizer", ["adam", "adamw"])),
+    }
+
+
+class AutoTuner:
+    """Runs Optuna studies as background jobs with bounded concurrency
+
+    Each running study evaluates its trials in its own spawn process pool of
+    `parallelism` workers, so cancelling a study can kill its running trials
+    without touching the others. Finished jobs beyond max_finished_jobs are
+    evicted, oldest first.
+    """
+
+    def __init__(
+        self,
+        max_concurrent_jobs: int = MAX_CONCURRENT_JOBS,
+        max_parallel_trials: int = MAX_PARALLEL_TRIALS,
+        max_queued_jobs: int = MAX_QUEUED_JOBS,
+        max_finished_jobs: int = MAX_FINISHED_JOBS,
+        on_update: Optional[Callable[[str, Dict], None]] = None,
+    ):
+        self.jobs: Dict[str, Dict] = {}
+        self.max_parallel_trials = max(1, max_parallel_trials)
+        self.max_queued_jobs = max_queued_jobs
+        self.max_finished_jobs = max(0, max_finished_jobs)
+        self._slots = asyncio.Semaphore(max(1, max_concurrent_jobs))
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._executors: Dict[str, ProcessPoolExecutor] = {}
+        self._on_update = on_update
+
+    def _new_executor(self, workers: int) -> ProcessPoolExecutor:
+        # spawn تا worker ها حالت event loop و thread های سرور را به ارث نبرند
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+    @staticmethod
+    def _terminate(executor: ProcessPoolExecutor):
+        """Cancel queued trials and kill running workers without waiting (also for a broken pool)"""
+        # فهرست process ها قبل از shutdown گرفته می‌شود چون shutdown آن را پاک می‌کند
+        processes = list((getattr(executor, "_processes", None) or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    def _evict_finished(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job["status"] in FINISHED_STATES]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self.jobs[job_id]
+
+    def active_count(self) -> int:
+        return sum(1 for job in self.jobs.values() if job["status"] not in FINISHED_STATES)
+
+    def submit(self, base_model: str, datasets: List[str], budget: int, metric: str,
+               search_space: Dict[str, List[Any]], parallelism: Optional[int] = None) -> Dict:
+        """Queue a new study and return its job record"""
+        if self.active_count() >= self.max_queued_jobs:
+            raise RuntimeError("Too many auto-tuning jobs queued")
+
+        job_id = f"tune-{datetime.now().timestamp()}"
+        self.jobs[job_id] = {
+            "id": job_id,
+            "status": "queued",
+            "message": "Waiting for a free auto-tuning slot...",
+            "baseModel": base_model,
+            "datasets": datasets,
+            "budget": budget,
+            "metric": metric,
+            "searchSpace": search_space,
+            "parallelism": max(1, min(parallelism or self.max_parallel_trials, self.max_parallel_trials, budget)),
+            "startTime": datetime.now().isoformat(),
+            "trials": [],
+            "bestConfig": None,
+            "bestScore": None,
+        }
+        self._tasks[job_id] = asyncio.create_task(self._run(job_id))
+        return self.jobs[job_id]
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running study; finished trials are kept"""
+        job = self.jobs[job_id]
+        if job["status"] in FINISHED_STATES:
+            return False
+        task = self._tasks.get(job_id)
+        if task is not None:
+            task.cancel()
+        return True
+
+    def _publish(self, job_id: str, event: Dict):
+        if self._on_update is not None:
+            self._on_update(job_id, event)
+
+    async def _run(self, job_id: str):
+        job = self.jobs[job_id]
+        pending: Dict[asyncio.Future, "optuna.trial.Trial"] = {}
+        try:
+            async with self._slots:
+                job["status"] = "running"
+                job["message"] = "Running trials..."
+                self._publish(job_id, {"type": "status", "status": "running"})
+
+                loop = asyncio.get_running_loop()
+                optuna = await loop.run_in_executor(None, importlib.import_module, "optuna")
+                study = optuna.create_study(direction="minimize")
+                executor = self._executors[job_id] = self._new_executor(job["parallelism"])
+                asked = 0
+
+                while asked < job["budget"] or pending:
+                    while asked < job["budget"] and len(pending) < job["parallelism"]:
+                        trial = study.ask()
+                        params = suggest_params(trial, job["searchSpace"])
+                        pending[loop.run_in_executor(executor, evaluate_trial, params)] = trial
+                        asked += 1
+
+                    done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for future in done:
+                        trial = pending.pop(future)
+                        result = {"id": trial.number, "config": trial.params, "score": None, "state": "complete"}
+                        try:
+                            result["score"] = future.result()
+                            study.tell(trial, result["score"])
+                        except BrokenProcessPool:
+                            # یک worker از کار افتاد؛ pool این job در finally بسته می‌شود
+                            raise
+                        except Exception as e:
+                            logger.warning(f"Auto-tuning {job_id} trial {trial.number} failed: {str(e)}")
+                            study.tell(trial, state=optuna.trial.TrialState.FAIL)
+                            result["state"] = "failed"
+
+                        job["trials"].append(result)
+                        if result["score"] is not None and (job["bestScore"] is None or result["score"] < job["bestScore"]):
+                            job["bestScore"] = result["score"]
+                            job["bestConfig"] = result["config"]
+                        self._publish(job_id, {"type": "trial", "trial": result,
+                                                     "bestScore": job["bestScore"], "completed": len(job["trials"])})
+
+            job["status"] = "completed"
+            job["message"] = "Auto-tuning completed"
+            logger.info(f"Auto-tuning {job_id} completed. Best score: {job['bestScore']}")
+
+        except asyncio.CancelledError:
+            job["status"] = "cancelled"
+            job["message"] = "Auto-tuning cancelled"
+            logger.info(f"Auto-tuning {job_id} cancelled after {len(job['trials'])} trials")
+
+        except Exception as e:
+            logger.error(f"Auto-tuning {job_id} failed: {str(e)}")
+            job["status"] = "failed"
+            job["message"] = str(e)
+
+        finally:
+            self._tasks.pop(job_id, None)
+            # trial های صف‌شده لغو می‌شوند و خطای trial های هم‌زمان با pool خراب خوانده می‌شود
+            for future in pending:
+                if not future.cancel() and not future.cancelled():
+                    future.exception()
+            executor = self._executors.pop(job_id, None)
+            if executor is not None:
+                self._terminate(executor)
+            job["endTime"] = datetime.now().isoformat()
+            self._publish(job_id, {"type": "status", "status": job["status"], "bestConfig": job["bestConfig"],
+                                         "bestScore": job["bestScore"]})
+            self._evict_finished()
+
+    def shutdown(self):
+        for task in list(self._tasks.values()):
+            task.cancel()
+        for executor in self._executors.values():
+            self._terminate(executor)
+        self._executors.clear()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+بنچمارک تأخیر و توان سرویس inference
+مسیر قبلی (load_model برای هر درخواست)، مدل cache شده بدون batching و با micro-batching مقایسه می‌شوند
+درخواست‌ها از --concurrency کلاینت هم‌زمان با متن‌های پوشه‌ی datasets/ ارسال می‌شوند
+Usage: python bench_inference.py --model models/final_<job_id>.h5 [--requests 2000] [--concurrency 32]
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+from bench_preprocess import load_corpus
+from inference import InferenceService, ModelCache, artifacts_path, load_keras_model
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def report(label: str, latencies: List[float], elapsed: float):
+    print(f"{label:<24} {len(latencies) / elapsed:>9.1f} req/s   "
+          f"p50 {statistics.median(latencies) * 1000:7.1f} ms   "
+          f"p95 {percentile(latencies, 0.95) * 1000:7.1f} ms   "
+          f"p99 {percentile(latencies, 0.99) * 1000:7.1f} ms")
+
+
+def bench_uncached(model_path: str, texts: List[str], requests: int):
+    """Every request loads the model again, as predict_with_model used to"""
+    latencies = []
+    started = time.perf_counter()
+    for i in range(requests):
+        begin = time.perf_counter()
+        ModelCache().get(model_path).predict([texts[i % len(texts)]])
+        latencies.append(time.perf_counter() - begin)
+    report("load per request", latencies, time.perf_counter() - started)
+
+
+async def bench_service(label: str, service: InferenceService, model_path: str, texts: List[str],
+                        requests: int, concurrency: int):
+    latencies: List[float] = []
+    counter = iter(range(requests))
+
+    async def client():
+        for i in counter:
+            begin = time.perf_counter()
+            await service.predict(model_path, [texts[i % len(texts)]])
+            latencies.append(time.perf_counter() - begin)
+
+    # بارگذاری مدل جزو اندازه‌گیری نیست
+    await service.predict(model_path, texts[:1])
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    report(label, latencies, time.perf_counter() - started)
+    stats = service.stats()
+    print(f"{'':<24} {stats['batches']} batches, mean batch size {stats['meanBatchSize']:.1f}")
+    service.close()
+
+
+async def main_async(args):
+    texts = load_corpus()
+    cache = ModelCache(loader=load_keras_model)
+
+    if args.uncached_requests:
+        bench_uncached(args.model, texts, args.uncached_requests)
+    await bench_service("cached, batch size 1", InferenceService(cache, max_batch_size=1),
+                        args.model, texts, args.requests, args.concurrency)
+    for max_wait in args.max_wait_ms:
+        service = InferenceService(cache, max_batch_size=args.max_batch_size, max_wait_ms=max_wait)
+        await bench_service(f"batched, wait {max_wait:g} ms", service,
+                            args.model, texts, args.requests, args.concurrency)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inference latency / throughput benchmark")
+    parser.add_argument("--model", required=True, help="Keras model saved by ml-integration.py (with its .tokenizer.json)")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, nargs="+", default=[2.0, 5.0, 10.0])
+    parser.add_argument("--uncached-requests", type=int, default=20, help="Requests for the load-per-request baseline (0 to skip)")
+    args = parser.parse_args()
+
+    if not artifacts_path(args.model).exists():
+        parser.error(f"{artifacts_path(args.model)} not found; models trained before the inference service have no saved tokenizer")
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+بنچمارک توان پیش‌پردازش متن فارسی (متن در ثانیه)
+مسیر قبلی (Tokenizer کراس: fit_on_texts + texts_to_sequences + pad_sequences) در برابر PersianTextEncoder
+روی دیتاست‌های پوشه‌ی datasets/ که برای حجم کافی --repeat بار تکرار می‌شوند
+Usage: python bench_preprocess.py [--repeat 500] [--workers 1 4] [--max-length 128]
+"""
+
+import argparse
+import os
+import time
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from dataset_stream import iter_records
+from persian_text import CHUNK_SIZE, PersianTextEncoder
+
+DATASETS_DIR = Path(__file__).resolve().parent.parent / "datasets"
+TEXT_FIELDS = ("text", "persian", "fa", "question", "verses", "source")
+KERAS_FILTERS = '!"#$%&()*+,-./:;<=>?@[\\]^_`{|}~\t\n'
+
+
+def load_corpus() -> list:
+    texts = []
+    for path in sorted(DATASETS_DIR.rglob("*")):
+        if not path.is_file() or path.suffix == ".md":
+            continue
+        for record in iter_records(str(path)):
+            text = next((record[f] for f in TEXT_FIELDS if record.get(f)), None)
+            if text:
+                texts.append("\n".join(text) if isinstance(text, list) else text)
+    return texts
+
+
+def keras_path(texts, num_words: int, max_length: int) -> np.ndarray:
+    """The previous preprocess_persian_text; a pure-Python equivalent when TensorFlow is not installed"""
+    try:
+        from tensorflow import keras
+    except ImportError:
+        keras = None
+
+    if keras is not None:
+        tokenizer = keras.preprocessing.text.Tokenizer(num_words=num_words, filters=KERAS_FILTERS, lower=True)
+        tokenizer.fit_on_texts(texts)
+        return keras.preprocessing.sequence.pad_sequences(
+            tokenizer.texts_to_sequences(texts), maxlen=max_length, padding="post")
+
+    table = str.maketrans({c: " " for c in KERAS_FILTERS})
+    split = lambda text: text.lower().translate(table).split()  # noqa: E731
+    counts = Counter()
+    for text in texts:
+        counts.update(split(text))
+    index = {w: i for i, (w, _) in enumerate(sorted(counts.items(), key=lambda item: -item[1]), start=1)}
+    out = np.zeros((len(texts), max_length), dtype=np.int32)
+    for row, text in enumerate(texts):
+        ids = [index[w] for w in split(text) if index[w] < num_words][-max_length:]
+        out[row, :len(ids)] = ids
+    return out
+
+
+def timed(func, *args) -> float:
+    started = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Persian preprocessing throughput (texts/sec)")
+    parser.add_argument("--repeat", type=int, default=500, help="Times the bundled corpora are repeated")
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, os.cpu_count() or 1}))
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--max-length", type=int, default=128)
+    parser.add_argument("--num-words", type=int, default=10000)
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    texts = corpus * args.repeat
+    print(f"{len(corpus)} texts from {DATASETS_DIR} x {args.repeat} = {len(texts)} texts")
+
+    baseline = timed(keras_path, texts, args.num_words, args.max_length)
+    print(f"{'keras Tokenizer':<28} {len(texts) / baseline:>10.0f} texts/s")
+
+    for workers in args.workers:
+        encoder = PersianTextEncoder(num_words=args.num_words, workers=workers, chunk_size=args.chunk_size)
+        elapsed = timed(encoder.fit_encode, texts, args.max_length)
+        label = f"PersianTextEncoder x{workers}"
+        print(f"{label:<28} {len(texts) / elapsed:>10.0f} texts/s  ({baseline / elapsed:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
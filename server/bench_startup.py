@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+بنچمارک زمان شروع و حافظه‌ی سرور FastAPI
+هر اجرا در یک process تازه: import شدن main، اجرای startup و اولین پاسخ /api/models اندازه‌گیری می‌شود
+Usage: python bench_startup.py [--runs 5] [--max-seconds 1.0] [--max-rss-mb 200]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+SERVER_DIR = Path(__file__).resolve().parent
+
+# فریم‌ورک‌هایی که نباید هنگام شروع سرور بارگذاری شوند
+HEAVY_MODULES = ["torch", "optuna", "tensorflow", "transformers"]
+
+PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    assert client.get("/api/models").status_code == 200
+    served = time.perf_counter()
+print(json.dumps({
+    "import": imported - started,
+    "firstRequest": served - started,
+    "rssMb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy": [name for name in %r if name in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def run_once(db_path: str) -> dict:
+    env = dict(os.environ, ML_DB_PATH=db_path)
+    result = subprocess.run([sys.executable, "-c", PROBE], cwd=SERVER_DIR, env=env,
+                            capture_output=True, text=True, timeout=300)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "probe failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure server startup time and import memory")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=1.0, help="Budget for startup + first request (median)")
+    parser.add_argument("--max-rss-mb", type=float, default=200.0, help="Budget for peak RSS (median)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = [run_once(str(Path(tmp) / "bench.db")) for _ in range(args.runs)]
+
+    import_time = statistics.median(r["import"] for r in results)
+    first_request = statistics.median(r["firstRequest"] for r in results)
+    rss = statistics.median(r["rssMb"] for r in results)
+    heavy = sorted({name for r in results for name in r["heavy"]})
+
+    print(f"import main:           {import_time * 1000:8.1f} ms")
+    print(f"startup + /api/models: {first_request * 1000:8.1f} ms  (budget {args.max_seconds * 1000:.0f} ms)")
+    print(f"peak RSS:              {rss:8.1f} MB  (budget {args.max_rss_mb:.0f} MB)")
+    print(f"heavy modules loaded:  {', '.join(heavy) or 'none'}")
+
+    failures = []
+    if first_request > args.max_seconds:
+        failures.append("startup time over budget")
+    if rss > args.max_rss_mb:
+        failures.append("RSS over budget")
+    if heavy:
+        failures.append(f"heavy modules imported at startup: {', '.join(heavy)}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+بنچمارک توان آموزش train_model (گام و نمونه در ثانیه) برای مدل طبقه‌بندی
+مسیر قبلی (آرایه‌های padded تا max_length، برچسب one-hot و یک model.fit برای هر epoch) در برابر pipeline فعلی
+(sequence cache با mmap، shuffle، bucket_by_sequence_length، prefetch و یک model.fit برای همه‌ی epoch ها)
+دیتاست sentiment پوشه‌ی datasets/ برای حجم کافی --repeat بار تکرار می‌شود
+Usage: python bench_training.py [--repeat 200] [--epochs 3] [--batch-size 32]
+"""
+
+import argparse
+import importlib.util
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+SERVER_DIR = Path(__file__).resolve().parent
+DATASET = SERVER_DIR.parent / "datasets" / "sentiment" / "persian-sentiment-dataset.csv"
+MAX_LENGTH = 128
+
+
+def load_ml_integration():
+    # نام فایل خط تیره دارد و با import معمولی بارگذاری نمی‌شود
+    spec = importlib.util.spec_from_file_location("ml_integration", SERVER_DIR / "ml-integration.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def write_dataset(trainer, path: Path, repeat: int) -> int:
+    records = list(trainer.stream_persian_dataset(str(DATASET), "sentiment"))
+    with open(path, "w", encoding="utf-8") as f:
+        for _ in range(repeat):
+            for text, label in records:
+                f.write(json.dumps({"text": text, "sentiment": label}, ensure_ascii=False) + "\n")
+    return len(records) * repeat
+
+
+def make_recorder(ml):
+    class EpochRecorder(ml.ThroughputCallback):
+        """ThroughputCallback that keeps (train steps, train seconds) of every epoch"""
+
+        epochs = []
+
+        def on_epoch_end(self, epoch, logs=None):
+            self.epochs.append((self._steps, self._finished - self._started))
+
+    EpochRecorder.epochs = []
+    return EpochRecorder()
+
+
+def bench_padded(ml, data, epochs: int, batch_size: int):
+    """The previous train_model: rows padded to max_length, one-hot labels, one model.fit per epoch"""
+    keras, layers = ml.keras, ml.layers
+    x = np.concatenate([np.pad(chunk, ((0, 0), (0, MAX_LENGTH - chunk.shape[1]))) for chunk in data["inputs"]])
+    num_classes = len(data["label_vocab"])
+    y = keras.utils.to_categorical(np.concatenate(data["labels"]), num_classes=num_classes)
+    # جایگزین train_test_split(test_size=0.2, random_state=42)
+    order = np.random.default_rng(42).permutation(len(x))
+    val, train = order[:int(len(x) * 0.2)], order[int(len(x) * 0.2):]
+
+    model = keras.Sequential([
+        layers.Input(shape=(MAX_LENGTH,)),
+        layers.Embedding(10000, 128),
+        layers.LSTM(64, return_sequences=True),
+        layers.LSTM(32),
+        layers.Dropout(0.5),
+        layers.Dense(64, activation="relu"),
+        layers.Dropout(0.3),
+        layers.Dense(num_classes, activation="softmax"),
+    ])
+    model.compile(optimizer="adam", loss="categorical_crossentropy", metrics=["accuracy"])
+
+    recorder = make_recorder(ml)
+    started = time.perf_counter()
+    for _ in range(epochs):
+        model.fit(x[train], y[train], batch_size=batch_size, epochs=1, validation_data=(x[val], y[val]),
+                  callbacks=[recorder], verbose=0)
+    return recorder.epochs, time.perf_counter() - started, len(train)
+
+
+def bench_pipeline(ml, trainer, data, epochs: int, batch_size: int):
+    """The current train_model: bucketed, prefetched tf.data over the cached sequences, one model.fit"""
+    tf = ml.tf
+    model = trainer.create_persian_text_classifier(num_classes=len(data["label_vocab"]))
+    output_signature = (tf.TensorSpec(shape=(None,), dtype=tf.int32), tf.TensorSpec(shape=(), dtype=tf.int32))
+    train_ds, val_ds = trainer.make_training_datasets(
+        lambda validation: trainer.stream_examples(data, "transformer", validation),
+        output_signature, batch_size, data["count"])
+
+    recorder = make_recorder(ml)
+    started = time.perf_counter()
+    model.fit(train_ds, epochs=epochs, validation_data=val_ds, callbacks=[recorder], verbose=0)
+    train_examples = sum(1 for _ in trainer.stream_examples(data, "transformer", False))
+    return recorder.epochs, time.perf_counter() - started, train_examples
+
+
+def report(label: str, epochs, elapsed: float, train_examples: int, baseline=None):
+    # epoch اول شامل trace و compile است و در میانگین حساب نمی‌شود
+    steady = epochs[1:] or epochs
+    steps_per_sec = statistics.mean(steps / seconds for steps, seconds in steady)
+    examples_per_sec = statistics.mean(train_examples / seconds for _, seconds in steady)
+    line = (f"{label:<22} {steps_per_sec:>8.1f} steps/s  {examples_per_sec:>9.0f} examples/s  "
+            f"{epochs[-1][0]:>5} steps/epoch  {elapsed:>7.1f} s total")
+    if baseline is not None:
+        line += f"  ({examples_per_sec / baseline:.2f}x examples/s)"
+    print(line)
+    return examples_per_sec
+
+
+def main():
+    parser = argparse.ArgumentParser(description="train_model throughput: padded arrays vs the tf.data pipeline")
+    parser.add_argument("--repeat", type=int, default=200, help="Times the sentiment dataset is repeated")
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    ml = load_ml_integration()
+    trainer = ml.PersianMLTrainer()
+    with tempfile.TemporaryDirectory() as tmp:
+        trainer.sequence_cache = ml.SequenceCache(str(Path(tmp) / "sequences"))
+        dataset = Path(tmp) / "sentiment.jsonl"
+        count = write_dataset(trainer, dataset, args.repeat)
+        print(f"{count} examples ({DATASET.name} x {args.repeat}), batch {args.batch_size}, {args.epochs} epochs")
+
+        started = time.perf_counter()
+        trainer.prepare_sequences(str(dataset), "sentiment", MAX_LENGTH)
+        miss = time.perf_counter() - started
+        started = time.perf_counter()
+        data = trainer.prepare_sequences(str(dataset), "sentiment", MAX_LENGTH)
+        print(f"prepare_sequences: {miss:.2f} s encoding (cache miss), "
+              f"{time.perf_counter() - started:.3f} s from the cache (hit)")
+
+        baseline = report("padded, fit per epoch", *bench_padded(ml, data, args.epochs, args.batch_size))
+        report("bucketed tf.data", *bench_pipeline(ml, trainer, data, args.epochs, args.batch_size), baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+"""
+WebSocket broadcast hub for the ML Training Platform
+هر update یک بار serialize می‌شود و در صف محدود هر client قرار می‌گیرد؛ ارسال‌کننده هرگز منتظر client نمی‌ماند
+
+Protocol (یک stream نسخه‌دار برای هر job):
+  {"type": "snapshot", "job": id, "epoch": e, "seq": n, "data": {...full job...}}  on connect / resync
+  {"type": "delta", "job": id, "epoch": e, "base": n, "seq": n + 1,
+   "changes": {...}, "metrics": {...}, "checkpoints": [...new ids...]}            only what changed
+  {"type": "event", "job": id, "data": {...}}                                      unversioned events (auto-tuning)
+  {"type": "ping"} / {"type": "pong"}                                             heartbeat
+A delta applies only when its epoch and base equal the client's; reconnect with ?since=<seq>&epoch=<epoch>
+to resume. Every new stream of a job (after it finishes, or after a server restart) has a new epoch, so a
+client holding another epoch, or a seq ahead of the stream, gets a snapshot.
+
+Client -> server:
+  {"type": "subscribe", "jobs": [id, ...], "since": {id: {"epoch": e, "seq": n}}}   "since" is optional
+  {"type": "unsubscribe", "jobs": [id, ...]}
+  {"type": "throttle", "rate": updates_per_second}               0 = no client-side limit
+  {"type": "pong"} / {"type": "ping"}
+"""
+
+import asyncio
+import json
+import os
+import secrets
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from fastapi import WebSocket
+from loguru import logger
+
+MAX_UPDATES_PER_SECOND = float(os.getenv("WS_MAX_UPDATES_PER_SECOND", "10"))
+CLIENT_QUEUE_SIZE = int(os.getenv("WS_CLIENT_QUEUE_SIZE", "16"))
+URGENT_QUEUE_SIZE = int(os.getenv("WS_URGENT_QUEUE_SIZE", "8"))
+DELTA_HISTORY_SIZE = int(os.getenv("WS_DELTA_HISTORY_SIZE", "256"))
+PING_INTERVAL = float(os.getenv("WS_PING_INTERVAL", "20"))
+PING_TIMEOUT = float(os.getenv("WS_PING_TIMEOUT", "60"))
+
+_MISSING = object()
+
+
+def job_state(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of the parts of a job record that deltas are computed against"""
+    state = {key: value for key, value in job.items() if key not in ("metrics", "checkpoints")}
+    state["metrics"] = dict(job.get("metrics") or {})
+    state["checkpoints"] = len(job.get("checkpoints") or ())
+    return state
+
+
+def diff_job(state: Dict[str, Any], job: Dict[str, Any]) -> Dict[str, Any]:
+    """Fields of job that changed since state; checkpoints are append-only"""
+    delta = {}
+
+    changes = {key: value for key, value in job.items()
+               if key not in ("metrics", "checkpoints") and state.get(key, _MISSING) != value}
+    if changes:
+        delta["changes"] = changes
+
+    metrics = job.get("metrics") or {}
+    changed_metrics = {key: value for key, value in metrics.items() if state["metrics"].get(key, _MISSING) != value}
+    changed_metrics.update({key: None for key in state["metrics"] if key not in metrics})
+    if changed_metrics:
+        delta["metrics"] = changed_metrics
+
+    checkpoints = job.get("checkpoints") or []
+    if len(checkpoints) > state["checkpoints"]:
+        delta["checkpoints"] = checkpoints[state["checkpoints"]:]
+
+    return delta
+
+
+def merge_deltas(older: Dict[str, Any], newer: Dict[str, Any]) -> Dict[str, Any]:
+    """Combine two consecutive deltas into one spanning older.base -> newer.seq"""
+    merged = {"type": "delta", "job": newer["job"], "epoch": newer["epoch"], "base": older["base"], "seq": newer["seq"]}
+    for key in ("changes", "metrics"):
+        values = {**older.get(key, {}), **newer.get(key, {})}
+        if values:
+            merged[key] = values
+    checkpoints = older.get("checkpoints", []) + newer.get("checkpoints", [])
+    if checkpoints:
+        merged["checkpoints"] = checkpoints
+    return merged
+
+
+def _is_delta(message: Optional[Dict[str, Any]]) -> bool:
+    return message is not None and message.get("type") == "delta"
+
+
+class JobStream:
+    """Sequence-numbered delta history of one job
+
+    seq restarts at 0 for every stream of a job; the random epoch tells the
+    streams apart so a client's seq from an earlier stream is never resumed.
+    """
+
+    def __init__(self, job_id: str, job: Dict[str, Any], history_size: int):
+        self.job_id = job_id
+        self.epoch = secrets.token_hex(6)
+        self.seq = 0
+        self.state = job_state(job)
+        self.history: Deque[Dict[str, Any]] = deque(maxlen=history_size)
+
+    def advance(self, job: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        delta = diff_job(self.state, job)
+        if not delta:
+            return None
+        message = {"type": "delta", "job": self.job_id, "epoch": self.epoch, "base": self.seq, "seq": self.seq + 1,
+                   **delta}
+        self.seq += 1
+        self.state = job_state(job)
+        self.history.append(message)
+        return message
+
+    def since(self, epoch: Optional[str], seq: int) -> Optional[List[Dict[str, Any]]]:
+        """Deltas after seq, or None when seq is from another stream or the history no longer covers it"""
+        if epoch != self.epoch:
+            return None
+        if seq == self.seq:
+            return []
+        if seq > self.seq or not self.history or self.history[0]["base"] > seq:
+            return None
+        return [message for message in self.history if message["seq"] > seq]
+
+    def snapshot(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        return {"type": "snapshot", "job": self.job_id, "epoch": self.epoch, "seq": self.seq, "data": job}
+
+
+Outgoing = Tuple[Optional[Dict[str, Any]], Optional[str]]
+
+
+class Client:
+    """One WebSocket connection: its subscriptions and its own bounded send queue"""
+
+    def __init__(self, websocket: WebSocket, queue_size: int, on_close: Callable[["Client"], None]):
+        self.websocket = websocket
+        self.queue_size = queue_size
+        self.queue: Deque[Outgoing] = deque()
+        self.urgent: Deque[Outgoing] = deque()
+        self.jobs: Set[str] = set()
+        self.dropped = 0
+        self.closed = False
+        self.min_interval = 0.0
+        self.last_seen = asyncio.get_running_loop().time()
+        self._ready = asyncio.Event()
+        self._on_close = on_close
+        self._task = asyncio.create_task(self._run())
+
+    def touch(self):
+        self.last_seen = asyncio.get_running_loop().time()
+
+    def throttle(self, rate: float):
+        """Limit this client to `rate` messages per second (0 = no limit)"""
+        self.min_interval = 1.0 / rate if rate > 0 else 0.0
+        self._ready.set()
+
+    def send(self, message: Dict[str, Any], urgent: bool = False):
+        self.push(message, json.dumps(message, default=str), urgent)
+
+    def push(self, message: Optional[Dict[str, Any]], text: Optional[str], urgent: bool = False):
+        """Queue a message; urgent ones (heartbeats, errors) skip the queue and the throttle"""
+        if self.closed:
+            return
+        if urgent:
+            # پیام تکراری که هنوز ارسال نشده دوباره صف نمی‌شود؛ client ای که پیام خراب می‌فرستد
+            # و پاسخ‌ها را نمی‌خواند بعد از URGENT_QUEUE_SIZE پاسخ در انتظار قطع می‌شود
+            if any(queued == text for _, queued in self.urgent):
+                return
+            if len(self.urgent) >= URGENT_QUEUE_SIZE:
+                logger.debug("WebSocket client is not reading its replies, closing")
+                self.close(code=1008)
+                return
+            self.urgent.append((message, text))
+            self._ready.set()
+            return
+        if len(self.queue) >= self.queue_size:
+            # صف پر است: delta های پشت سر هم ادغام می‌شوند تا seq پیوسته بماند
+            self._compact()
+            if len(self.queue) >= self.queue_size:
+                self.queue.popleft()
+                self.dropped += 1
+        self.queue.append((message, text))
+        self._ready.set()
+
+    def _compact(self):
+        """Merge consecutive deltas of the same job that are still waiting to be sent"""
+        compacted: List[Outgoing] = []
+        last: Dict[str, int] = {}
+        for message, text in self.queue:
+            job_id = message.get("job") if message else None
+            index = last.get(job_id) if job_id is not None else None
+            previous = compacted[index][0] if index is not None else None
+            if (_is_delta(message) and _is_delta(previous) and previous["epoch"] == message["epoch"]
+                    and previous["seq"] == message["base"]):
+                compacted[index] = (merge_deltas(previous, message), None)
+                continue
+            compacted.append((message, text))
+            if job_id is not None:
+                last[job_id] = len(compacted) - 1
+        self.queue = deque(compacted)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_send = 0.0
+        try:
+            while not self.closed:
+                await self._ready.wait()
+                self._ready.clear()
+                while self.urgent or self.queue:
+                    if self.urgent:
+                        message, text = self.urgent.popleft()
+                        await self.websocket.send_text(text or json.dumps(message, default=str))
+                        continue
+                    delay = next_send - loop.time()
+                    if delay > 0 and self.queue[0][0] and "job" in self.queue[0][0]:
+                        await asyncio.sleep(delay)
+                        self._compact()
+                        continue
+                    message, text = self.queue.popleft()
+                    await self.websocket.send_text(text or json.dumps(message, default=str))
+                    if message and "job" in message:
+                        next_send = loop.time() + self.min_interval
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.debug(f"WebSocket send failed, dropping client: {str(e)}")
+        finally:
+            self.closed = True
+            self._on_close(self)
+
+    def close(self, code: int = 1000):
+        if self.closed:
+            return
+        self.closed = True
+        self._task.cancel()
+        asyncio.create_task(self._close_socket(code))
+
+    async def _close_socket(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+
+class BroadcastHub:
+    """Rate-limited, coalescing, delta-encoded fan-out of job updates to WebSocket clients"""
+
+    def __init__(self, max_updates_per_second: float = MAX_UPDATES_PER_SECOND,
+                 client_queue_size: int = CLIENT_QUEUE_SIZE, history_size: int = DELTA_HISTORY_SIZE,
+                 ping_interval: float = PING_INTERVAL, ping_timeout: float = PING_TIMEOUT):
+        self.min_interval = 1.0 / max_updates_per_second if max_updates_per_second > 0 else 0.0
+        self.client_queue_size = max(1, client_queue_size)
+        self.history_size = max(1, history_size)
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self._connections: Set[Client] = set()
+        self._clients: Dict[str, Set[Client]] = {}
+        self._streams: Dict[str, JobStream] = {}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._scheduled: Dict[str, asyncio.TimerHandle] = {}
+        self._last_flush: Dict[str, float] = {}
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the shared heartbeat task (one for all connections)"""
+        if self._heartbeat is None:
+            self._heartbeat = asyncio.create_task(self._run_heartbeat())
+
+    async def _run_heartbeat(self):
+        loop = asyncio.get_running_loop()
+        ping = {"type": "ping"}
+        text = json.dumps(ping)
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            now = loop.time()
+            for client in list(self._connections):
+                if now - client.last_seen > self.ping_timeout:
+                    logger.debug("WebSocket client missed heartbeats, closing")
+                    client.close(code=1001)
+                else:
+                    client.push(ping, text, urgent=True)
+
+    def connect(self, websocket: WebSocket) -> Client:
+        client = Client(websocket, self.client_queue_size, self.disconnect)
+        self._connections.add(client)
+        return client
+
+    def disconnect(self, client: Client):
+        client.close()
+        self._connections.discard(client)
+        for job_id in list(client.jobs):
+            self.unsubscribe(client, job_id)
+
+    def subscribe(self, client: Client, job_id: str, job: Optional[Dict[str, Any]] = None,
+                  since: Optional[int] = None, epoch: Optional[str] = None):
+        """Subscribe a client to a job; it receives the missed deltas after (epoch, since), or a snapshot"""
+        if job is not None:
+            # delta های معوق اول ارسال شوند تا snapshot و stream هم‌زمان باشند
+            self._flush(job_id)
+
+        client.jobs.add(job_id)
+        self._clients.setdefault(job_id, set()).add(client)
+
+        if job is not None:
+            stream = self._stream(job_id, job)
+            replay = stream.since(epoch, since) if since is not None else None
+            if replay is None:
+                client.send(stream.snapshot(job))
+            for message in replay or ():
+                client.send(message)
+
+    def unsubscribe(self, client: Client, job_id: str):
+        client.jobs.discard(job_id)
+        clients = self._clients.get(job_id)
+        if clients is None:
+            return
+        clients.discard(client)
+        if not clients:
+            del self._clients[job_id]
+
+    def _stream(self, job_id: str, job: Dict[str, Any]) -> JobStream:
+        stream = self._streams.get(job_id)
+        if stream is None:
+            stream = self._streams[job_id] = JobStream(job_id, job, self.history_size)
+        return stream
+
+    def client_count(self, job_id: Optional[str] = None) -> int:
+        if job_id is not None:
+            return len(self._clients.get(job_id, ()))
+        return len(self._connections)
+
+    def publish(self, job_id: str, job: Dict[str, Any]):
+        """Record a change to a job; never blocks the caller
+
+        Changes are coalesced and turned into at most max_updates_per_second
+        deltas per job. The stream advances even with no clients connected so
+        a client can resume from its last seq.
+        """
+        if job_id not in self._streams:
+            self._streams[job_id] = JobStream(job_id, job, self.history_size)
+            if job_id not in self._clients:
+                return
+
+        self._pending[job_id] = job
+        if job_id in self._scheduled:
+            return
+        loop = asyncio.get_running_loop()
+        delay = max(0.0, self._last_flush.get(job_id, 0.0) + self.min_interval - loop.time())
+        self._scheduled[job_id] = loop.call_later(delay, self._flush, job_id)
+
+    def publish_event(self, job_id: str, event: Dict[str, Any]):
+        """Send an unversioned event to a job's clients immediately"""
+        if job_id in self._clients:
+            self._fan_out(job_id, {"type": "event", "job": job_id, "data": event})
+
+    def finish(self, job_id: str):
+        """Send the final delta of a job and drop its stream"""
+        self._flush(job_id)
+        self._streams.pop(job_id, None)
+        self._last_flush.pop(job_id, None)
+
+    def _flush(self, job_id: str):
+        handle = self._scheduled.pop(job_id, None)
+        if handle is not None:
+            handle.cancel()
+        job = self._pending.pop(job_id, None)
+        if job is None:
+            return
+        self._last_flush[job_id] = asyncio.get_running_loop().time()
+        message = self._stream(job_id, job).advance(job)
+        if message is not None and job_id in self._clients:
+            self._fan_out(job_id, message)
+
+    def _fan_out(self, job_id: str, message: Dict[str, Any]):
+        # یک بار serialize برای همه‌ی client ها
+        text = json.dumps(message, default=str)
+        for client in list(self._clients.get(job_id, ())):
+            client.push(message, text)
+
+    def close(self):
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        for handle in self._scheduled.values():
+            handle.cancel()
+        self._scheduled.clear()
+        for client in list(self._connections):
+            self.disconnect(client)
@@ -0,0 +1,208 @@
+"""
+Streaming dataset readers for the Persian ML System
+رکوردهای دیتاست (JSON array، JSONL، CSV، متن ساده و CoNLL) یکی‌یکی خوانده می‌شوند تا حافظه محدود بماند
+"""
+
+import csv
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_SIZE = 1 << 16
+
+# آرایه‌هایی در سطح بالای فایل JSON که جدول مرجع هستند نه رکورد آموزشی (مثلاً لیست شاعران در دیتاست شعر)
+NON_RECORD_KEYS = ("metadata", "categories", "statistics", "poets")
+
+# برچسب‌های CoNLL: O، B-XXX، I-XXX
+CONLL_TAG_PREFIXES = ("O", "B-", "I-", "E-", "S-")
+
+
+class _JsonStream:
+    """Incremental JSON reader over a text file using raw_decode on a sliding buffer"""
+
+    def __init__(self, f):
+        self._f = f
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        chunk = self._f.read(READ_CHUNK_SIZE)
+        if not chunk:
+            self._eof = True
+            return False
+        # بخش مصرف‌شده‌ی buffer دور ریخته می‌شود
+        self._buf = self._buf[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character ('' at end of file)"""
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos].isspace():
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at offset {self._pos}, found {self.peek()!r}")
+        self._pos += 1
+
+    def value(self) -> Any:
+        """Decode one complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+                # عدد انتهای buffer ممکن است ناقص باشد؛ تا دیدن کاراکتر بعدی صبر می‌کنیم
+                if end < len(self._buf) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._fill()
+
+    def array_items(self) -> Iterator[Any]:
+        """Items of the array starting at the current position"""
+        self.expect("[")
+        if self.peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ",":
+                self._pos += 1
+            else:
+                self.expect("]")
+                return
+
+
+def iter_json_array(path: str, array_key: Optional[str] = None) -> Iterator[Any]:
+    """Items of a top-level JSON array, or of the array under `array_key` in a top-level object
+
+    Without `array_key` the first array-valued key not in NON_RECORD_KEYS is used
+    (e.g. "qa_pairs" in the legal dataset, "poems" in poetry).
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        stream = _JsonStream(f)
+        if stream.peek() == "[":
+            yield from stream.array_items()
+            return
+
+        stream.expect("{")
+        while stream.peek() not in ("}", ""):
+            key = stream.value()
+            stream.expect(":")
+            wanted = key == array_key if array_key else key not in NON_RECORD_KEYS
+            if wanted and stream.peek() == "[":
+                yield from stream.array_items()
+                return
+            stream.value()
+            if stream.peek() == ",":
+                stream.expect(",")
+        raise ValueError(f"No JSON array {'under ' + repr(array_key) if array_key else ''} found in {path}")
+
+
+def iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                logger.warning(f"⚠️ Skipping malformed JSONL line {number} in {path}: {e}")
+
+
+def iter_csv(path: str, delimiter: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    if delimiter is None:
+        delimiter = "\t" if path.endswith(".tsv") else ","
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        yield from csv.DictReader(f, delimiter=delimiter)
+
+
+def _is_conll_line(line: str) -> bool:
+    parts = line.split()
+    return len(parts) == 2 and parts[1].startswith(CONLL_TAG_PREFIXES)
+
+
+def iter_text(path: str) -> Iterator[Dict[str, Any]]:
+    """One record per non-empty line; lines starting with '#' are comments"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield {"text": line}
+
+
+def iter_conll(path: str) -> Iterator[Dict[str, Any]]:
+    """'TOKEN TAG' lines grouped into sentences separated by blank lines"""
+    tokens: List[str] = []
+    tags: List[str] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("#"):
+                continue
+            if not line:
+                if tokens:
+                    yield {"text": " ".join(tokens), "tokens": tokens, "tags": tags}
+                    tokens, tags = [], []
+                continue
+            token, _, tag = line.rpartition(" ")
+            tokens.append(token)
+            tags.append(tag)
+    if tokens:
+        yield {"text": " ".join(tokens), "tokens": tokens, "tags": tags}
+
+
+def sniff_format(path: str) -> str:
+    """json / jsonl / csv / conll / text from the extension and, for .txt, the first lines"""
+    suffix = Path(path).suffix.lower()
+    if suffix in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if suffix == ".json":
+        return "json"
+    if suffix in (".csv", ".tsv"):
+        return "csv"
+
+    with open(path, "r", encoding="utf-8") as f:
+        lines = []
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                lines.append(line)
+            if len(lines) >= 20:
+                break
+    if lines and sum(_is_conll_line(line) for line in lines) >= len(lines) * 0.8:
+        return "conll"
+    return "text"
+
+
+READERS = {
+    "json": iter_json_array,
+    "jsonl": iter_jsonl,
+    "csv": iter_csv,
+    "conll": iter_conll,
+    "text": iter_text,
+}
+
+
+def iter_records(path: str, fmt: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Stream the records of a dataset file, one dict at a time"""
+    fmt = fmt or sniff_format(path)
+    if fmt not in READERS:
+        raise ValueError(f"Unsupported dataset format: {fmt}")
+    for record in READERS[fmt](path):
+        yield record if isinstance(record, dict) else {"text": record}
@@ -0,0 +1,130 @@
+"""
+Batched SQLite writer
+نوشتن‌ها در یک thread پس‌زمینه جمع می‌شوند و با executemany در یک transaction ثبت می‌شوند
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = float(os.getenv("DB_FLUSH_INTERVAL", "0.5"))
+BATCH_SIZE = int(os.getenv("DB_BATCH_SIZE", "500"))
+
+
+def connect(db_path: str, check_same_thread: bool = True) -> sqlite3.Connection:
+    """Open a WAL-mode connection suitable for one writer and many readers"""
+    conn = sqlite3.connect(db_path, timeout=30, check_same_thread=check_same_thread)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class BatchedSQLiteWriter:
+    """Background thread that batches writes and commits them with executemany
+
+    Writes are grouped per SQL statement and flushed when batch_size rows are
+    pending or flush_interval seconds have passed. A write with a key replaces
+    any still-pending write with the same statement and key, so hot rows (e.g.
+    a job's progress) are written once per batch.
+    """
+
+    def __init__(self, db_path: str, flush_interval: float = FLUSH_INTERVAL, batch_size: int = BATCH_SIZE):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.batch_size = max(1, batch_size)
+        self._lock = threading.Lock()
+        # ترتیب نوشتن‌ها حفظ می‌شود؛ ردیف‌های پشت سر هم با یک SQL در یک گروه قرار می‌گیرند
+        self._rows: List[Tuple[str, List[Sequence[Any]]]] = []
+        self._keyed: Dict[Tuple[str, Any], Sequence[Any]] = {}
+        self._order: List[Tuple[str, Any]] = []
+        self._pending = 0
+        self._wakeup = threading.Event()
+        self._flushed = threading.Condition(self._lock)
+        self._generation = 0
+        self._in_flight = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def write(self, sql: str, params: Sequence[Any], key: Optional[Any] = None):
+        """Queue one statement; never blocks on disk I/O"""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Writer is closed")
+            if key is None:
+                if self._rows and self._rows[-1][0] == sql:
+                    self._rows[-1][1].append(params)
+                else:
+                    self._rows.append((sql, [params]))
+                self._pending += 1
+            else:
+                if (sql, key) not in self._keyed:
+                    self._order.append((sql, key))
+                    self._pending += 1
+                self._keyed[(sql, key)] = params
+            if self._pending >= self.batch_size:
+                self._wakeup.set()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything queued so far is committed"""
+        with self._lock:
+            if not self._pending:
+                return True
+            # اگر batch قبلی در حال commit است، batch بعدی شامل این نوشتن‌هاست
+            target = self._generation + (2 if self._in_flight else 1)
+            self._wakeup.set()
+            return self._flushed.wait_for(lambda: self._generation >= target or self._closed, timeout)
+
+    def _take(self) -> List[Tuple[str, List[Sequence[Any]]]]:
+        with self._lock:
+            batches = self._rows
+            keyed: Dict[str, List[Sequence[Any]]] = {}
+            for sql, key in self._order:
+                keyed.setdefault(sql, []).append(self._keyed[(sql, key)])
+            batches.extend(keyed.items())
+            self._rows, self._keyed, self._order, self._pending = [], {}, [], 0
+            self._in_flight = bool(batches)
+            return batches
+
+    def _run(self):
+        conn = connect(self.db_path)
+        try:
+            while True:
+                self._wakeup.wait(self.flush_interval)
+                self._wakeup.clear()
+                batches = self._take()
+                if batches:
+                    started = time.perf_counter()
+                    try:
+                        with conn:
+                            for sql, rows in batches:
+                                conn.executemany(sql, rows)
+                    except sqlite3.Error as e:
+                        logger.error(f"SQLite batch write failed ({sum(len(r) for _, r in batches)} rows): {e}")
+                    else:
+                        logger.debug(f"SQLite batch of {sum(len(r) for _, r in batches)} rows "
+                                     f"in {(time.perf_counter() - started) * 1000:.1f}ms")
+                with self._lock:
+                    self._in_flight = False
+                    self._generation += 1
+                    self._flushed.notify_all()
+                    if self._closed and not self._pending:
+                        return
+        finally:
+            conn.close()
+
+    def close(self):
+        """Flush pending writes and stop the thread"""
+        with self._lock:
+            self._closed = True
+            self._wakeup.set()
+        self._thread.join()
@@ -1,23 +1,247 @@
 #!/usr/bin/env python3
 """
 اسکریپت دانلود خودکار مدل‌های Hugging Face
-Usage: python download_models.py [--models MODEL1,MODEL2,...]
+فایل‌های هر مدل به‌صورت موازی و قابل ادامه (HTTP Range) دانلود و با sha256 / git blob id بررسی می‌شوند
+به‌طور پیش‌فرض فایل‌های repository مستقیم ذخیره می‌شوند؛ با --convert مدل بارگذاری و دوباره ذخیره می‌شود
+هر فایل یک بار در یک blob store مشترک (بر اساس hash محتوا) ذخیره و با hardlink در پوشه‌ی هر مدل قرار می‌گیرد
+وزن‌های pickle (pytorch_model*.bin) پس از دانلود به safetensors چندتکه + index تبدیل می‌شوند تا بدون unpickle (امن‌تر و سریع‌تر) بارگذاری شوند
+Usage: python download_models.py [--models MODEL1,MODEL2,...] [--workers N] [--endpoint URL] [--convert]
+       python download_models.py --gc [--cache-budget 20GB]
 """
 
 import os
 import sys
+import json
+import time
+import fnmatch
+import hashlib
 import argparse
+import http.client
+import shutil
+import tempfile
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List
-from transformers import (
-    AutoModel,
-    AutoTokenizer,
-    GPT2LMHeadModel,
-    AutoModelForSequenceClassification,
-    AutoModelForTokenClassification,
-    MT5ForConditionalGeneration,
-    MT5Tokenizer
-)
+from typing import Dict, List, Optional
+
+# HF_ENDPOINT می‌تواند به یک mirror یا file server محلی اشاره کند
+DEFAULT_ENDPOINT = os.getenv("HF_ENDPOINT", "https://huggingface.co")
+DEFAULT_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "4"))
+CHUNK_SIZE = 1024 * 1024
+MAX_RETRIES = 5
+
+# فرمت‌های دیگر وزن‌ها (TF / Flax / Rust / ONNX) برای بارگذاری با PyTorch لازم نیستند
+IGNORE_PATTERNS = ["*.h5", "*.msgpack", "*.ot", "*.onnx", "*.tflite", "*.ckpt*", ".gitattributes", "*.md"]
+
+MARKER_FILE = ".download.json"
+
+# blob store مشترک بین همه‌ی پوشه‌های مدل (server/ و backend/)
+DEFAULT_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", str(Path.home() / ".cache" / "persian-ml-models"))
+DEFAULT_CACHE_BUDGET = os.getenv("MODEL_CACHE_BUDGET")
+# فایل .part جدیدتر از این (ثانیه) ممکن است دانلود در حال اجرای process دیگری باشد
+PART_GRACE_SECONDS = int(os.getenv("MODEL_CACHE_PART_GRACE", "3600"))
+
+DEFAULT_MAX_SHARD_SIZE = os.getenv("SAFETENSORS_MAX_SHARD_SIZE", "2GB")
+SAFETENSORS_INDEX = "model.safetensors.index.json"
+
+SIZE_UNITS = {"KB": 1024, "MB": 1024**2, "GB": 1024**3, "TB": 1024**4, "B": 1}
+
+
+def parse_size(text: str) -> int:
+    """'440MB' / '20GB' / '1024' -> bytes"""
+    text = text.strip().upper()
+    for unit, factor in SIZE_UNITS.items():
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * factor)
+    return int(text)
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def convert_to_safetensors(model_path: Path, max_shard_size: int) -> List[Path]:
+    """تبدیل pytorch_model*.bin به model-0000i-of-0000n.safetensors + index؛ فایل‌های bin حذف می‌شوند"""
+    bins = sorted(model_path.glob("pytorch_model*.bin"))
+    if not bins or any(model_path.glob("*.safetensors")):
+        return []
+    
+    import torch
+    from safetensors.torch import save_file
+    
+    shards: List[Dict] = [{}]
+    shard_sizes = [0]
+    seen_storages = set()
+    total_size = 0
+    for path in bins:
+        try:
+            # mmap: هر shard بدون خواندن کامل در RAM باز می‌شود
+            state_dict = torch.load(path, map_location="cpu", weights_only=True, mmap=True)
+        except RuntimeError:
+            # فرمت قدیمی (غیر zip) از mmap پشتیبانی نمی‌کند
+            state_dict = torch.load(path, map_location="cpu", weights_only=True)
+        for name, tensor in state_dict.items():
+            # وزن‌های tied (مثلاً lm_head و embedding) یک بار ذخیره می‌شوند؛ transformers دوباره آن‌ها را گره می‌زند
+            storage = (tensor.untyped_storage().data_ptr(), tensor.storage_offset(), tuple(tensor.shape))
+            if storage in seen_storages:
+                continue
+            seen_storages.add(storage)
+            size = tensor.numel() * tensor.element_size()
+            if shard_sizes[-1] and shard_sizes[-1] + size > max_shard_size:
+                shards.append({})
+                shard_sizes.append(0)
+            shards[-1][name] = tensor.contiguous()
+            shard_sizes[-1] += size
+            total_size += size
+    
+    written = []
+    weight_map = {}
+    for number, shard in enumerate(shards, start=1):
+        filename = "model.safetensors" if len(shards) == 1 else f"model-{number:05d}-of-{len(shards):05d}.safetensors"
+        save_file(shard, str(model_path / filename), metadata={"format": "pt"})
+        weight_map.update({name: filename for name in shard})
+        written.append(model_path / filename)
+    if len(shards) > 1:
+        index = {"metadata": {"total_size": total_size}, "weight_map": weight_map}
+        (model_path / SAFETENSORS_INDEX).write_text(json.dumps(index, indent=2), encoding="utf-8")
+        written.append(model_path / SAFETENSORS_INDEX)
+    
+    for path in model_path.glob("pytorch_model*.bin*"):
+        path.unlink()
+    return written
+
+
+class BlobStore:
+    """ذخیره‌ی فایل‌ها بر اساس hash محتوا؛ پوشه‌های مدل فقط link به blob ها هستند
+    
+    blob ها فقط‌خواندنی هستند و چون hardlink با blob یک inode دارد، فایل‌های پوشه‌ی مدل
+    هرگز نباید در جا بازنویسی شوند؛ خروجی جدید در مسیر دیگری نوشته و با ingest جایگزین می‌شود
+    
+    index.json مدل‌های استفاده‌کننده از هر blob و زمان آخرین استفاده‌ی هر مدل را نگه می‌دارد
+    تا gc بتواند blob های بی‌استفاده را حذف و در صورت عبور از بودجه، قدیمی‌ترین مدل‌ها را evict کند
+    """
+    
+    def __init__(self, root: str = DEFAULT_CACHE_DIR):
+        self.root = Path(root)
+        self.blobs = self.root / "blobs"
+        self.blobs.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.root / "index.json"
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        try:
+            self._index = json.loads(self.index_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self._index = {"models": {}}
+    
+    def path(self, key: str) -> Path:
+        return self.blobs / key
+    
+    def key_lock(self, key: str) -> threading.Lock:
+        """دو مدل که یک فایل مشترک دارند آن را هم‌زمان دانلود نمی‌کنند"""
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+    
+    def seal(self, key: str):
+        """blob کامل‌شده فقط‌خواندنی می‌شود تا نوشتن از طریق link های آن خطا بدهد"""
+        os.chmod(self.path(key), 0o444)
+    
+    def link(self, key: str, target: Path):
+        """hardlink (در صورت امکان)، وگرنه symlink، وگرنه کپی"""
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if target.is_symlink() or target.exists():
+            target.unlink()
+        blob = self.path(key)
+        try:
+            os.link(blob, target)
+        except OSError:
+            try:
+                target.symlink_to(blob.resolve())
+            except OSError:
+                shutil.copy2(blob, target)
+    
+    def ingest(self, path: Path) -> str:
+        """فایلی که محلی ساخته شده (مثلاً safetensors تبدیل‌شده) به store منتقل و به جای آن link می‌شود"""
+        key = file_sha256(path)
+        with self.key_lock(key):
+            if not self.path(key).exists():
+                shutil.move(str(path), self.path(key))
+                self.seal(key)
+            self.link(key, path)
+        return key
+    
+    def _save_index(self):
+        temp = self.index_path.with_suffix(".tmp")
+        temp.write_text(json.dumps(self._index, indent=2), encoding="utf-8")
+        temp.replace(self.index_path)
+    
+    def register_model(self, model_path: Path, keys: List[str]):
+        with self._lock:
+            self._index["models"][str(model_path.resolve())] = {"lastUsed": time.time(), "blobs": sorted(set(keys))}
+            self._save_index()
+    
+    def touch_model(self, model_path: Path):
+        with self._lock:
+            entry = self._index["models"].get(str(model_path.resolve()))
+            if entry is not None:
+                entry["lastUsed"] = time.time()
+                self._save_index()
+    
+    def usage(self) -> int:
+        return sum(blob.stat().st_size for blob in self.blobs.iterdir() if blob.is_file())
+    
+    def gc(self, budget: Optional[int] = None, protected: List[Path] = ()) -> Dict[str, int]:
+        """حذف blob های بی‌استفاده و evict مدل‌های LRU تا مصرف دیسک زیر بودجه برود"""
+        protected_paths = {str(Path(p).resolve()) for p in protected}
+        with self._lock:
+            models = self._index["models"]
+            # مدل‌هایی که دستی حذف شده‌اند
+            for path in [p for p in models if not (Path(p) / MARKER_FILE).exists()]:
+                del models[path]
+            
+            evicted = 0
+            removed, freed = self._remove_unreferenced()
+            total = self.usage()
+            for path, _ in sorted(models.items(), key=lambda item: item[1]["lastUsed"]):
+                if budget is None or total <= budget:
+                    break
+                if path in protected_paths:
+                    continue
+                shutil.rmtree(path, ignore_errors=True)
+                del models[path]
+                evicted += 1
+                count, size = self._remove_unreferenced()
+                removed, freed, total = removed + count, freed + size, total - size
+            
+            self._save_index()
+        return {"evictedModels": evicted, "removedBlobs": removed, "freedBytes": freed, "usedBytes": total}
+    
+    def _remove_unreferenced(self):
+        referenced = {key for entry in self._index["models"].values() for key in entry["blobs"]}
+        removed = freed = 0
+        for blob in list(self.blobs.iterdir()):
+            partial = blob.name.endswith(".part")
+            key = blob.name[:-len(".part")] if partial else blob.name
+            lock = self._key_locks.get(key)
+            if key in referenced or (lock is not None and lock.locked()):
+                continue
+            try:
+                stat = blob.stat()
+            except FileNotFoundError:
+                continue
+            # دانلود قابل ادامه‌ی یک process دیگر (قفل آن در این process دیده نمی‌شود)
+            if partial and time.time() - stat.st_mtime < PART_GRACE_SECONDS:
+                continue
+            blob.unlink()
+            freed += stat.st_size
+            removed += 1
+        return removed, freed
 
 # تعریف مدل‌های موجود
 AVAILABLE_MODELS = {
@@ -66,68 +290,305 @@ AVAILABLE_MODELS = {
 class ModelDownloader:
     """دانلودر مدل‌های Hugging Face"""
     
-    def __init__(self, base_path: str = "./models"):
+    def __init__(self, base_path: str = "./models", endpoint: str = DEFAULT_ENDPOINT,
+                 workers: int = DEFAULT_WORKERS, revision: str = "main", token: Optional[str] = None,
+                 convert: bool = False, cache_dir: str = DEFAULT_CACHE_DIR, safetensors: bool = True,
+                 max_shard_size: str = DEFAULT_MAX_SHARD_SIZE):
         self.base_path = Path(base_path)
         self.base_path.mkdir(parents=True, exist_ok=True)
+        self.snapshot_path = self.base_path / ".snapshots"
+        self.endpoint = endpoint.rstrip("/")
+        self.workers = max(1, workers)
+        self.revision = revision
+        self.token = token or os.getenv("HF_TOKEN")
+        # convert: from_pretrained + save_pretrained (فقط برای تغییر فرمت؛ کل وزن‌ها در RAM بارگذاری می‌شوند)
+        self.convert = convert
+        self.store = BlobStore(cache_dir)
+        self.safetensors = safetensors
+        self.max_shard_size = parse_size(max_shard_size)
+        # یک pool مشترک برای فایل‌های همه‌ی مدل‌ها
+        self._files_pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="download")
+        self._print_lock = threading.Lock()
+    
+    def _log(self, message: str):
+        with self._print_lock:
+            print(message, flush=True)
+    
+    def _open(self, url: str, headers: Optional[Dict[str, str]] = None):
+        headers = dict(headers or {})
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        return urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=60)
+    
+    def list_files(self, model_id: str) -> List[Dict]:
+        """لیست فایل‌های repository به همراه اندازه و hash"""
+        url = f"{self.endpoint}/api/models/{model_id}/revision/{self.revision}?blobs=true"
+        with self._open(url) as response:
+            info = json.load(response)
         
+        files = []
+        for sibling in info.get("siblings", []):
+            name = sibling["rfilename"]
+            if any(fnmatch.fnmatch(Path(name).name, pattern) for pattern in IGNORE_PATTERNS):
+                continue
+            lfs = sibling.get("lfs") or {}
+            remote = {
+                "name": name,
+                "size": lfs.get("size", sibling.get("size")),
+                "sha256": lfs.get("sha256"),
+                "blobId": None if lfs else sibling.get("blobId"),
+            }
+            # فایل بدون hash فقط در همین مدل و revision قابل استفاده‌ی مجدد است
+            remote["key"] = remote["sha256"] or remote["blobId"] or hashlib.sha256(
+                f"{model_id}@{self.revision}/{name}".encode()).hexdigest()
+            files.append(remote)
+        
+        # وقتی safetensors هست نسخه‌ی pickle وزن‌ها دانلود نمی‌شود
+        if any(f["name"].endswith(".safetensors") for f in files):
+            files = [f for f in files if not fnmatch.fnmatch(Path(f["name"]).name, "pytorch_model*.bin")]
+        return files
+    
+    def _verify(self, path: Path, remote: Dict) -> bool:
+        if remote["size"] is not None and path.stat().st_size != remote["size"]:
+            return False
+        if remote["sha256"]:
+            digest = hashlib.sha256()
+        elif remote["blobId"]:
+            # شناسه‌ی git blob: sha1("blob <size>\0" + content)
+            digest = hashlib.sha1(f"blob {path.stat().st_size}\0".encode())
+        else:
+            return True
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest() == (remote["sha256"] or remote["blobId"])
+    
+    def download_file(self, model_id: str, remote: Dict, target: Path):
+        """فایل را از blob store (یا در صورت نبود، با دانلود قابل ادامه) در مسیر target قرار می‌دهد"""
+        blob = self.store.path(remote["key"])
+        with self.store.key_lock(remote["key"]):
+            if not blob.exists():
+                self._download_blob(model_id, remote, blob)
+        self.store.link(remote["key"], target)
+    
+    def _download_blob(self, model_id: str, remote: Dict, target: Path):
+        """دانلود یک فایل با ادامه از فایل .part در صورت قطع شدن"""
+        part = target.with_name(target.name + ".part")
+        url = f"{self.endpoint}/{model_id}/resolve/{self.revision}/{urllib.parse.quote(remote['name'])}"
+        
+        for attempt in range(1, MAX_RETRIES + 1):
+            offset = part.stat().st_size if part.exists() else 0
+            try:
+                if remote["size"] is None or offset < remote["size"]:
+                    headers = {"Range": f"bytes={offset}-"} if offset else {}
+                    with self._open(url, headers) as response:
+                        # سرور Range را پشتیبانی نکرد: از ابتدا
+                        mode = "ab" if offset and response.status == 206 else "wb"
+                        with open(part, mode) as f:
+                            for chunk in iter(lambda: response.read(CHUNK_SIZE), b""):
+                                f.write(chunk)
+            except urllib.error.HTTPError as e:
+                # 416: فایل .part از فایل اصلی بزرگ‌تر است
+                if e.code == 416 and part.exists():
+                    part.unlink()
+                elif e.code < 500 and e.code != 429:
+                    raise
+                self._log(f"⚠️  {remote['name']}: HTTP {e.code} (تلاش {attempt}/{MAX_RETRIES})")
+            except (urllib.error.URLError, http.client.HTTPException, OSError) as e:
+                self._log(f"⚠️  {remote['name']}: {e} (تلاش {attempt}/{MAX_RETRIES})")
+            else:
+                if remote["size"] is not None and part.stat().st_size < remote["size"]:
+                    # اتصال وسط فایل قطع شد؛ تلاش بعدی از همین نقطه ادامه می‌دهد
+                    self._log(f"⚠️  {remote['name']}: قطع در {part.stat().st_size}/{remote['size']} بایت "
+                              f"(تلاش {attempt}/{MAX_RETRIES})")
+                elif self._verify(part, remote):
+                    part.replace(target)
+                    self.store.seal(remote["key"])
+                    return
+                else:
+                    self._log(f"⚠️  checksum نادرست برای {remote['name']}، دانلود دوباره...")
+                    part.unlink()
+            time.sleep(min(2 ** attempt, 30))
+        
+        raise RuntimeError(f"دانلود {remote['name']} پس از {MAX_RETRIES} تلاش ناموفق بود")
+    
+    def fetch_snapshot(self, model_id: str, snapshot: Path) -> List[Dict]:
+        """دانلود موازی همه‌ی فایل‌های repository در مسیر snapshot، بدون بارگذاری مدل"""
+        files = self.list_files(model_id)
+        snapshot.mkdir(parents=True, exist_ok=True)
+        futures = [
+            self._files_pool.submit(self.download_file, model_id, remote, snapshot / remote["name"])
+            for remote in files
+        ]
+        for future in futures:
+            future.result()
+        return files
+    
+    def is_complete(self, name: str) -> bool:
+        """همه‌ی فایل‌های ثبت‌شده در marker با همان اندازه روی دیسک هستند"""
+        marker = self.base_path / name / MARKER_FILE
+        if not marker.exists():
+            return False
+        try:
+            manifest = json.loads(marker.read_text(encoding="utf-8"))
+        except ValueError:
+            return False
+        # snapshot خام برای درخواست --convert کافی نیست
+        if self.convert and not manifest.get("converted"):
+            return False
+        if self.safetensors and manifest.get("safetensors") is False:
+            return False
+        model_path = self.base_path / name
+        return all(
+            (model_path / file).exists() and (model_path / file).stat().st_size == size
+            for file, size in manifest.get("files", {}).items()
+        )
+    
+    def _write_marker(self, name: str, model_id: str, blobs: Dict[str, str]):
+        model_path = self.base_path / name
+        files = {
+            str(path.relative_to(model_path)): path.stat().st_size
+            for path in model_path.rglob("*") if path.is_file() and path.name != MARKER_FILE
+        }
+        marker = {"id": model_id, "revision": self.revision, "converted": self.convert,
+                  "safetensors": not any(model_path.glob("pytorch_model*.bin")),
+                  "files": files, "blobs": blobs}
+        (model_path / MARKER_FILE).write_text(json.dumps(marker, indent=2), encoding="utf-8")
+    
+    def _load_and_save(self, source: Path, model_path: Path, model_type: str) -> Dict[str, str]:
+        """مدل در یک پوشه‌ی موقت ذخیره و سپس فایل به فایل به store منتقل می‌شود
+        
+        save_pretrained مستقیم در model_path فایل‌های link شده به blob های مشترک را بازنویسی می‌کرد
+        """
+        from transformers import (
+            AutoModel,
+            AutoTokenizer,
+            GPT2LMHeadModel,
+            AutoModelForSequenceClassification,
+            AutoModelForTokenClassification,
+            MT5ForConditionalGeneration,
+            MT5Tokenizer
+        )
+        
+        if model_type == "gpt2":
+            model = GPT2LMHeadModel.from_pretrained(source)
+        elif model_type == "mt5":
+            model = MT5ForConditionalGeneration.from_pretrained(source)
+        elif model_type == "sequence-classification":
+            model = AutoModelForSequenceClassification.from_pretrained(source)
+        elif model_type == "token-classification":
+            model = AutoModelForTokenClassification.from_pretrained(source)
+        else:
+            model = AutoModel.from_pretrained(source)
+        
+        if model_type == "mt5":
+            tokenizer = MT5Tokenizer.from_pretrained(source)
+        else:
+            tokenizer = AutoTokenizer.from_pretrained(source)
+        
+        staging = Path(tempfile.mkdtemp(prefix=f".{model_path.name}.", dir=model_path.parent))
+        try:
+            model.save_pretrained(staging)
+            tokenizer.save_pretrained(staging)
+            # link های قبلی (مثلاً snapshot خام) فقط unlink می‌شوند؛ blob ها دست نمی‌خورند
+            shutil.rmtree(model_path, ignore_errors=True)
+            saved = {}
+            for path in sorted(p for p in staging.rglob("*") if p.is_file()):
+                name = path.relative_to(staging)
+                saved[str(name)] = self.store.ingest(path)
+                self.store.link(saved[str(name)], model_path / name)
+            return saved
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+    
+    def _convert_weights(self, name: str, model_path: Path) -> Dict[str, str]:
+        """مرحله‌ی بعد از دانلود: وزن‌های pickle به safetensors؛ خروجی هم در blob store قرار می‌گیرد"""
+        if not any(model_path.glob("pytorch_model*.bin")):
+            return {}
+        try:
+            started = time.time()
+            written = convert_to_safetensors(model_path, self.max_shard_size)
+        except ImportError as e:
+            self._log(f"⚠️  {name}: تبدیل به safetensors انجام نشد ({e})")
+            return {}
+        self._log(f"🔁 {name}: {len(written)} فایل safetensors در {time.time() - started:.1f}s")
+        return {path.name: self.store.ingest(path) for path in written}
+    
     def download_model(self, name: str, model_info: Dict) -> bool:
         """دانلود یک مدل از Hugging Face"""
         model_id = model_info["id"]
         model_type = model_info["type"]
         model_path = self.base_path / name
         
-        print(f"\n{'='*60}")
-        print(f"📦 دانلود {name}")
-        print(f"   ID: {model_id}")
-        print(f"   Size: {model_info['size']}")
-        print(f"{'='*60}")
+        if self.is_complete(name):
+            self.store.touch_model(model_path)
+            self._log(f"⏭️  {name} قبلاً کامل دانلود شده است")
+            return True
+        
+        self._log(f"📦 دانلود {name} ({model_id}, {model_info['size']})")
         
         try:
-            print(f"⏳ در حال دانلود مدل...")
+            started = time.time()
+            # در حالت raw فایل‌ها مستقیم در مسیر نهایی نوشته می‌شوند
+            snapshot = self.snapshot_path / name if self.convert else model_path
+            files = self.fetch_snapshot(model_id, snapshot)
+            size = sum(f["size"] or 0 for f in files)
+            self._log(f"⬇️  {name}: {len(files)} فایل، {size / 1024**2:.1f}MB در {time.time() - started:.1f}s")
             
-            if model_type == "gpt2":
-                model = GPT2LMHeadModel.from_pretrained(model_id)
-            elif model_type == "mt5":
-                model = MT5ForConditionalGeneration.from_pretrained(model_id)
-            elif model_type == "sequence-classification":
-                model = AutoModelForSequenceClassification.from_pretrained(model_id)
-            elif model_type == "token-classification":
-                model = AutoModelForTokenClassification.from_pretrained(model_id)
-            else:
-                model = AutoModel.from_pretrained(model_id)
+            blobs = {remote["name"]: remote["key"] for remote in files}
+            # snapshot فقط link است؛ blob های خام برای تبدیل بعدی در store می‌مانند
+            retained = list(blobs.values()) if self.convert else []
+            if self.convert:
+                self._log(f"💾 {name}: در حال تبدیل و ذخیره...")
+                blobs = self._load_and_save(snapshot, model_path, model_type)
+                shutil.rmtree(snapshot, ignore_errors=True)
+            if self.safetensors:
+                converted = self._convert_weights(name, model_path)
+                if converted:
+                    # blob های pickle دیگر به این مدل تعلق ندارند و gc می‌تواند آن‌ها را حذف کند
+                    blobs = {file: key for file, key in blobs.items()
+                             if not fnmatch.fnmatch(Path(file).name, "pytorch_model*.bin*")}
+                    blobs.update(converted)
+            self._write_marker(name, model_id, blobs)
+            self.store.register_model(model_path, list(blobs.values()) + retained)
             
-            print(f"⏳ در حال دانلود tokenizer...")
-            if model_type == "mt5":
-                tokenizer = MT5Tokenizer.from_pretrained(model_id)
-            else:
-                tokenizer = AutoTokenizer.from_pretrained(model_id)
-            
-            print(f"💾 در حال ذخیره...")
-            model.save_pretrained(model_path)
-            tokenizer.save_pretrained(model_path)
-            
-            print(f"✅ {name} با موفقیت دانلود شد!")
+            self._log(f"✅ {name} با موفقیت دانلود شد!")
             return True
                 
         except Exception as e:
-            print(f"❌ خطا در دانلود {name}: {str(e)}")
+            self._log(f"❌ خطا در دانلود {name}: {str(e)}")
             return False
     
     def download_all(self, model_names: List[str] = None) -> Dict[str, bool]:
-        """دانلود چند مدل"""
+        """دانلود چند مدل به‌صورت هم‌زمان"""
         if model_names is None:
             model_names = ["parsbert", "gpt2-persian"]  # فقط مدل‌های اصلی
         
         results = {}
+        known = []
         for name in model_names:
             if name not in AVAILABLE_MODELS:
                 print(f"⚠️  مدل '{name}' یافت نشد.")
                 results[name] = False
-                continue
-            
-            results[name] = self.download_model(name, AVAILABLE_MODELS[name])
+            else:
+                known.append(name)
+        
+        # thread های مدل فقط منتظر می‌مانند؛ دانلود واقعی در pool فایل‌ها انجام می‌شود
+        with ThreadPoolExecutor(max_workers=max(1, len(known))) as models_pool:
+            for name, ok in zip(known, models_pool.map(lambda n: self.download_model(n, AVAILABLE_MODELS[n]), known)):
+                results[name] = ok
         
         return results
+    
+    def gc(self, budget: Optional[int] = None, protected: List[str] = ()) -> Dict[str, int]:
+        """پاک‌سازی blob store؛ مدل‌های protected هرگز evict نمی‌شوند"""
+        result = self.store.gc(budget, [self.base_path / name for name in protected])
+        print(f"🧹 gc: {result['evictedModels']} مدل evict شد، {result['removedBlobs']} blob حذف شد، "
+              f"{result['freedBytes'] / 1024**2:.1f}MB آزاد شد، مصرف فعلی {result['usedBytes'] / 1024**2:.1f}MB")
+        return result
+    
+    def close(self):
+        self._files_pool.shutdown(wait=True)
 
 
 def main():
@@ -136,6 +597,18 @@ def main():
     parser.add_argument("--models", type=str, help="لیست مدل‌ها")
     parser.add_argument("--list", action="store_true", help="نمایش لیست")
     parser.add_argument("--path", type=str, default="./models", help="مسیر ذخیره")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="تعداد دانلود هم‌زمان فایل‌ها")
+    parser.add_argument("--endpoint", type=str, default=DEFAULT_ENDPOINT, help="آدرس Hugging Face یا mirror")
+    parser.add_argument("--revision", type=str, default="main", help="branch / tag / commit")
+    parser.add_argument("--convert", action="store_true",
+                        help="بارگذاری مدل و ذخیره‌ی دوباره با save_pretrained (برای تبدیل فرمت)")
+    parser.add_argument("--cache-dir", type=str, default=DEFAULT_CACHE_DIR, help="مسیر blob store مشترک")
+    parser.add_argument("--cache-budget", type=str, default=DEFAULT_CACHE_BUDGET,
+                        help="حداکثر حجم blob store (مثلاً 20GB)؛ مدل‌های LRU بیرون رانده می‌شوند")
+    parser.add_argument("--gc", action="store_true", help="فقط پاک‌سازی blob store")
+    parser.add_argument("--no-safetensors", action="store_true", help="وزن‌های pytorch_model*.bin تبدیل نشوند")
+    parser.add_argument("--max-shard-size", type=str, default=DEFAULT_MAX_SHARD_SIZE,
+                        help="حداکثر اندازه‌ی هر فایل safetensors")
     
     args = parser.parse_args()
     
@@ -146,9 +619,23 @@ def main():
             print(f"    {info['id']}\n")
         return
     
-    downloader = ModelDownloader(base_path=args.path)
+    downloader = ModelDownloader(base_path=args.path, endpoint=args.endpoint,
+                                 workers=args.workers, revision=args.revision, convert=args.convert,
+                                 cache_dir=args.cache_dir, safetensors=not args.no_safetensors,
+                                 max_shard_size=args.max_shard_size)
+    budget = parse_size(args.cache_budget) if args.cache_budget else None
+    if args.gc:
+        downloader.gc(budget)
+        downloader.close()
+        return
+    
     model_names = [m.strip() for m in args.models.split(",")] if args.models else None
-    results = downloader.download_all(model_names)
+    try:
+        results = downloader.download_all(model_names)
+        if budget is not None:
+            downloader.gc(budget, protected=list(results))
+    finally:
+        downloader.close()
     
     print(f"\n{'='*60}")
     print(f"✅ موفق: {sum(1 for v in results.values() if v)}")
@@ -0,0 +1,298 @@
+"""
+Inference service for trained Persian models
+مدل‌های بارگذاری‌شده همراه با tokenizer در یک LRU cache محدود به حافظه نگه داشته می‌شوند
+درخواست‌های هم‌زمان هر مدل تا max_batch_size یا حداکثر max_wait_ms جمع و با یک predict اجرا می‌شوند
+TensorFlow فقط هنگام بارگذاری اولین مدل import می‌شود
+"""
+
+import asyncio
+import importlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from persian_text import PersianTextEncoder
+
+logger = logging.getLogger(__name__)
+
+MODELS_DIR = os.getenv("INFERENCE_MODELS_DIR", "models")
+CACHE_MB = float(os.getenv("INFERENCE_CACHE_MB", "1024"))
+MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "32"))
+MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", "5"))
+MAX_QUEUED = int(os.getenv("INFERENCE_MAX_QUEUED", "1024"))
+THREADS = int(os.getenv("INFERENCE_THREADS", "1"))
+
+# تخمین حافظه‌ی هر کلمه‌ی واژگان tokenizer (کلید + مقدار dict)
+BYTES_PER_WORD = 100
+
+
+def artifacts_path(model_path: str) -> Path:
+    """Sidecar JSON with the tokenizer and label vocabulary a model was trained with"""
+    return Path(model_path).with_suffix(".tokenizer.json")
+
+
+def save_model_artifacts(model, model_path: str, artifacts: Dict[str, Any]):
+    """Save a Keras model plus its serving sidecar (tokenizer JSON, label vocabulary, model type)"""
+    os.makedirs(os.path.dirname(model_path) or ".", exist_ok=True)
+    model.save(model_path)
+    sidecar = artifacts_path(model_path)
+    temp = sidecar.with_suffix(".tmp")
+    temp.write_text(json.dumps(artifacts, ensure_ascii=False), encoding="utf-8")
+    temp.replace(sidecar)
+
+
+def resolve_model_path(model_id: str, models_dir: str = MODELS_DIR) -> Optional[str]:
+    """models/<model_id> or models/final_<job id>.h5, never outside models_dir"""
+    root = Path(models_dir).resolve()
+    for name in (model_id, f"final_{model_id}.h5"):
+        path = (root / name).resolve()
+        if path.parent == root and path.is_file():
+            return str(path)
+    return None
+
+
+def load_keras_model(model_path: str):
+    keras = importlib.import_module("tensorflow").keras
+    return keras.models.load_model(model_path, compile=False)
+
+
+class LoadedModel:
+    """A model together with the encoder and vocabulary needed to serve it"""
+
+    def __init__(self, model_path: str, model, artifacts: Dict[str, Any], mtime: float):
+        self.path = model_path
+        self.model = model
+        self.mtime = mtime
+        self.model_type = artifacts.get("model_type", "transformer")
+        self.max_length = int(artifacts.get("max_length", 128))
+        self.tokenizer = PersianTextEncoder.from_json(artifacts["tokenizer"], workers=1)
+        self.label_vocab = artifacts.get("label_vocab")
+        self._index_word: Optional[Dict[int, str]] = None
+
+        # وزن‌ها float32 هستند
+        count_params = getattr(model, "count_params", None)
+        weights = count_params() * 4 if count_params else os.path.getsize(model_path)
+        self.nbytes = weights + len(self.tokenizer.word_index) * BYTES_PER_WORD
+
+    def predict(self, texts: List[str]) -> List[Dict[str, Any]]:
+        if self.model_type == "translation":
+            raise ValueError("Translation models need a decoding loop and are not served by /api/predict")
+
+        inputs = self.tokenizer.encode(texts, self.max_length)
+        # با mask_zero فقط تا طولانی‌ترین متن batch نیاز به padding است
+        width = max(1, int(np.count_nonzero(inputs, axis=1).max(initial=0)))
+        probabilities = np.asarray(self.model.predict_on_batch(inputs[:, :width]))
+        return [self._decode(row) for row in probabilities]
+
+    def _decode(self, row: np.ndarray) -> Dict[str, Any]:
+        best = int(np.argmax(row))
+        result = {"index": best, "confidence": float(row[best])}
+        if self.model_type == "generative":
+            if self._index_word is None:
+                self._index_word = {i: word for word, i in self.tokenizer.word_index.items()}
+            result["token"] = self._index_word.get(best, "")
+        elif self.label_vocab:
+            result["label"] = self.label_vocab[best]
+            result["scores"] = {label: float(p) for label, p in zip(self.label_vocab, row)}
+        return result
+
+
+class ModelCache:
+    """Thread-safe LRU of LoadedModel, bounded by estimated memory
+
+    A model file that changed on disk since it was loaded is reloaded.
+    Concurrent requests for the same model wait for a single load. The most
+    recently used model is always kept, even when it alone exceeds the budget.
+    """
+
+    def __init__(self, max_bytes: float = CACHE_MB * 1024**2,
+                 loader: Callable[[str], Any] = load_keras_model):
+        self.max_bytes = max_bytes
+        self.loader = loader
+        self._models: "OrderedDict[str, LoadedModel]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def __contains__(self, model_path: str) -> bool:
+        return model_path in self._models
+
+    def _lookup(self, model_path: str, mtime: float) -> Optional[LoadedModel]:
+        with self._lock:
+            loaded = self._models.get(model_path)
+            if loaded is not None and loaded.mtime == mtime:
+                self._models.move_to_end(model_path)
+                self.hits += 1
+                return loaded
+            return None
+
+    def get(self, model_path: str) -> LoadedModel:
+        mtime = os.path.getmtime(model_path)
+        loaded = self._lookup(model_path, mtime)
+        if loaded is not None:
+            return loaded
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(model_path, threading.Lock())
+        with key_lock:
+            # ممکن است thread دیگری همین مدل را در این فاصله بارگذاری کرده باشد
+            loaded = self._lookup(model_path, mtime)
+            if loaded is not None:
+                return loaded
+
+            sidecar = artifacts_path(model_path)
+            if not sidecar.exists():
+                raise FileNotFoundError(f"No tokenizer saved with {model_path} ({sidecar.name} missing)")
+            artifacts = json.loads(sidecar.read_text(encoding="utf-8"))
+            loaded = LoadedModel(model_path, self.loader(model_path), artifacts, mtime)
+            logger.info(f"Loaded model {model_path} ({loaded.nbytes / 1024**2:.1f} MB)")
+            self._insert(loaded)
+            return loaded
+
+    def _insert(self, loaded: LoadedModel):
+        with self._lock:
+            self.misses += 1
+            previous = self._models.pop(loaded.path, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes
+            self._models[loaded.path] = loaded
+            self._bytes += loaded.nbytes
+            while self._bytes > self.max_bytes and len(self._models) > 1:
+                path, evicted = self._models.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                logger.info(f"Evicted model {path} from inference cache")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "models": list(self._models),
+                "bytes": self._bytes,
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class InferenceService:
+    """Dynamic micro-batching of concurrent predictions, one batching loop per model
+
+    Requests are queued per model; a loop takes the first waiting text, keeps
+    collecting until max_batch_size texts or max_wait_ms after the first one,
+    and runs the batch in a worker thread. Texts that arrive while a batch is
+    running form the next batch.
+    """
+
+    def __init__(self, cache: Optional[ModelCache] = None, max_batch_size: int = MAX_BATCH_SIZE,
+                 max_wait_ms: float = MAX_WAIT_MS, max_queued: int = MAX_QUEUED, threads: int = THREADS):
+        self.cache = cache or ModelCache()
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.max_queued = max_queued
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._threads = max(1, threads)
+        self.batches = 0
+        self.batched_texts = 0
+
+    async def predict(self, model_path: str, texts: List[str]) -> List[Dict[str, Any]]:
+        queue = self._queue(model_path)
+        if queue.qsize() + len(texts) > self.max_queued:
+            raise RuntimeError(f"Inference queue for {Path(model_path).name} is full")
+
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            queue.put_nowait((text, future))
+            futures.append(future)
+        return list(await asyncio.gather(*futures))
+
+    def _queue(self, model_path: str) -> asyncio.Queue:
+        queue = self._queues.get(model_path)
+        if queue is None:
+            queue = self._queues[model_path] = asyncio.Queue()
+            self._tasks[model_path] = asyncio.create_task(self._run(model_path, queue))
+        return queue
+
+    def _predict_batch(self, model_path: str, texts: List[str]) -> List[Dict[str, Any]]:
+        return self.cache.get(model_path).predict(texts)
+
+    async def _collect(self, queue: asyncio.Queue) -> List[Tuple[str, asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        batch = [await queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not queue.empty():
+                batch.append(queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self, model_path: str, queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self._threads, thread_name_prefix="inference")
+        try:
+            while True:
+                batch = await self._collect(queue)
+                # درخواست‌هایی که کلاینت آن‌ها قطع شده حذف می‌شوند
+                batch = [(text, future) for text, future in batch if not future.done()]
+                if not batch:
+                    continue
+                try:
+                    results = await loop.run_in_executor(
+                        self._executor, self._predict_batch, model_path, [text for text, _ in batch])
+                except Exception as e:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                self.batches += 1
+                self.batched_texts += len(batch)
+                for (_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+        except asyncio.CancelledError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.cache.stats(),
+            "batches": self.batches,
+            "meanBatchSize": self.batched_texts / self.batches if self.batches else 0.0,
+            "queued": {Path(path).name: queue.qsize() for path, queue in self._queues.items()},
+        }
+
+    def close(self):
+        for task in self._tasks.values():
+            task.cancel()
+        for queue in self._queues.values():
+            while not queue.empty():
+                _, future = queue.get_nowait()
+                if not future.done():
+                    future.set_exception(RuntimeError("Inference service stopped"))
+        self._tasks.clear()
+        self._queues.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,493 @@
+"""
+Persistent job and checkpoint store for the ML Training Platform
+job ها و checkpoint ها در SQLite (حالت WAL) ذخیره می‌شوند؛ job های فعال در حافظه نگه داشته می‌شوند
+و نوشتن‌های حلقه‌ی آموزش به‌صورت دسته‌ای انجام می‌شود
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from db_writer import BatchedSQLiteWriter, connect
+from metric_series import DEFAULT_POINTS, MetricSeries, downsample
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.getenv("ML_DB_PATH", str(Path(__file__).resolve().parent / "ml_system.db"))
+
+RECENT_JOBS_SIZE = int(os.getenv("RECENT_JOBS_SIZE", "100"))
+# سری متریک job های تمام‌شده‌ای که اخیراً خوانده شده‌اند در حافظه می‌مانند
+METRICS_CACHE_JOBS = int(os.getenv("METRICS_CACHE_JOBS", "8"))
+# آخرین وضعیت job های تمام‌شده یا خوانده‌شده از دیتابیس، تا ذخیره‌ی دوباره‌ی آن‌ها دوباره شمرده نشود
+STATUS_CACHE_JOBS = int(os.getenv("STATUS_CACHE_JOBS", "1000"))
+
+FINISHED_STATUSES = ("completed", "failed", "stopped")
+# وضعیت‌هایی که فقط این server می‌نویسد؛ real-backend.js در همین جدول از 'pending' و 'running' استفاده می‌کند
+ACTIVE_STATUSES = ("queued", "training", "paused")
+
+# worker های آموزش همراه با server متوقف می‌شوند؛ job های نیمه‌کاره‌ی قبلی با این پیام failed می‌شوند
+INTERRUPTED_MESSAGE = "Interrupted by a server restart"
+
+# همان ساختار جدول‌های real-backend.js، به‌علاوه‌ی جدول checkpoints و index ها
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS training_jobs (
+        id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        model_type TEXT NOT NULL,
+        dataset_path TEXT,
+        base_model TEXT,
+        status TEXT DEFAULT 'pending',
+        progress REAL DEFAULT 0,
+        current_epoch INTEGER DEFAULT 0,
+        total_epochs INTEGER DEFAULT 10,
+        accuracy REAL DEFAULT 0,
+        loss REAL DEFAULT 0,
+        learning_rate REAL DEFAULT 0.001,
+        batch_size INTEGER DEFAULT 32,
+        validation_split REAL DEFAULT 0.2,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        started_at DATETIME,
+        completed_at DATETIME,
+        error_message TEXT,
+        config_json TEXT,
+        metrics_json TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS training_metrics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_id TEXT NOT NULL,
+        epoch INTEGER,
+        step INTEGER,
+        training_loss REAL,
+        validation_loss REAL,
+        training_accuracy REAL,
+        validation_accuracy REAL,
+        learning_rate REAL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (job_id) REFERENCES training_jobs(id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS checkpoints (
+        id TEXT PRIMARY KEY,
+        job_id TEXT NOT NULL,
+        name TEXT NOT NULL,
+        path TEXT,
+        created_at TEXT,
+        size INTEGER DEFAULT 0,
+        metrics_json TEXT,
+        is_best INTEGER DEFAULT 0,
+        FOREIGN KEY (job_id) REFERENCES training_jobs(id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_training_jobs_status ON training_jobs(status)",
+    "CREATE INDEX IF NOT EXISTS idx_training_jobs_started_at ON training_jobs(started_at)",
+    "CREATE INDEX IF NOT EXISTS idx_training_metrics_job_id ON training_metrics(job_id, step)",
+    "CREATE INDEX IF NOT EXISTS idx_checkpoints_job_id ON checkpoints(job_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_checkpoints_created_at ON checkpoints(created_at)",
+]
+
+# ستون‌هایی که در دیتابیس‌های قدیمی‌تر وجود ندارند (nullable؛ INSERT های real-backend.js فهرست ستون دارند)
+ADDED_COLUMNS = {
+    "training_jobs": {"message": "TEXT"},
+    "training_metrics": {"throughput": "REAL", "gradient_norm": "REAL"},
+}
+
+# کلید متریک در API -> ستون training_metrics
+METRIC_COLUMNS = {
+    "trainLoss": "training_loss",
+    "valLoss": "validation_loss",
+    "trainAccuracy": "training_accuracy",
+    "valAccuracy": "validation_accuracy",
+    "learningRate": "learning_rate",
+    "throughput": "throughput",
+    "gradientNorm": "gradient_norm",
+}
+
+METRIC_INSERT = f"""
+    INSERT INTO training_metrics (job_id, epoch, step, {", ".join(METRIC_COLUMNS.values())})
+    VALUES (?, ?, ?, {", ".join("?" for _ in METRIC_COLUMNS)})
+"""
+
+JOB_UPSERT = """
+    INSERT INTO training_jobs (
+        id, name, model_type, dataset_path, base_model, status, progress,
+        current_epoch, total_epochs, loss, learning_rate, batch_size,
+        started_at, completed_at, error_message, message, config_json, metrics_json
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        status = excluded.status,
+        progress = excluded.progress,
+        current_epoch = excluded.current_epoch,
+        loss = excluded.loss,
+        learning_rate = excluded.learning_rate,
+        completed_at = excluded.completed_at,
+        error_message = excluded.error_message,
+        message = excluded.message,
+        metrics_json = excluded.metrics_json
+"""
+
+CHECKPOINT_INSERT = """
+    INSERT OR REPLACE INTO checkpoints (id, job_id, name, path, created_at, size, metrics_json, is_best)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+JOB_COLUMNS = "id, status, progress, message, error_message, started_at, completed_at, config_json, metrics_json"
+CHECKPOINT_COLUMNS = "id, job_id, name, path, created_at, size, metrics_json, is_best"
+
+
+def job_to_row(job: Dict[str, Any]) -> Tuple:
+    config = job.get("config") or {}
+    settings = config.get("config") or {}
+    metrics = job.get("metrics") or {}
+    return (
+        job["id"],
+        config.get("modelName") or job["id"],
+        settings.get("modelType", "training"),
+        ",".join(config.get("datasets") or []),
+        config.get("baseModel"),
+        job["status"],
+        job.get("progress", 0),
+        metrics.get("epoch", 0),
+        settings.get("epochs", 10),
+        metrics.get("trainLoss", 0),
+        metrics.get("learningRate", settings.get("learningRate", 0.001)),
+        settings.get("batchSize", 32),
+        job.get("startTime"),
+        job.get("endTime"),
+        job.get("message") if job["status"] == "failed" else None,
+        job.get("message"),
+        json.dumps(config),
+        json.dumps(metrics),
+    )
+
+
+def row_to_checkpoint(row: sqlite3.Row) -> Dict[str, Any]:
+    return {
+        "id": row["id"],
+        "jobId": row["job_id"],
+        "name": row["name"],
+        "path": row["path"],
+        "createdAt": row["created_at"],
+        "size": row["size"],
+        "metrics": json.loads(row["metrics_json"] or "{}"),
+        "isBest": bool(row["is_best"]),
+    }
+
+
+class JobStore:
+    """Training jobs and checkpoints backed by SQLite
+
+    Active jobs live in memory as plain dicts (the shape the API returns) and
+    are written through a batched background writer; finished and historical
+    jobs are read back from the database by primary key or index.
+
+    Per-step metrics are appended to an in-memory MetricSeries for active
+    jobs and batched into training_metrics; finished jobs are read back from
+    the (job_id, step) index and a few are kept in an LRU cache.
+
+    Dashboard counters (jobs per status, checkpoints) and a ring of the most
+    recently started jobs are loaded once at startup and then maintained on
+    every status transition (the checkpoint count is recounted after each
+    checkpoint write), so reading them never touches the database.
+
+    Database reads are coroutines: the flush of queued writes and the query
+    run on a single reader thread that owns the read connection, never on
+    the event loop.
+
+    The active jobs, counters and the training scheduler are per process, so
+    the server must run as a single uvicorn worker; a second process would
+    see stale statuses and could not control the first one's jobs.
+    """
+
+    def __init__(self, db_path: str = DB_PATH):
+        self.db_path = db_path
+        # بعد از __init__ فقط thread خواننده از این اتصال استفاده می‌کند؛ نوشتن‌ها در thread writer انجام می‌شوند
+        self._conn = connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._ensure_schema()
+        self._reconcile_interrupted()
+        self._writer = BatchedSQLiteWriter(db_path)
+        self._active: Dict[str, Dict[str, Any]] = {}
+        self._series: Dict[str, MetricSeries] = {}
+        self._series_cache: "OrderedDict[str, MetricSeries]" = OrderedDict()
+
+        # شمارنده‌ها فقط یک بار از دیتابیس خوانده می‌شوند و بعد با هر تغییر وضعیت به‌روز می‌شوند
+        self._statuses: Dict[str, str] = {}
+        self._finished: "OrderedDict[str, str]" = OrderedDict()
+        self._status_counts: Counter = Counter({
+            row["status"]: row["n"]
+            for row in self._fetch("SELECT status, COUNT(*) AS n FROM training_jobs GROUP BY status")})
+        self._checkpoint_count = self._fetch("SELECT COUNT(*) AS n FROM checkpoints")[0]["n"]
+        self._recent: Deque[Dict[str, Any]] = deque(
+            reversed(self._fetch_jobs(*self._list_sql(None, RECENT_JOBS_SIZE, 0))), maxlen=RECENT_JOBS_SIZE)
+        self._reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-store-read")
+
+    def _ensure_schema(self):
+        with self._conn:
+            for statement in SCHEMA:
+                self._conn.execute(statement)
+            for table, columns in ADDED_COLUMNS.items():
+                existing = {row["name"] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+                for name, kind in columns.items():
+                    if name not in existing:
+                        self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {kind}")
+
+    def _reconcile_interrupted(self):
+        """Jobs left queued / training / paused by a previous process can never report back
+
+        Only this server's own active statuses are matched: the database is
+        shared with real-backend.js, whose 'pending' / 'running' jobs are not
+        ours to fail.
+        """
+        placeholders = ", ".join("?" for _ in ACTIVE_STATUSES)
+        with self._conn:
+            cursor = self._conn.execute(
+                f"""UPDATE training_jobs
+                    SET status = 'failed', message = ?, error_message = ?,
+                        completed_at = COALESCE(completed_at, strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime'))
+                    WHERE status IN ({placeholders})""",
+                (INTERRUPTED_MESSAGE, INTERRUPTED_MESSAGE, *ACTIVE_STATUSES))
+        if cursor.rowcount:
+            logger.warning(f"Marked {cursor.rowcount} interrupted training job(s) as failed")
+
+    def _fetch(self, sql: str, params: Tuple = ()) -> List[sqlite3.Row]:
+        # read-your-writes: نوشتن‌های در صف قبل از خواندن commit می‌شوند
+        self._writer.flush()
+        return self._conn.execute(sql, params).fetchall()
+
+    def _fetch_jobs(self, sql: str, params: Tuple = ()) -> List[Dict[str, Any]]:
+        return [self._row_to_job(row) for row in self._fetch(sql, params)]
+
+    async def _read(self, func, *args):
+        """Run a blocking read (flush + query) on the reader thread"""
+        return await asyncio.get_running_loop().run_in_executor(self._reader, func, *args)
+
+    async def _query(self, sql: str, params: Tuple = ()) -> List[sqlite3.Row]:
+        return await self._read(self._fetch, sql, params)
+
+    # ===== JOBS =====
+
+    def create(self, job: Dict[str, Any]):
+        self._active[job["id"]] = job
+        self._recent.append(job)
+        self._save(job, previous=None)
+
+    async def save(self, job: Dict[str, Any]):
+        """Queue the current state of a job; repeated saves within a batch coalesce"""
+        self._save(job, await self._last_status(job["id"]))
+
+    def _save(self, job: Dict[str, Any], previous: Optional[str]):
+        self._writer.write(JOB_UPSERT, job_to_row(job), key=job["id"])
+
+        status = job["status"]
+        if previous != status:
+            if previous is not None:
+                self._status_counts[previous] -= 1
+            self._status_counts[status] += 1
+
+        if status in FINISHED_STATUSES:
+            self._active.pop(job["id"], None)
+            self._statuses.pop(job["id"], None)
+            self._remember_finished(job["id"], status)
+            series = self._series.pop(job["id"], None)
+            if series is not None:
+                self._cache_series(job["id"], series)
+        else:
+            self._finished.pop(job["id"], None)
+            self._statuses[job["id"]] = status
+
+    async def _last_status(self, job_id: str) -> Optional[str]:
+        status = self._statuses.get(job_id) or self._finished.get(job_id)
+        if status is None:
+            # dict یک job قدیمی که مدت‌ها نگه داشته شده؛ وضعیت ذخیره‌شده روی thread خواننده از دیتابیس خوانده می‌شود
+            rows = await self._query("SELECT status FROM training_jobs WHERE id = ?", (job_id,))
+            # ممکن است save دیگری در این فاصله وضعیت را ثبت کرده باشد
+            status = self._statuses.get(job_id) or self._finished.get(job_id) or (rows[0]["status"] if rows else None)
+        return status
+
+    def _remember_finished(self, job_id: str, status: str):
+        self._finished[job_id] = status
+        self._finished.move_to_end(job_id)
+        while len(self._finished) > STATUS_CACHE_JOBS:
+            self._finished.popitem(last=False)
+
+    def _loaded(self, jobs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Jobs read from the database; the ones not active here are finished"""
+        for job in jobs:
+            if job["id"] not in self._statuses:
+                self._remember_finished(job["id"], job["status"])
+        return jobs
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self._active.get(job_id)
+        if job is not None:
+            return job
+        jobs = self._loaded(await self._read(
+            self._fetch_jobs, f"SELECT {JOB_COLUMNS} FROM training_jobs WHERE id = ?", (job_id,)))
+        return jobs[0] if jobs else None
+
+    async def exists(self, job_id: str) -> bool:
+        if job_id in self._active:
+            return True
+        return bool(await self._query("SELECT 1 FROM training_jobs WHERE id = ?", (job_id,)))
+
+    @staticmethod
+    def _list_sql(status: Optional[str], limit: int, offset: int) -> Tuple[str, Tuple]:
+        if status is None:
+            return (f"SELECT {JOB_COLUMNS} FROM training_jobs ORDER BY started_at DESC LIMIT ? OFFSET ?",
+                    (limit, offset))
+        return (f"SELECT {JOB_COLUMNS} FROM training_jobs WHERE status = ? ORDER BY started_at DESC LIMIT ? OFFSET ?",
+                (status, limit, offset))
+
+    async def list_jobs(self, status: Optional[str] = None, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        """Most recently started jobs first (uses the status / started_at indexes)"""
+        jobs = self._loaded(await self._read(self._fetch_jobs, *self._list_sql(status, limit, offset)))
+        return [self._active.get(job["id"]) or job for job in jobs]
+
+    def status_counts(self) -> Dict[str, int]:
+        """Jobs per status, O(1)"""
+        return {status: count for status, count in self._status_counts.items() if count > 0}
+
+    def total_jobs(self) -> int:
+        return sum(self._status_counts.values())
+
+    async def recent_jobs(self, limit: int = 15) -> List[Dict[str, Any]]:
+        """Most recently started jobs first, O(limit)"""
+        if limit > len(self._recent) and len(self._recent) == self._recent.maxlen:
+            return await self.list_jobs(limit=limit)
+        return [self._recent[-index] for index in range(1, min(limit, len(self._recent)) + 1)]
+
+    async def count_by_status(self) -> Dict[str, int]:
+        rows = await self._query("SELECT status, COUNT(*) AS n FROM training_jobs GROUP BY status")
+        return {row["status"]: row["n"] for row in rows}
+
+    def _row_to_job(self, row: sqlite3.Row) -> Dict[str, Any]:
+        checkpoints = self._conn.execute(
+            "SELECT id FROM checkpoints WHERE job_id = ? ORDER BY created_at", (row["id"],)).fetchall()
+        return {
+            "id": row["id"],
+            "status": row["status"],
+            "progress": row["progress"] or 0,
+            "message": row["message"] or row["error_message"] or "",
+            "config": json.loads(row["config_json"] or "{}"),
+            "startTime": row["started_at"] or "",
+            "endTime": row["completed_at"],
+            "metrics": json.loads(row["metrics_json"] or "{}"),
+            "checkpoints": [checkpoint["id"] for checkpoint in checkpoints],
+        }
+
+    # ===== METRICS =====
+
+    def add_metrics(self, job_id: str, metrics: Dict[str, Any]):
+        """Record one progress sample of an active job"""
+        step = metrics.get("step")
+        if step is None:
+            return
+        series = self._series.get(job_id)
+        if series is None:
+            series = self._series[job_id] = MetricSeries()
+        series.append(step, {name: value for name, value in metrics.items() if name not in ("step", "epoch")})
+        self._writer.write(METRIC_INSERT, (
+            job_id, metrics.get("epoch"), step, *(metrics.get(name) for name in METRIC_COLUMNS)))
+
+    async def metric_history(self, job_id: str, start: Optional[float] = None, end: Optional[float] = None,
+                       points: int = DEFAULT_POINTS) -> Optional[Dict[str, Any]]:
+        """Downsampled series per metric for start <= step <= end; None if the job is unknown"""
+        series = self._series.get(job_id) or self._series_cache.get(job_id)
+        if series is None:
+            if not await self.exists(job_id):
+                return None
+            series = MetricSeries.from_columns(*await self._read(self._read_metrics, job_id))
+        if job_id not in self._series:
+            self._cache_series(job_id, series)
+
+        steps, columns = series.window(start, end)
+        # بزرگ‌نمایی بیشتر از دقت سری فشرده‌شده: همان بازه با دقت کامل از دیتابیس خوانده می‌شود
+        if series.stride > 1 and len(steps) < points:
+            steps, columns = await self._read(self._read_metrics, job_id, start, end)
+
+        result = {}
+        for name, values in columns.items():
+            x, y = downsample(steps, values, points)
+            if len(x):
+                result[name] = {"step": x.tolist(), "value": y.astype(float).tolist()}
+        return {"jobId": job_id, "points": len(steps), "stride": series.stride, "series": result}
+
+    def _read_metrics(self, job_id: str, start: Optional[float] = None, end: Optional[float] = None
+                      ) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Runs on the reader thread"""
+        # ردیف‌های PersianMLTrainer فقط epoch دارند
+        sql = (f"SELECT COALESCE(step, epoch), {', '.join(METRIC_COLUMNS.values())} FROM training_metrics "
+               f"WHERE job_id = ?")
+        params: List[Any] = [job_id]
+        if start is not None:
+            sql += " AND step >= ?"
+            params.append(start)
+        if end is not None:
+            sql += " AND step <= ?"
+            params.append(end)
+        self._writer.flush()
+        cursor = self._conn.cursor()
+        cursor.row_factory = None
+        rows = cursor.execute(sql + " ORDER BY step, epoch", params).fetchall()
+        table = np.array(rows, dtype=np.float64).reshape(len(rows), len(METRIC_COLUMNS) + 1)
+        columns = {name: table[:, index + 1] for index, name in enumerate(METRIC_COLUMNS)
+                   if not np.isnan(table[:, index + 1]).all()}
+        return table[:, 0], columns
+
+    def _cache_series(self, job_id: str, series: MetricSeries):
+        self._series_cache[job_id] = series
+        self._series_cache.move_to_end(job_id)
+        while len(self._series_cache) > METRICS_CACHE_JOBS:
+            self._series_cache.popitem(last=False)
+
+    # ===== CHECKPOINTS =====
+
+    async def add_checkpoint(self, job_id: str, checkpoint: Dict[str, Any]):
+        self._writer.write(CHECKPOINT_INSERT, (
+            checkpoint["id"], job_id, checkpoint["name"], checkpoint.get("path"), checkpoint.get("createdAt"),
+            checkpoint.get("size", 0), json.dumps(checkpoint.get("metrics") or {}), int(bool(checkpoint.get("isBest"))),
+        ))
+        await self._recount_checkpoints()
+
+    async def _recount_checkpoints(self):
+        # INSERT OR REPLACE یک id تکراری را جایگزین می‌کند و حذف هم‌زمان ممکن است دو بار اجرا شود؛
+        # شمارنده بعد از flush از دیتابیس خوانده می‌شود (checkpoint ها کم‌اند و این کار روی thread خواننده است)
+        self._checkpoint_count = (await self._query("SELECT COUNT(*) AS n FROM checkpoints"))[0]["n"]
+
+    async def get_checkpoint(self, checkpoint_id: str) -> Optional[Dict[str, Any]]:
+        rows = await self._query(f"SELECT {CHECKPOINT_COLUMNS} FROM checkpoints WHERE id = ?", (checkpoint_id,))
+        return row_to_checkpoint(rows[0]) if rows else None
+
+    async def list_checkpoints(self, limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
+        rows = await self._query(
+            f"SELECT {CHECKPOINT_COLUMNS} FROM checkpoints ORDER BY created_at DESC LIMIT ? OFFSET ?",
+            (limit, offset))
+        return [row_to_checkpoint(row) for row in rows]
+
+    async def last_checkpoint(self, job_id: str) -> Optional[Dict[str, Any]]:
+        rows = await self._query(
+            f"SELECT {CHECKPOINT_COLUMNS} FROM checkpoints WHERE job_id = ? ORDER BY created_at DESC LIMIT 1",
+            (job_id,))
+        return row_to_checkpoint(rows[0]) if rows else None
+
+    async def delete_checkpoint(self, checkpoint_id: str) -> bool:
+        if await self.get_checkpoint(checkpoint_id) is None:
+            return False
+        self._writer.write("DELETE FROM checkpoints WHERE id = ?", (checkpoint_id,))
+        await self._recount_checkpoints()
+        return True
+
+    def checkpoint_count(self) -> int:
+        return self._checkpoint_count
+
+    def close(self):
+        self._reader.shutdown(wait=True)
+        self._writer.close()
+        self._conn.close()
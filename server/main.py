@@ -3,18 +3,23 @@ FastAPI Backend for ML Training Platform
 با قابلیت Auto-tuning، Fault Tolerance، و Checkpoint Management
 """
 
-from fastapi import FastAPI, WebSocket, HTTPException, BackgroundTasks, Depends
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 import asyncio
-import torch
-import optuna
 import json
 from loguru import logger
 
+from autotuning import AutoTuner
+from broadcast import BroadcastHub
+from inference import InferenceService, resolve_model_path
+from job_store import FINISHED_STATUSES, JobStore
+from system_monitor import SystemMonitor
+from training_scheduler import TrainingScheduler
+
 # Initialize FastAPI app
 app = FastAPI(
     title="ML Training Platform API",
@@ -72,31 +77,74 @@ class CheckpointInfo(BaseModel):
 class AutoTuningRequest(BaseModel):
     baseModel: str
     datasets: List[str]
-    budget: int = 20
+    budget: int = Field(20, ge=1)
     metric: str = "val_loss"
     searchSpace: Dict[str, List[Any]]
+    parallelism: Optional[int] = Field(None, ge=1)
+
+class PredictRequest(BaseModel):
+    modelId: str
+    texts: List[str] = Field(..., min_length=1, max_length=256)
 
 # ===== STORAGE =====
 
-# In-memory storage (در production باید از database استفاده شود)
-training_jobs = {}
-checkpoints_db = {}
-websocket_connections = {}
+# سرویس‌ها در startup ساخته می‌شوند، نه هنگام import: با python main.py، worker های spawn شده‌ی
+# auto-tuning این فایل را دوباره import می‌کنند و نباید JobStore، sampler یا scheduler خودشان را بسازند
+job_store: JobStore
+hub: BroadcastHub
+system_monitor: SystemMonitor
+inference: InferenceService
+autotuner: AutoTuner
+scheduler: TrainingScheduler
+
+# ===== LIFECYCLE =====
+
+@app.on_event("startup")
+async def start_background_tasks():
+    global job_store, hub, system_monitor, inference, autotuner, scheduler
+    
+    # Jobs and checkpoints persist in SQLite (WAL); active jobs are kept in memory
+    job_store = JobStore()
+    
+    # WebSocket fan-out: per-client bounded queues, updates coalesced per job
+    hub = BroadcastHub()
+    system_monitor = SystemMonitor()
+    
+    # Trained models are cached in memory (LRU) and concurrent predictions are micro-batched
+    inference = InferenceService()
+    
+    # Auto-tuning jobs stream each trial result over the same WebSocket channel
+    autotuner = AutoTuner(on_update=hub.publish_event)
+    
+    # Training jobs run in worker processes and report back through handle_training_event
+    scheduler = TrainingScheduler(on_event=handle_training_event)
+    
+    hub.start()
+    system_monitor.start()
+
+@app.on_event("shutdown")
+async def shutdown_workers():
+    autotuner.shutdown()
+    await scheduler.shutdown()
+    hub.close()
+    system_monitor.close()
+    inference.close()
+    job_store.close()
 
 # ===== HEALTH CHECK =====
 
 @app.get("/api/health")
 async def health_check():
-    """Health check endpoint"""
-    gpu_available = torch.cuda.is_available()
-    gpu_count = torch.cuda.device_count() if gpu_available else 0
+    """Health check endpoint (served from the background system sampler)"""
+    gpu = system_monitor.gpu
     
     return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "gpu_available": gpu_available,
-        "gpu_count": gpu_count,
-        "pytorch_version": torch.__version__
+        "gpu_available": gpu.available if gpu else False,
+        "gpu_count": gpu.count if gpu else 0,
+        "pytorch_version": gpu.torch_version if gpu else None,
+        "sampledAt": system_monitor.latest()["timestamp"]
     }
 
 # ===== MODELS ENDPOINTS =====
@@ -158,8 +206,8 @@ async def get_datasets():
 # ===== TRAINING ENDPOINTS =====
 
 @app.post("/api/training/start")
-async def start_training(config: TrainingConfig, background_tasks: BackgroundTasks):
-    """Start a new training job"""
+async def start_training(config: TrainingConfig):
+    """Queue a new training job on the worker pool"""
     job_id = f"job-{datetime.now().timestamp()}"
     
     # Validate configuration
@@ -170,111 +218,85 @@ async def start_training(config: TrainingConfig, background_tasks: BackgroundTas
         raise HTTPException(status_code=400, detail="At least one dataset is required")
     
     # Initialize job
-    training_jobs[job_id] = {
+    job = {
         "id": job_id,
-        "status": "initializing",
+        "status": "queued",
         "progress": 0,
-        "message": "Initializing training...",
+        "message": "Waiting for a free training worker...",
         "config": config.dict(),
         "startTime": datetime.now().isoformat(),
         "metrics": {},
         "checkpoints": []
     }
     
-    # Start training in background
-    background_tasks.add_task(run_training, job_id, config)
+    # Dispatch to the training worker pool; the worker starts only after this handler yields
+    try:
+        scheduler.submit(job_id, config.dict(), owner=str(config.config.get("owner", "default")))
+    except RuntimeError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    job_store.create(job)
     
-    logger.info(f"Training job {job_id} started")
+    logger.info(f"Training job {job_id} queued")
     
-    return {"id": job_id, "status": "started"}
+    return {"id": job_id, "status": "queued", "queuePosition": scheduler.queue_position(job_id)}
 
-async def run_training(job_id: str, config: TrainingConfig):
-    """Run training process with fault tolerance"""
-    try:
-        job = training_jobs[job_id]
+async def handle_training_event(job_id: str, event: Dict[str, Any]):
+    """Apply a progress event from a training worker to the job record"""
+    job = await job_store.get(job_id)
+    if job is None:
+        return
+    
+    kind = event["event"]
+    if kind == "started":
         job["status"] = "training"
-        
-        # Training configuration
-        epochs = config.config.get("epochs", 10)
-        batch_size = config.config.get("batchSize", 32)
-        learning_rate = config.config.get("learningRate", 0.001)
-        
-        # Enable fault tolerance
-        enable_auto_recovery = config.config.get("enableAutoRecovery", True)
-        save_checkpoint_every = config.config.get("saveCheckpointEvery", 100)
-        
-        # Simulate training
-        total_steps = epochs * 100  # Simplified
-        
-        for step in range(total_steps):
-            # Simulate training step
-            await asyncio.sleep(0.1)  # Simulate computation
-            
-            # Update metrics
-            train_loss = 2.0 - (step / total_steps) * 1.5  # Decreasing loss
-            val_loss = train_loss + 0.1
-            
-            job["metrics"] = {
-                "epoch": step // 100,
-                "step": step,
-                "trainLoss": train_loss,
-                "valLoss": val_loss,
-                "learningRate": learning_rate * (1 - step / total_steps),  # LR decay
-                "throughput": 125.5,
-                "gradientNorm": 0.5 + (step % 10) * 0.05
-            }
-            
-            job["progress"] = (step / total_steps) * 100
-            job["message"] = f"Training epoch {step // 100 + 1}/{epochs}..."
-            
-            # Save checkpoint
-            if step % save_checkpoint_every == 0 and step > 0:
-                checkpoint_id = f"ckpt-{job_id}-{step}"
-                checkpoints_db[checkpoint_id] = {
-                    "id": checkpoint_id,
-                    "name": f"{config.modelName}-step-{step}",
-                    "path": f"/checkpoints/{checkpoint_id}.pt",
-                    "createdAt": datetime.now().isoformat(),
-                    "size": 524288000,  # 500MB
-                    "metrics": {
-                        "valLoss": val_loss,
-                        "epoch": step // 100
-                    },
-                    "isBest": val_loss < 0.5
-                }
-                job["checkpoints"].append(checkpoint_id)
-                logger.info(f"Checkpoint saved: {checkpoint_id}")
-            
-            # Broadcast to WebSocket clients
-            await broadcast_training_update(job_id, job)
-            
-            # Simulate random failure for testing auto-recovery
-            if enable_auto_recovery and step == total_steps // 2:
-                logger.warning(f"Simulating failure at step {step}")
-                # Auto-recovery would kick in here
-                await asyncio.sleep(2)
-                logger.info("Auto-recovery completed")
-        
-        # Training completed
+        job["message"] = "Training started"
+    elif kind == "progress":
+        job["status"] = "training"
+        job["progress"] = event.get("progress", job["progress"])
+        job["message"] = event.get("message", job["message"])
+        job["metrics"] = event.get("metrics", {})
+        job_store.add_metrics(job_id, job["metrics"])
+    elif kind == "checkpoint":
+        checkpoint = event["checkpoint"]
+        await job_store.add_checkpoint(job_id, checkpoint)
+        job["checkpoints"].append(checkpoint["id"])
+        logger.info(f"Checkpoint saved: {checkpoint['id']}")
+    elif kind == "completed":
         job["status"] = "completed"
         job["progress"] = 100
-        job["message"] = "Training completed successfully!"
-        
+        job["message"] = event.get("message", "Training completed successfully!")
         logger.info(f"Training job {job_id} completed")
-        
-    except Exception as e:
-        logger.error(f"Training job {job_id} failed: {str(e)}")
+    elif kind == "failed":
         job["status"] = "failed"
-        job["message"] = str(e)
+        job["message"] = event.get("error", "Training failed")
+        logger.error(f"Training job {job_id} failed: {job['message']}")
+    elif kind == "paused":
+        job["status"] = "paused"
+        job["message"] = "Training paused"
+    elif kind == "resumed":
+        job["status"] = "queued" if event.get("queued") else "training"
+        job["message"] = "Training resumed"
+    elif kind == "stopped":
+        job["status"] = "stopped"
+        job["message"] = event.get("message", "Training stopped")
+        logger.info(f"Training job {job_id} stopped")
+    
+    if job["status"] in FINISHED_STATUSES:
+        job.setdefault("endTime", datetime.now().isoformat())
+    await job_store.save(job)
+    
+    # Broadcast to WebSocket clients
+    hub.publish(job_id, job)
+    if job["status"] in FINISHED_STATUSES:
+        hub.finish(job_id)
 
 @app.get("/api/training/{job_id}/status", response_model=TrainingStatus)
 async def get_training_status(job_id: str):
     """Get training job status"""
-    if job_id not in training_jobs:
+    job = await job_store.get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Training job not found")
     
-    job = training_jobs[job_id]
-    
     return {
         "status": job["status"],
         "progress": job["progress"],
@@ -282,13 +304,33 @@ async def get_training_status(job_id: str):
         "metrics": job.get("metrics", {})
     }
 
+@app.get("/api/training/{job_id}/metrics")
+async def get_training_metrics(
+    job_id: str,
+    start: Optional[float] = Query(None, alias="from"),
+    end: Optional[float] = Query(None, alias="to"),
+    points: int = Query(1000, ge=3, le=10000)
+):
+    """Get the metric history of a training job, downsampled to at most `points` per metric"""
+    history = await job_store.metric_history(job_id, start, end, points)
+    if history is None:
+        raise HTTPException(status_code=404, detail="Training job not found")
+    
+    return history
+
+async def control_training(job_id: str, command: str):
+    """Forward a control command to the job's worker"""
+    job = await job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Training job not found")
+    
+    if job["status"] in FINISHED_STATUSES or not await scheduler.control(job_id, command):
+        raise HTTPException(status_code=409, detail=f"Training job is {job['status']}")
+
 @app.post("/api/training/{job_id}/pause")
 async def pause_training(job_id: str):
     """Pause training job"""
-    if job_id not in training_jobs:
-        raise HTTPException(status_code=404, detail="Training job not found")
-    
-    training_jobs[job_id]["status"] = "paused"
+    await control_training(job_id, "pause")
     logger.info(f"Training job {job_id} paused")
     
     return {"status": "paused"}
@@ -296,10 +338,7 @@ async def pause_training(job_id: str):
 @app.post("/api/training/{job_id}/resume")
 async def resume_training(job_id: str):
     """Resume training job"""
-    if job_id not in training_jobs:
-        raise HTTPException(status_code=404, detail="Training job not found")
-    
-    training_jobs[job_id]["status"] = "training"
+    await control_training(job_id, "resume")
     logger.info(f"Training job {job_id} resumed")
     
     return {"status": "resumed"}
@@ -307,87 +346,85 @@ async def resume_training(job_id: str):
 @app.post("/api/training/{job_id}/stop")
 async def stop_training(job_id: str):
     """Stop training job"""
-    if job_id not in training_jobs:
-        raise HTTPException(status_code=404, detail="Training job not found")
-    
-    training_jobs[job_id]["status"] = "stopped"
-    logger.info(f"Training job {job_id} stopped")
+    await control_training(job_id, "stop")
+    logger.info(f"Training job {job_id} stopping")
     
     return {"status": "stopped"}
 
 # ===== AUTO-TUNING ENDPOINTS =====
 
 @app.post("/api/autotuning/start")
-async def start_autotuning(request: AutoTuningRequest, background_tasks: BackgroundTasks):
-    """Start hyperparameter optimization"""
-    
-    # Create Optuna study
-    study = optuna.create_study(direction="minimize")
-    
-    def objective(trial):
-        # Sample hyperparameters from search space
-        lr = trial.suggest_float("learningRate", 1e-5, 1e-2, log=True)
-        batch_size = trial.suggest_categorical("batchSize", request.searchSpace.get("batchSize", [16, 32, 64]))
-        optimizer = trial.suggest_categorical("optimizer", request.searchSpace.get("optimizer", ["adam", "adamw"]))
-        
-        # Simulate training with these hyperparameters
-        # In real implementation, this would actually train the model
-        score = lr * 100 + (1 / batch_size) * 10  # Simplified scoring
-        
-        return score
-    
-    # Run optimization
-    study.optimize(objective, n_trials=request.budget)
-    
-    # Get results
-    trials = []
-    for trial in study.trials:
-        trials.append({
-            "id": trial.number,
-            "config": trial.params,
-            "score": trial.value
-        })
-    
-    best_trial = study.best_trial
-    best_config = best_trial.params
-    best_score = best_trial.value
-    
-    logger.info(f"Auto-tuning completed. Best score: {best_score}")
+async def start_autotuning(request: AutoTuningRequest):
+    """Start hyperparameter optimization as a background job"""
+    try:
+        job = autotuner.submit(
+            base_model=request.baseModel,
+            datasets=request.datasets,
+            budget=request.budget,
+            metric=request.metric,
+            search_space=request.searchSpace,
+            parallelism=request.parallelism
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    
+    logger.info(f"Auto-tuning job {job['id']} queued ({request.budget} trials, {job['parallelism']} parallel)")
+    
+    return {"id": job["id"], "status": job["status"]}
+
+@app.get("/api/autotuning/{job_id}/status")
+async def get_autotuning_status(job_id: str, since: int = 0):
+    """Get auto-tuning job status; trials after index `since` only"""
+    job = autotuner.jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Auto-tuning job not found")
     
     return {
-        "trials": trials,
-        "bestConfig": best_config,
-        "bestScore": best_score,
-        "searchSpace": request.searchSpace
+        "id": job_id,
+        "status": job["status"],
+        "message": job["message"],
+        "completed": len(job["trials"]),
+        "budget": job["budget"],
+        "trials": job["trials"][since:],
+        "bestConfig": job["bestConfig"],
+        "bestScore": job["bestScore"],
+        "searchSpace": job["searchSpace"]
     }
 
+@app.post("/api/autotuning/{job_id}/cancel")
+async def cancel_autotuning(job_id: str):
+    """Cancel auto-tuning job"""
+    if job_id not in autotuner.jobs:
+        raise HTTPException(status_code=404, detail="Auto-tuning job not found")
+    
+    if not autotuner.cancel(job_id):
+        raise HTTPException(status_code=409, detail="Auto-tuning job already finished")
+    
+    logger.info(f"Auto-tuning job {job_id} cancelling")
+    
+    return {"status": "cancelling"}
+
 # ===== CHECKPOINT ENDPOINTS =====
 
 @app.get("/api/checkpoints", response_model=List[CheckpointInfo])
-async def get_checkpoints():
-    """Get all checkpoints"""
-    return list(checkpoints_db.values())
+async def get_checkpoints(limit: int = 100, offset: int = 0):
+    """Get checkpoints, newest first"""
+    return await job_store.list_checkpoints(limit=limit, offset=offset)
 
 @app.get("/api/checkpoints/{job_id}/last")
 async def get_last_checkpoint(job_id: str):
     """Get last checkpoint for a job"""
-    job = training_jobs.get(job_id)
-    if not job:
+    if not await job_store.exists(job_id):
         raise HTTPException(status_code=404, detail="Training job not found")
     
-    if not job.get("checkpoints"):
-        return None
-    
-    last_checkpoint_id = job["checkpoints"][-1]
-    return checkpoints_db.get(last_checkpoint_id)
+    return await job_store.last_checkpoint(job_id)
 
 @app.delete("/api/checkpoints/{checkpoint_id}")
 async def delete_checkpoint(checkpoint_id: str):
     """Delete a checkpoint"""
-    if checkpoint_id not in checkpoints_db:
+    if not await job_store.delete_checkpoint(checkpoint_id):
         raise HTTPException(status_code=404, detail="Checkpoint not found")
     
-    del checkpoints_db[checkpoint_id]
     logger.info(f"Checkpoint {checkpoint_id} deleted")
     
     return {"status": "deleted"}
@@ -395,7 +432,7 @@ async def delete_checkpoint(checkpoint_id: str):
 @app.post("/api/training/{job_id}/save")
 async def save_trained_model(job_id: str, request: Dict[str, Any]):
     """Save trained model"""
-    if job_id not in training_jobs:
+    if not await job_store.exists(job_id):
         raise HTTPException(status_code=404, detail="Training job not found")
     
     model_name = request.get("name")
@@ -412,54 +449,124 @@ async def save_trained_model(job_id: str, request: Dict[str, Any]):
         "format": format_type
     }
 
+# ===== INFERENCE ENDPOINTS =====
+
+@app.post("/api/predict")
+async def predict(request: PredictRequest):
+    """Predict with a trained model (models/<modelId> or models/final_<jobId>.h5)"""
+    model_path = resolve_model_path(request.modelId)
+    if model_path is None:
+        raise HTTPException(status_code=404, detail="Model not found")
+    
+    try:
+        predictions = await inference.predict(model_path, request.texts)
+    except RuntimeError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except (FileNotFoundError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    return {"modelId": request.modelId, "predictions": predictions}
+
+@app.get("/api/predict/stats")
+async def get_inference_stats():
+    """Inference cache and batching statistics"""
+    return inference.stats()
+
 # ===== WEBSOCKET ENDPOINT =====
 
+@app.websocket("/ws/training")
 @app.websocket("/ws/training/{job_id}")
-async def websocket_endpoint(websocket: WebSocket, job_id: str):
-    """WebSocket endpoint for real-time training updates"""
+@app.websocket("/ws/autotuning/{job_id}")
+async def websocket_endpoint(websocket: WebSocket, job_id: Optional[str] = None, since: Optional[int] = None,
+                             epoch: Optional[str] = None):
+    """WebSocket endpoint for real-time training and auto-tuning updates
+    
+    Training jobs send a snapshot, then deltas; reconnect with ?since=<seq>&epoch=<epoch> to resume.
+    More jobs can be subscribed over the socket (see broadcast.py for the protocol).
+    """
     await websocket.accept()
     
-    # Add to connections
-    if job_id not in websocket_connections:
-        websocket_connections[job_id] = []
-    websocket_connections[job_id].append(websocket)
+    client = hub.connect(websocket)
+    if job_id is not None:
+        await subscribe_job(client, job_id, since, epoch)
     
     try:
         while True:
-            # Keep connection alive
-            await asyncio.sleep(1)
+            text = await websocket.receive_text()
+            client.touch()
+            try:
+                message = json.loads(text)
+            except ValueError:
+                client.send({"type": "error", "message": "Invalid JSON"}, urgent=True)
+                continue
+            await handle_client_message(client, message)
+    except WebSocketDisconnect:
+        pass
     except Exception as e:
         logger.error(f"WebSocket error: {str(e)}")
     finally:
-        # Remove from connections
-        websocket_connections[job_id].remove(websocket)
-
-async def broadcast_training_update(job_id: str, job_data: Dict):
-    """Broadcast training update to all connected clients"""
-    if job_id in websocket_connections:
-        for websocket in websocket_connections[job_id]:
-            try:
-                await websocket.send_json(job_data)
-            except:
-                pass
+        hub.disconnect(client)
+
+async def subscribe_job(client, job_id: str, since: Optional[int] = None, epoch: Optional[str] = None):
+    """Subscribe a WebSocket client to a training (or auto-tuning) job"""
+    job = await job_store.get(job_id)
+    hub.subscribe(client, job_id, job, since, epoch)
+    if job is not None and job["status"] in FINISHED_STATUSES:
+        # job تمام‌شده delta دیگری ندارد؛ فقط snapshot کافی است
+        hub.finish(job_id)
+
+def is_resume_point(point: Any) -> bool:
+    """{"epoch": str, "seq": int} as sent back by a client that wants to resume a stream"""
+    seq = point.get("seq") if isinstance(point, dict) else None
+    return isinstance(seq, int) and not isinstance(seq, bool) and isinstance(point.get("epoch"), str)
+
+async def handle_client_message(client, message: Dict[str, Any]):
+    """Apply a client -> server WebSocket message"""
+    kind = message.get("type") if isinstance(message, dict) else None
+    
+    # فیلدهای نامعتبر با پیام error پاسخ داده می‌شوند و اتصال باز می‌ماند
+    if kind in ("subscribe", "unsubscribe"):
+        jobs = message.get("jobs", [])
+        if not isinstance(jobs, list) or not all(isinstance(job_id, str) for job_id in jobs):
+            client.send({"type": "error", "message": "'jobs' must be a list of job ids"}, urgent=True)
+            return
+    
+    if kind == "subscribe":
+        since = message.get("since") or {}
+        if not isinstance(since, dict) or not all(is_resume_point(point) for point in since.values() if point is not None):
+            client.send({"type": "error", "message": "'since' must map job ids to {\"epoch\": ..., \"seq\": ...}"},
+                        urgent=True)
+            return
+        for job_id in jobs:
+            point = since.get(job_id) or {}
+            await subscribe_job(client, job_id, point.get("seq"), point.get("epoch"))
+    elif kind == "unsubscribe":
+        for job_id in jobs:
+            hub.unsubscribe(client, job_id)
+    elif kind == "throttle":
+        rate = message.get("rate") or 0
+        if isinstance(rate, bool) or not isinstance(rate, (int, float)) or not 0 <= rate < float("inf"):
+            client.send({"type": "error", "message": "'rate' must be a non-negative number"}, urgent=True)
+            return
+        client.throttle(float(rate))
+    elif kind == "ping":
+        client.send({"type": "pong"}, urgent=True)
+    elif kind != "pong":
+        client.send({"type": "error", "message": f"Unknown message type: {kind}"}, urgent=True)
 
 # ===== SYSTEM METRICS =====
 
 @app.get("/api/system/metrics")
 async def get_system_metrics():
-    """Get system resource metrics"""
-    if torch.cuda.is_available():
-        gpu_memory_allocated = torch.cuda.memory_allocated(0) / 1024**3  # GB
-        gpu_memory_reserved = torch.cuda.memory_reserved(0) / 1024**3  # GB
-        gpu_utilization = (gpu_memory_allocated / gpu_memory_reserved * 100) if gpu_memory_reserved > 0 else 0
-    else:
-        gpu_utilization = 0
-    
+    """Get the latest system resource sample"""
+    return system_monitor.latest()
+
+@app.get("/api/system/metrics/history")
+async def get_system_metrics_history(seconds: Optional[float] = Query(None, gt=0)):
+    """Get recent system resource samples, oldest first"""
     return {
-        "cpu": 45.0,  # Simulated
-        "memory": 62.0,  # Simulated
-        "gpu": gpu_utilization,
-        "timestamp": datetime.now().isoformat()
+        "interval": system_monitor.interval,
+        "samples": system_monitor.recent(seconds)
     }
 
 # ===== DASHBOARD ENDPOINTS =====
@@ -467,17 +574,19 @@ async def get_system_metrics():
 @app.get("/api/dashboard/stats")
 async def get_dashboard_stats():
     """Get dashboard statistics"""
-    active_jobs = sum(1 for job in training_jobs.values() if job["status"] == "training")
-    completed_jobs = sum(1 for job in training_jobs.values() if job["status"] == "completed")
+    counts = job_store.status_counts()
+    active_jobs = counts.get("training", 0)
+    completed_jobs = counts.get("completed", 0)
+    checkpoint_count = job_store.checkpoint_count()
     
     return {
         "runs": {
             "active": active_jobs,
-            "total": len(training_jobs)
+            "total": job_store.total_jobs()
         },
         "assets": {
-            "ready": len(checkpoints_db),
-            "total": len(checkpoints_db)
+            "ready": checkpoint_count,
+            "total": checkpoint_count
         },
         "todayTrainings": active_jobs + completed_jobs
     }
@@ -487,11 +596,11 @@ async def get_recent_activities(limit: int = 15):
     """Get recent activities"""
     activities = []
     
-    for job_id, job in sorted(training_jobs.items(), key=lambda x: x[1].get("startTime", ""), reverse=True)[:limit]:
+    for job in await job_store.recent_jobs(limit):
         activities.append({
-            "id": job_id,
+            "id": job["id"],
             "type": "training" if job["status"] == "training" else "complete" if job["status"] == "completed" else "error",
-            "message": f"Training {job_id}: {job['message']}",
+            "message": f"Training {job['id']}: {job['message']}",
             "timestamp": job.get("startTime", "")
         })
     
@@ -501,4 +610,5 @@ async def get_recent_activities(limit: int = 15):
 
 if __name__ == "__main__":
     import uvicorn
+    # jobs, counters and training workers live in this process: a single worker only
     uvicorn.run(app, host="0.0.0.0", port=8000, log_level="info")
@@ -0,0 +1,161 @@
+"""
+Metric time-series for training jobs
+هر متریک یک ستون numpy است که با step هم‌تراز است؛ برای نمایش نمودار با min-max و LTTB کاهش نمونه داده می‌شود
+"""
+
+import os
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+MAX_POINTS = int(os.getenv("METRICS_MAX_POINTS", "100000"))
+DEFAULT_POINTS = 1000
+# پیش‌انتخاب min-max قبل از LTTB: تعداد نقطه‌های کاندید به ازای هر نقطه‌ی خروجی
+MINMAX_RATIO = 4
+
+Series = Tuple[np.ndarray, np.ndarray]
+
+
+def minmax(x: np.ndarray, y: np.ndarray, buckets: int) -> Series:
+    """Keep the min and max of every bucket, in x order (vectorized)"""
+    n = len(x)
+    if n <= buckets * 2:
+        return x, y
+    size = n // buckets
+    body = y[:size * buckets].reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    picks = np.concatenate([offsets + body.argmin(axis=1), offsets + body.argmax(axis=1),
+                            [0, n - 1], np.arange(size * buckets, n)])
+    # انتهای آرایه که در bucket ها جا نشده کامل نگه داشته می‌شود
+    picks = np.unique(picks)
+    return x[picks], y[picks]
+
+
+def lttb(x: np.ndarray, y: np.ndarray, points: int) -> Series:
+    """Largest-Triangle-Three-Buckets downsampling to at most `points` points"""
+    n = len(x)
+    if points >= n or points < 3:
+        return x, y
+
+    # bucket های داخلی بین نقطه‌ی اول و آخر؛ اندازه‌ها حداکثر یک واحد تفاوت دارند
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    starts, sizes = edges[:-1], np.diff(edges)
+    index = starts[:, None] + np.minimum(np.arange(sizes.max()), sizes[:, None] - 1)
+    bucket_x, bucket_y = x[index], y[index]
+
+    # میانگین bucket بعدی رأس سوم مثلث است؛ برای bucket آخر، نقطه‌ی آخر
+    # (با edges[-1] = n - 1، آخرین جمع reduceat نقطه‌ی آخر را شامل نمی‌شود و کنار گذاشته می‌شود)
+    sum_x, sum_y = np.add.reduceat(x, edges)[:-1], np.add.reduceat(y, edges)[:-1]
+    mean_x = np.append(sum_x[1:] / sizes[1:], x[-1])
+    mean_y = np.append(sum_y[1:] / sizes[1:], y[-1])
+
+    picks = np.empty(points, dtype=np.int64)
+    picks[0], picks[-1] = 0, n - 1
+    previous_x, previous_y = x[0], y[0]
+    for bucket in range(points - 2):
+        row_x, row_y = bucket_x[bucket], bucket_y[bucket]
+        area = np.abs((previous_x - mean_x[bucket]) * (row_y - previous_y)
+                      - (previous_x - row_x) * (mean_y[bucket] - previous_y))
+        best = area.argmax()
+        picks[bucket + 1] = index[bucket, best]
+        previous_x, previous_y = row_x[best], row_y[best]
+    return x[picks], y[picks]
+
+
+def downsample(x: np.ndarray, y: np.ndarray, points: int = DEFAULT_POINTS) -> Series:
+    """Min-max preselection followed by LTTB; NaN gaps (metric not reported) are dropped"""
+    present = ~np.isnan(y)
+    if not present.all():
+        x, y = x[present], y[present]
+    if len(x) > points * MINMAX_RATIO:
+        x, y = minmax(x, y, points * MINMAX_RATIO // 2)
+    return lttb(x, y, points)
+
+
+class MetricSeries:
+    """Append-only per-job metric columns sharing one step axis
+
+    Columns grow by doubling up to max_points; past that the series is
+    compacted by keeping every other point and later appends are sampled at
+    the same stride, so memory stays bounded while the overall shape of a
+    very long run is preserved. Full resolution remains in training_metrics.
+    """
+
+    def __init__(self, max_points: int = MAX_POINTS, capacity: int = 1024):
+        self.max_points = max(2, max_points)
+        self.stride = 1
+        self._seen = 0
+        self._size = 0
+        self._steps = np.empty(min(capacity, self.max_points), dtype=np.float64)
+        self._columns: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def names(self) -> Iterable[str]:
+        return self._columns.keys()
+
+    def _column(self, name: str) -> np.ndarray:
+        column = self._columns.get(name)
+        if column is None:
+            column = np.full(len(self._steps), np.nan, dtype=np.float32)
+            self._columns[name] = column
+        return column
+
+    def _grow(self):
+        capacity = min(max(len(self._steps) * 2, 1024), self.max_points)
+        if capacity == len(self._steps):
+            self._compact()
+            return
+        self._steps = np.resize(self._steps, capacity)
+        for name, column in self._columns.items():
+            grown = np.full(capacity, np.nan, dtype=np.float32)
+            grown[:self._size] = column[:self._size]
+            self._columns[name] = grown
+
+    def _compact(self):
+        kept = (self._size + 1) // 2
+        self._steps[:kept] = self._steps[:self._size:2]
+        for column in self._columns.values():
+            column[:kept] = column[:self._size:2]
+            column[kept:] = np.nan
+        self._size = kept
+        self.stride *= 2
+
+    def append(self, step: float, metrics: Dict[str, float]):
+        if self._size == len(self._steps):
+            self._grow()
+        seen, self._seen = self._seen, self._seen + 1
+        if seen % self.stride:
+            return
+        index = self._size
+        self._steps[index] = step
+        for name, value in metrics.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self._column(name)[index] = value
+        self._size += 1
+
+    def window(self, start: Optional[float] = None, end: Optional[float] = None
+               ) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Views of the points with start <= step <= end"""
+        steps = self._steps[:self._size]
+        lo = 0 if start is None else int(np.searchsorted(steps, start, side="left"))
+        hi = self._size if end is None else int(np.searchsorted(steps, end, side="right"))
+        return steps[lo:hi], {name: column[lo:hi] for name, column in self._columns.items()}
+
+    @classmethod
+    def from_columns(cls, steps: np.ndarray, columns: Dict[str, np.ndarray],
+                     max_points: int = MAX_POINTS) -> "MetricSeries":
+        """Build a series from full-resolution arrays (e.g. rows read back from SQLite)"""
+        series = cls(max_points=max_points, capacity=1)
+        stride = 1
+        while len(steps) > series.max_points * stride:
+            stride *= 2
+        series.stride = stride
+        series._seen = len(steps)
+        series._steps = np.ascontiguousarray(steps[::stride], dtype=np.float64)
+        series._size = len(series._steps)
+        series._columns = {name: np.ascontiguousarray(column[::stride], dtype=np.float32)
+                           for name, column in columns.items()}
+        return series
@@ -7,7 +7,8 @@ This script provides real ML training capabilities using TensorFlow/Keras
 import os
 import sys
 import json
-import sqlite3
+import time
+import itertools
 import numpy as np
 import pandas as pd
 from datetime import datetime
@@ -16,10 +17,92 @@ from tensorflow import keras
 from tensorflow.keras import layers
 import logging
 
+from dataset_stream import iter_records
+from db_writer import BatchedSQLiteWriter, connect
+from inference import ModelCache, save_model_artifacts
+from sequence_cache import SequenceCache
+from persian_text import PersianTextEncoder
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Record fields that hold the input text, in order of preference
+TEXT_FIELDS = ('text', 'persian', 'fa', 'question', 'verses', 'source')
+# Record fields that hold the label / target for each dataset type
+LABEL_FIELDS = {
+    'translation': ('english', 'en', 'target'),
+    'sentiment': ('sentiment', 'label'),
+    'ner': ('tags',),
+}
+DEFAULT_LABEL_FIELDS = ('label', 'sentiment', 'tags', 'answer')
+
+# Persian tokenizer settings; hazm is used when installed. The effective
+# settings (PersianTextEncoder.settings) are part of the sequence cache key
+TOKENIZER_SETTINGS = {
+    'num_words': 10000,
+    'use_hazm': True,
+}
+
+# Shuffle buffer for the training pipeline; datasets up to this size are shuffled completely
+SHUFFLE_BUFFER = int(os.getenv('ML_SHUFFLE_BUFFER', '10000'))
+# Sequences are bucketed by length so each batch is padded only to its bucket, not to max_length
+BUCKET_BOUNDARIES = (8, 16, 32, 64, 96)
+CHECKPOINT_EVERY = 5
+
+def _first_field(record, fields, default=None):
+    for field in fields:
+        value = record.get(field)
+        if value is not None and value != '':
+            return value
+    return default
+
+def _trim_padding(sequences):
+    """Drop the all-zero trailing columns of a post-padded (rows, max_length) array"""
+    columns = np.flatnonzero(sequences.any(axis=0))
+    return sequences[:, :columns[-1] + 1 if len(columns) else 0]
+
+class ThroughputCallback(keras.callbacks.Callback):
+    """Adds steps_per_sec for the training part of each epoch to the epoch logs"""
+    
+    def on_epoch_begin(self, epoch, logs=None):
+        self._steps = 0
+        self._started = time.perf_counter()
+    
+    def on_train_batch_end(self, batch, logs=None):
+        self._steps += 1
+        self._finished = time.perf_counter()
+    
+    def on_epoch_end(self, epoch, logs=None):
+        if logs is not None and self._steps:
+            logs['steps_per_sec'] = self._steps / max(self._finished - self._started, 1e-9)
+
+class TrainingProgressCallback(keras.callbacks.Callback):
+    """Writes per-epoch metrics to the database and saves periodic checkpoints"""
+    
+    def __init__(self, trainer, job_id, artifacts, checkpoint_every=CHECKPOINT_EVERY):
+        super().__init__()
+        self.trainer = trainer
+        self.job_id = job_id
+        self.artifacts = artifacts
+        self.checkpoint_every = checkpoint_every
+    
+    def on_epoch_end(self, epoch, logs=None):
+        logs = logs or {}
+        epoch += 1
+        loss = logs.get('loss', 0.0)
+        accuracy = logs.get('accuracy', 0.0)
+        self.trainer.update_training_progress(
+            self.job_id, epoch, loss, accuracy, logs.get('val_loss'), logs.get('val_accuracy')
+        )
+        if 'steps_per_sec' in logs:
+            logger.info(f"⚡ Job {self.job_id} epoch {epoch}: {logs['steps_per_sec']:.2f} steps/sec")
+        
+        if epoch % self.checkpoint_every == 0:
+            model_path = f"models/checkpoint_{self.job_id}_epoch_{epoch}.h5"
+            save_model_artifacts(self.model, model_path, self.artifacts)
+            logger.info(f"💾 Saved checkpoint: {model_path}")
+
 class PersianMLTrainer:
     """Real ML trainer for Persian language models"""
     
@@ -27,12 +110,16 @@ class PersianMLTrainer:
         self.db_path = db_path
         self.models = {}
         self.training_jobs = {}
+        self.sequence_cache = SequenceCache()
+        self.model_cache = ModelCache()
+        self.writer = None
         
     def connect_database(self):
-        """Connect to SQLite database"""
+        """Connect to SQLite database (WAL); progress writes go through a background batched writer"""
         try:
-            self.conn = sqlite3.connect(self.db_path)
+            self.conn = connect(self.db_path)
             self.cursor = self.conn.cursor()
+            self.writer = BatchedSQLiteWriter(self.db_path)
             logger.info("✅ Connected to ML database")
             return True
         except Exception as e:
@@ -55,17 +142,17 @@ class PersianMLTrainer:
             return None
     
     def update_training_progress(self, job_id, epoch, loss, accuracy, val_loss=None, val_accuracy=None):
-        """Update training progress in database"""
+        """Queue a progress update; written in batches by the background writer, never blocks training"""
         try:
             progress = (epoch / 10) * 100  # Assuming 10 epochs total
             
-            # Update training job
+            # Update training job (only the latest pending update per job is written)
             update_query = """
                 UPDATE training_jobs 
                 SET current_epoch = ?, progress = ?, loss = ?, accuracy = ?
                 WHERE id = ?
             """
-            self.cursor.execute(update_query, (epoch, progress, loss, accuracy, job_id))
+            self.writer.write(update_query, (epoch, progress, loss, accuracy, job_id), key=job_id)
             
             # Insert metrics
             metrics_query = """
@@ -75,21 +162,27 @@ class PersianMLTrainer:
                 )
                 VALUES (?, ?, ?, ?, ?, ?)
             """
-            self.cursor.execute(metrics_query, (
+            self.writer.write(metrics_query, (
                 job_id, epoch, loss, val_loss or loss,
                 accuracy, val_accuracy or accuracy
             ))
             
-            self.conn.commit()
             logger.info(f"📊 Updated progress for job {job_id}: Epoch {epoch}, Loss: {loss:.4f}, Accuracy: {accuracy:.4f}")
             
         except Exception as e:
             logger.error(f"❌ Error updating progress: {e}")
     
+    def close(self):
+        """Flush queued progress writes and close the database"""
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        self.conn.close()
+    
     def create_persian_text_classifier(self, vocab_size=10000, max_length=128, num_classes=5):
         """Create a real Persian text classification model"""
         model = keras.Sequential([
-            layers.Embedding(vocab_size, 128, input_length=max_length),
+            layers.Embedding(vocab_size, 128, mask_zero=True),
             layers.LSTM(64, return_sequences=True),
             layers.LSTM(32),
             layers.Dropout(0.5),
@@ -100,7 +193,7 @@ class PersianMLTrainer:
         
         model.compile(
             optimizer='adam',
-            loss='categorical_crossentropy',
+            loss='sparse_categorical_crossentropy',
             metrics=['accuracy']
         )
         
@@ -109,7 +202,7 @@ class PersianMLTrainer:
     def create_persian_generator(self, vocab_size=10000, max_length=50):
         """Create a real Persian text generation model"""
         model = keras.Sequential([
-            layers.Embedding(vocab_size, 256, input_length=max_length),
+            layers.Embedding(vocab_size, 256, mask_zero=True),
             layers.LSTM(512, return_sequences=True),
             layers.LSTM(256, return_sequences=True),
             layers.LSTM(128),
@@ -120,7 +213,7 @@ class PersianMLTrainer:
         
         model.compile(
             optimizer='adam',
-            loss='categorical_crossentropy',
+            loss='sparse_categorical_crossentropy',
             metrics=['accuracy']
         )
         
@@ -129,78 +222,193 @@ class PersianMLTrainer:
     def create_translation_model(self, source_vocab_size=10000, target_vocab_size=10000, max_length=50):
         """Create a real Persian-English translation model"""
         # Encoder
-        encoder_inputs = layers.Input(shape=(max_length,))
-        encoder_embedding = layers.Embedding(source_vocab_size, 256)(encoder_inputs)
+        encoder_inputs = layers.Input(shape=(None,))
+        encoder_embedding = layers.Embedding(source_vocab_size, 256, mask_zero=True)(encoder_inputs)
         encoder_lstm = layers.LSTM(256, return_state=True)
         encoder_outputs, state_h, state_c = encoder_lstm(encoder_embedding)
         encoder_states = [state_h, state_c]
         
         # Decoder
-        decoder_inputs = layers.Input(shape=(max_length,))
-        decoder_embedding = layers.Embedding(target_vocab_size, 256)(decoder_inputs)
+        decoder_inputs = layers.Input(shape=(None,))
+        decoder_embedding = layers.Embedding(target_vocab_size, 256, mask_zero=True)(decoder_inputs)
         decoder_lstm = layers.LSTM(256, return_sequences=True, return_state=True)
         decoder_outputs, _, _ = decoder_lstm(decoder_embedding, initial_state=encoder_states)
         decoder_dense = layers.Dense(target_vocab_size, activation='softmax')
         decoder_outputs = decoder_dense(decoder_outputs)
         
         model = keras.Model([encoder_inputs, decoder_inputs], decoder_outputs)
-        model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
+        model.compile(optimizer='adam', loss='sparse_categorical_crossentropy', metrics=['accuracy'])
         
         return model
     
+    def stream_persian_dataset(self, dataset_path, dataset_type='text'):
+        """Yield (text, label) pairs one record at a time (JSON array, JSONL, CSV, text or CoNLL)"""
+        label_fields = LABEL_FIELDS.get(dataset_type, DEFAULT_LABEL_FIELDS)
+        for record in iter_records(dataset_path):
+            text = _first_field(record, TEXT_FIELDS)
+            if text is None:
+                continue
+            if isinstance(text, list):
+                text = '\n'.join(text)
+            label = _first_field(record, label_fields, 0)
+            if isinstance(label, list):
+                label = ' '.join(map(str, label))
+            yield text, label
+    
     def load_persian_dataset(self, dataset_path, dataset_type='text'):
         """Load Persian dataset for training"""
         try:
-            if dataset_type == 'text':
-                # Load Persian text data
-                with open(dataset_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                texts = [item['text'] for item in data]
-                labels = [item.get('label', 0) for item in data]
-                
-                return texts, labels
-            
-            elif dataset_type == 'translation':
-                # Load translation pairs
-                with open(dataset_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                source_texts = [item['persian'] for item in data]
-                target_texts = [item['english'] for item in data]
-                
-                return source_texts, target_texts
+            texts, labels = [], []
+            for text, label in self.stream_persian_dataset(dataset_path, dataset_type):
+                texts.append(text)
+                labels.append(label)
             
-            elif dataset_type == 'sentiment':
-                # Load sentiment data
-                with open(dataset_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                texts = [item['text'] for item in data]
-                sentiments = [item['sentiment'] for item in data]
-                
-                return texts, sentiments
+            logger.info(f"📁 Loaded {len(texts)} records from {dataset_path}")
+            return texts, labels
                 
         except Exception as e:
             logger.error(f"❌ Error loading dataset: {e}")
             return None, None
     
     def preprocess_persian_text(self, texts, max_length=128):
-        """Preprocess Persian text for training"""
-        # Simple tokenization (in production, use proper Persian tokenizer)
-        tokenizer = keras.preprocessing.text.Tokenizer(
-            num_words=10000,
-            filters='!"#$%&()*+,-./:;<=>?@[\\]^_`{|}~\t\n',
-            lower=True
-        )
+        """Normalize and tokenize Persian text into an int32 (n, max_length) array
         
-        tokenizer.fit_on_texts(texts)
-        sequences = tokenizer.texts_to_sequences(texts)
-        padded_sequences = keras.preprocessing.sequence.pad_sequences(
-            sequences, maxlen=max_length, padding='post'
+        Normalization (yeh/kaf, digits, diacritics, ZWNJ) and tokenization run
+        in chunks across worker processes; see persian_text.PersianTextEncoder.
+        """
+        tokenizer = PersianTextEncoder(**TOKENIZER_SETTINGS)
+        padded_sequences = tokenizer.fit_encode(texts, max_length)
+        return padded_sequences, tokenizer
+    
+    def prepare_sequences(self, dataset_path, dataset_type='text', max_length=128):
+        """Fitted tokenizer(s), label vocabulary and encoded int32 sequences, cached on disk
+        
+        On a miss, one streaming pass fits the tokenizer(s) and collects the
+        labels, and a second pass encodes the dataset chunk by chunk straight
+        into the cache entry, so only word counts, the label set and a few
+        chunks are held in memory. The cache key covers the dataset content,
+        dataset type, max_length and tokenizer settings; on a hit the dataset
+        is not read at all and the chunks are memory-mapped.
+        """
+        key = self.sequence_cache.key(
+            dataset_path, dataset_type=dataset_type, max_length=max_length,
+            tokenizer=PersianTextEncoder(**TOKENIZER_SETTINGS).settings()
         )
+        data = self.sequence_cache.load(key)
         
-        return padded_sequences, tokenizer
+        if data is None:
+            labels = set()
+            count = 0
+            
+            def texts():
+                nonlocal count
+                for text, label in self.stream_persian_dataset(dataset_path, dataset_type):
+                    count += 1
+                    if dataset_type != 'translation':
+                        labels.add(str(label))
+                    yield text
+            
+            tokenizer = PersianTextEncoder(**TOKENIZER_SETTINGS).fit(texts())
+            if not count:
+                raise ValueError(f"No records found in {dataset_path}")
+            logger.info(f"📁 Fitted tokenizer on {count} records from {dataset_path}")
+            
+            meta = {'tokenizer': tokenizer.to_json(), 'count': count}
+            target_tokenizer = None
+            if dataset_type == 'translation':
+                target_tokenizer = PersianTextEncoder(**TOKENIZER_SETTINGS).fit(
+                    str(label) for _, label in self.stream_persian_dataset(dataset_path, dataset_type))
+                meta['target_tokenizer'] = target_tokenizer.to_json()
+            else:
+                meta['label_vocab'] = sorted(labels)
+            
+            self.sequence_cache.save(key, meta, self.encode_chunks(
+                dataset_path, dataset_type, tokenizer, target_tokenizer, meta.get('label_vocab'), max_length))
+            data = self.sequence_cache.load(key)
+        
+        data['tokenizer'] = PersianTextEncoder.from_json(data['tokenizer'])
+        if data.get('target_tokenizer'):
+            data['target_tokenizer'] = PersianTextEncoder.from_json(data['target_tokenizer'])
+        return data
+    
+    def encode_chunks(self, dataset_path, dataset_type, tokenizer, target_tokenizer=None, label_vocab=None,
+                      max_length=128):
+        """Yield {'inputs': ..., 'labels' or 'targets': ...} int32 chunks of the encoded dataset, in record order
+        
+        Texts are encoded in parallel chunks read lazily from the dataset;
+        rows are post-padded only to the longest row of their chunk.
+        """
+        sources, targets = itertools.tee(self.stream_persian_dataset(dataset_path, dataset_type))
+        inputs = tokenizer.encode_stream((text for text, _ in sources), max_length)
+        if target_tokenizer is not None:
+            outputs = target_tokenizer.encode_stream((str(label) for _, label in targets), max_length)
+            for x, y in zip(inputs, outputs):
+                yield {'inputs': _trim_padding(x), 'targets': _trim_padding(y)}
+        else:
+            label_index = {label: i for i, label in enumerate(label_vocab)}
+            label_ids = (label_index[str(label)] for _, label in targets)
+            for x in inputs:
+                yield {'inputs': _trim_padding(x),
+                       'labels': np.fromiter(itertools.islice(label_ids, len(x)), dtype=np.int32, count=len(x))}
+    
+    def stream_examples(self, data, model_type, validation=False, validation_split=0.2):
+        """Yield unpadded (features, target) training examples from the memory-mapped sequence chunks
+        
+        Every round(1 / validation_split)-th record is a validation example,
+        so both splits are stable across epochs without holding the dataset.
+        """
+        period = round(1 / validation_split) if validation_split > 0 else 0
+        if validation and not period:
+            return
+        
+        inputs = itertools.chain.from_iterable(data['inputs'])
+        outputs = itertools.chain.from_iterable(data['targets'] if model_type == 'translation' else data['labels'])
+        
+        for position, (x, y) in enumerate(zip(inputs, outputs)):
+            if period and (position % period == 0) != validation:
+                continue
+            # Rows are post-padded: the length is the number of non-zero ids
+            length = int(np.count_nonzero(x))
+            if model_type == 'generative':
+                # Text generation: predict the last token of each sequence from the ones before it
+                if length > 1:
+                    yield x[:length - 1], x[length - 1]
+            elif model_type == 'translation':
+                # Translation: teacher forcing, the decoder sees the target shifted right
+                target_length = int(np.count_nonzero(y))
+                if length > 0 and target_length > 1:
+                    yield (x[:length], y[:target_length - 1]), y[1:target_length]
+            elif length > 0:
+                yield x[:length], np.int32(y)
+    
+    def make_training_datasets(self, examples, output_signature, batch_size, count,
+                               validation_split=0.2, seed=42):
+        """Streamed, shuffled, length-bucketed and prefetched train / validation tf.data pipelines
+        
+        `examples(validation)` yields one unpadded example at a time; each
+        batch is padded only to the longest sequence in its length bucket.
+        Elements are bucketed by the length of the first feature.
+        """
+        val_count = int(count * validation_split) if count > 1 else 0
+        
+        def source(validation):
+            return tf.data.Dataset.from_generator(lambda: examples(validation), output_signature=output_signature)
+        
+        def first_length(x, y):
+            return tf.shape(tf.nest.flatten(x)[0])[0]
+        
+        def batched(dataset):
+            return dataset.bucket_by_sequence_length(
+                first_length,
+                bucket_boundaries=list(BUCKET_BOUNDARIES),
+                bucket_batch_sizes=[batch_size] * (len(BUCKET_BOUNDARIES) + 1),
+            ).prefetch(tf.data.AUTOTUNE)
+        
+        train_ds = source(False).shuffle(
+            min(SHUFFLE_BUFFER, max(count - val_count, 1)), seed=seed, reshuffle_each_iteration=True
+        )
+        val_ds = source(True) if val_count else None
+        return batched(train_ds), (batched(val_ds) if val_ds is not None else None)
     
     def train_model(self, job_id, model_type, dataset_path, config):
         """Real ML training function"""
@@ -213,77 +421,56 @@ class PersianMLTrainer:
                 logger.error(f"❌ Job {job_id} not found")
                 return False
             
-            # Load dataset
-            texts, labels = self.load_persian_dataset(dataset_path, job['model_type'])
-            if texts is None:
-                logger.error("❌ Failed to load dataset")
-                return False
-            
-            # Preprocess data
-            X, tokenizer = self.preprocess_persian_text(texts)
+            # Fit and encode the dataset (cached per dataset content and tokenizer settings)
+            max_length = 128
+            data = self.prepare_sequences(dataset_path, job['model_type'], max_length)
             
+            sequence = tf.TensorSpec(shape=(None,), dtype=tf.int32)
             if model_type == 'transformer':
                 # Text classification
-                y = keras.utils.to_categorical(labels, num_classes=5)
-                model = self.create_persian_text_classifier()
+                num_classes = len(data['label_vocab'])
+                output_signature = (sequence, tf.TensorSpec(shape=(), dtype=tf.int32))
+                model = self.create_persian_text_classifier(num_classes=num_classes)
                 
             elif model_type == 'generative':
-                # Text generation
-                y = X[:, 1:]  # Shifted target
-                X = X[:, :-1]  # Input
+                output_signature = (sequence, tf.TensorSpec(shape=(), dtype=tf.int32))
                 model = self.create_persian_generator()
                 
             elif model_type == 'translation':
-                # Translation
-                target_texts, _ = self.load_persian_dataset(dataset_path, 'translation')
-                target_sequences, target_tokenizer = self.preprocess_persian_text(target_texts)
+                output_signature = ((sequence, sequence), sequence)
                 model = self.create_translation_model()
             
-            # Split data
-            from sklearn.model_selection import train_test_split
-            X_train, X_val, y_train, y_val = train_test_split(
-                X, y, test_size=0.2, random_state=42
-            )
+            # Everything needed to serve the model is saved next to each checkpoint
+            artifacts = {
+                'model_type': model_type,
+                'max_length': max_length,
+                'tokenizer': data['tokenizer'].to_json(),
+                'label_vocab': data.get('label_vocab'),
+            }
+            if data.get('target_tokenizer'):
+                artifacts['target_tokenizer'] = data['target_tokenizer'].to_json()
             
-            # Training loop
             epochs = int(job['total_epochs'])
             batch_size = int(job['batch_size'])
+            examples = lambda validation: self.stream_examples(data, model_type, validation)
+            train_ds, val_ds = self.make_training_datasets(examples, output_signature, batch_size, data['count'])
             
-            for epoch in range(1, epochs + 1):
-                logger.info(f"📊 Training epoch {epoch}/{epochs}")
-                
-                # Train model
-                history = model.fit(
-                    X_train, y_train,
-                    batch_size=batch_size,
-                    epochs=1,
-                    validation_data=(X_val, y_val),
-                    verbose=0
-                )
-                
-                # Get metrics
-                loss = history.history['loss'][0]
-                accuracy = history.history['accuracy'][0]
-                val_loss = history.history.get('val_loss', [loss])[0]
-                val_accuracy = history.history.get('val_accuracy', [accuracy])[0]
-                
-                # Update database
-                self.update_training_progress(
-                    job_id, epoch, loss, accuracy, val_loss, val_accuracy
-                )
-                
-                # Save model checkpoint
-                if epoch % 5 == 0:
-                    model_path = f"models/checkpoint_{job_id}_epoch_{epoch}.h5"
-                    os.makedirs(os.path.dirname(model_path), exist_ok=True)
-                    model.save(model_path)
-                    logger.info(f"💾 Saved checkpoint: {model_path}")
+            # One fit call for all epochs; progress, checkpoints and throughput are reported by callbacks
+            logger.info(f"📊 Training {epochs} epochs")
+            model.fit(
+                train_ds,
+                epochs=epochs,
+                validation_data=val_ds,
+                callbacks=[ThroughputCallback(), TrainingProgressCallback(self, job_id, artifacts)],
+                verbose=0
+            )
             
             # Save final model
             final_model_path = f"models/final_{job_id}.h5"
-            model.save(final_model_path)
+            save_model_artifacts(model, final_model_path, artifacts)
             
-            # Update job status
+            # Update job status after all queued progress has been written
+            self.writer.flush()
             self.cursor.execute(
                 "UPDATE training_jobs SET status = 'completed', completed_at = CURRENT_TIMESTAMP WHERE id = ?",
                 (job_id,)
@@ -296,6 +483,7 @@ class PersianMLTrainer:
         except Exception as e:
             logger.error(f"❌ Training error: {e}")
             # Update job status to failed
+            self.writer.flush()
             self.cursor.execute(
                 "UPDATE training_jobs SET status = 'failed', error_message = ? WHERE id = ?",
                 (str(e), job_id)
@@ -304,13 +492,9 @@ class PersianMLTrainer:
             return False
     
     def predict_with_model(self, model_path, text):
-        """Make predictions with trained model"""
+        """Make predictions with trained model (loaded once and cached with its tokenizer)"""
         try:
-            model = keras.models.load_model(model_path)
-            # Preprocess text
-            # Make prediction
-            prediction = model.predict(text)
-            return prediction
+            return self.model_cache.get(model_path).predict([text])[0]
         except Exception as e:
             logger.error(f"❌ Prediction error: {e}")
             return None
@@ -405,7 +589,7 @@ def main():
     else:
         print("❌ Training failed!")
     
-    trainer.conn.close()
+    trainer.close()
 
 if __name__ == "__main__":
     main()
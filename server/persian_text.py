@@ -0,0 +1,281 @@
+"""
+Persian text normalization and tokenization for the Persian ML System
+یکسان‌سازی ی/ک عربی، حذف اعراب و کشیده، مرتب‌سازی نیم‌فاصله (ZWNJ) و توکن‌سازی موازی در چند process
+خروجی مستقیماً آرایه‌ی numpy از نوع int32 است؛ hazm در صورت نصب بودن قابل استفاده است
+"""
+
+import itertools
+import json
+import os
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+WORKERS = int(os.getenv("TEXT_WORKERS", str(os.cpu_count() or 1)))
+CHUNK_SIZE = int(os.getenv("TEXT_CHUNK_SIZE", "2000"))
+
+ZWNJ = "‌"
+
+# ی و ک عربی، ارقام عربی و لاتین -> فارسی، انواع نیم‌فاصله -> ZWNJ
+CHARACTER_MAP = {
+    "ي": "ی",  # ي -> ی
+    "ى": "ی",  # ى -> ی
+    "ك": "ک",  # ك -> ک
+    "ة": "ه",  # ة -> ه
+    "‍": ZWNJ,      # ZWJ
+    "​": ZWNJ,      # zero width space
+    "¬": ZWNJ,      # ¬ (نیم‌فاصله در بعضی صفحه‌کلیدها)
+    " ": " ",
+}
+CHARACTER_MAP.update({chr(0x0660 + d): chr(0x06F0 + d) for d in range(10)})
+CHARACTER_MAP.update({str(d): chr(0x06F0 + d) for d in range(10)})
+
+# اعراب (فتحه، کسره، تنوین، تشدید، سکون، ...) و کشیده حذف می‌شوند
+DIACRITICS = [chr(c) for c in range(0x064B, 0x0660)] + ["ٰ", "ـ"]
+
+# علائم نگارشی لاتین (همان فیلتر Tokenizer کراس) به‌علاوه‌ی علائم فارسی به فاصله تبدیل می‌شوند
+PUNCTUATION = '!"#$%&()*+,-./:;<=>?@[\\]^_`{|}~\t\n' + "،؛؟«»٪…۔"
+
+TRANSLATION_TABLE = str.maketrans({
+    **CHARACTER_MAP,
+    **{char: None for char in DIACRITICS},
+    **{char: " " for char in PUNCTUATION},
+})
+
+# نیم‌فاصله‌ی تکراری، یا کنار فاصله / ابتدا و انتهای کلمه
+ZWNJ_RUNS = re.compile(f"{ZWNJ}{{2,}}")
+ZWNJ_EDGES = re.compile(f"(?<![^ ]){ZWNJ}|{ZWNJ}(?![^ ])")
+# پیشوند فعلی «می» / «نمی» با نیم‌فاصله به فعل می‌چسبد
+MI_PREFIX = re.compile(r"(?<![^\s])(ن?می) +(?=[؀-ۿ])")
+MI_JOINED = r"\1" + ZWNJ
+SPACES = re.compile(r"\s+")
+
+
+def _normalize(text: str) -> str:
+    text = text.translate(TRANSLATION_TABLE).lower()
+    if "می" in text:
+        text = MI_PREFIX.sub(MI_JOINED, text)
+    if ZWNJ in text:
+        text = ZWNJ_EDGES.sub(" ", ZWNJ_RUNS.sub(ZWNJ, text))
+    return text
+
+
+def normalize(text: str) -> str:
+    """Persian normalization: yeh/kaf, digits, diacritics, tatweel, ZWNJ and punctuation"""
+    return SPACES.sub(" ", _normalize(text)).strip()
+
+
+def tokenize(text: str) -> List[str]:
+    return _normalize(text).split()
+
+
+# hazm اختیاری است و در هر process فقط یک بار ساخته می‌شود
+_hazm = None
+
+
+def _hazm_tokenize(text: str) -> List[str]:
+    global _hazm
+    if _hazm is None:
+        import hazm
+        _hazm = (hazm.Normalizer(), hazm.word_tokenize)
+    normalizer, word_tokenize = _hazm
+    return word_tokenize(normalize(normalizer.normalize(text)))
+
+
+def hazm_available() -> bool:
+    try:
+        import hazm  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _tokenizer(use_hazm: bool) -> Callable[[str], List[str]]:
+    return _hazm_tokenize if use_hazm else tokenize
+
+
+# ===== PARALLEL STAGES =====
+
+def _chunks(texts: Iterable[str], size: int) -> Iterator[List[str]]:
+    iterator = iter(texts)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _count_chunk(chunk: List[str], use_hazm: bool) -> Counter:
+    split = _tokenizer(use_hazm)
+    counts: Counter = Counter()
+    for text in chunk:
+        counts.update(split(text))
+    return counts
+
+
+def _tokenize_chunk(chunk: List[str], use_hazm: bool) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+    """Chunk-local vocabulary (first-seen order), its counts, and the flat local ids + row lengths
+
+    Only small arrays cross the process boundary; the parent remaps local ids
+    to global ones with a lookup table instead of tokenizing a second time.
+    """
+    split = _tokenizer(use_hazm)
+    local: Dict[str, int] = {}
+    ids: List[int] = []
+    lengths = np.zeros(len(chunk), dtype=np.int32)
+    for row, text in enumerate(chunk):
+        tokens = split(text)
+        lengths[row] = len(tokens)
+        for token in tokens:
+            ids.append(local.setdefault(token, len(local)))
+    flat = np.array(ids, dtype=np.int32)
+    return list(local), np.bincount(flat, minlength=len(local)), flat, lengths
+
+
+# واژگان در هر worker یک بار از طریق initializer تنظیم می‌شود، نه برای هر chunk
+_worker_vocab: Dict[str, int] = {}
+
+
+def _init_encoder(word_index: Dict[str, int]):
+    global _worker_vocab
+    _worker_vocab = word_index
+
+
+def _encode_chunk(chunk: List[str], max_length: int, use_hazm: bool,
+                  word_index: Optional[Dict[str, int]] = None) -> np.ndarray:
+    vocab = _worker_vocab if word_index is None else word_index
+    split = _tokenizer(use_hazm)
+    out = np.zeros((len(chunk), max_length), dtype=np.int32)
+    for row, text in enumerate(chunk):
+        ids = [vocab[token] for token in split(text) if token in vocab]
+        # مانند pad_sequences: padding در انتها، برش از ابتدا
+        ids = ids[-max_length:]
+        out[row, :len(ids)] = ids
+    return out
+
+
+def _pad_flat(ids: np.ndarray, lengths: np.ndarray, max_length: int) -> np.ndarray:
+    """Rows of a flat id array (zeros dropped) into (rows, max_length): post-padding, pre-truncation"""
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    keep = ids > 0
+    ids, rows = ids[keep], rows[keep]
+    kept = np.bincount(rows, minlength=len(lengths))
+    starts = np.cumsum(kept) - kept
+    columns = np.arange(len(ids)) - starts[rows] - np.maximum(kept - max_length, 0)[rows]
+    visible = columns >= 0
+    out = np.zeros((len(lengths), max_length), dtype=np.int32)
+    out[rows[visible], columns[visible]] = ids[visible]
+    return out
+
+
+def _parallel(func: Callable, chunks: Iterator[List[str]], workers: int, args: tuple = (),
+              initializer: Optional[Callable] = None, initargs: tuple = ()) -> Iterator[Any]:
+    """Apply func to chunks in order, with at most 2 * workers chunks in flight"""
+    if workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for chunk in chunks:
+            yield func(chunk, *args)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as pool:
+        pending = []
+        for chunk in chunks:
+            pending.append(pool.submit(func, chunk, *args))
+            if len(pending) >= workers * 2:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+
+class PersianTextEncoder:
+    """Frequency-ranked vocabulary and int32 padded sequences for Persian text
+
+    Mirrors keras Tokenizer semantics (ids start at 1 by descending frequency,
+    only ids < num_words are kept, post-padding, pre-truncation) but
+    normalizes Persian text first and runs both passes over chunks in
+    worker processes.
+    """
+
+    def __init__(self, num_words: int = 10000, use_hazm: bool = False,
+                 workers: int = WORKERS, chunk_size: int = CHUNK_SIZE):
+        self.num_words = num_words
+        self.use_hazm = use_hazm and hazm_available()
+        self.workers = max(1, workers)
+        self.chunk_size = max(1, chunk_size)
+        self.word_index: Dict[str, int] = {}
+        self.word_counts: Dict[str, int] = {}
+
+    def settings(self) -> Dict[str, Any]:
+        return {"num_words": self.num_words, "hazm": self.use_hazm, "normalizer": 1}
+
+    def _workers_for(self, texts: Iterable[str]) -> int:
+        # برای ورودی کوچک هزینه‌ی راه‌اندازی process ها بیشتر از سود آن است
+        if isinstance(texts, Sequence) and len(texts) <= self.chunk_size:
+            return 1
+        return self.workers
+
+    def _rank(self, counts: Counter):
+        # ترتیب پایدار: فراوانی نزولی، سپس اولین مشاهده
+        ranked = sorted(counts.items(), key=lambda item: -item[1])
+        self.word_counts = dict(ranked)
+        self.word_index = {word: i for i, (word, _) in enumerate(ranked, start=1)}
+
+    def fit(self, texts: Iterable[str]) -> "PersianTextEncoder":
+        counts: Counter = Counter()
+        for partial in _parallel(_count_chunk, _chunks(texts, self.chunk_size), self._workers_for(texts),
+                                 args=(self.use_hazm,)):
+            counts.update(partial)
+        self._rank(counts)
+        return self
+
+    def encode(self, texts: Iterable[str], max_length: int = 128) -> np.ndarray:
+        """(n, max_length) int32 array of token ids"""
+        parts = list(self.encode_stream(texts, max_length))
+        return np.concatenate(parts) if parts else np.zeros((0, max_length), dtype=np.int32)
+
+    def encode_stream(self, texts: Iterable[str], max_length: int = 128) -> Iterator[np.ndarray]:
+        """(chunk_size, max_length) int32 arrays, in order, reading texts lazily
+
+        At most 2 * workers chunks are read ahead, so an iterator over a
+        corpus larger than memory can be encoded.
+        """
+        vocab = {word: i for word, i in self.word_index.items() if i < self.num_words}
+        workers = self._workers_for(texts)
+        if workers <= 1:
+            for chunk in _chunks(texts, self.chunk_size):
+                yield _encode_chunk(chunk, max_length, self.use_hazm, vocab)
+        else:
+            yield from _parallel(_encode_chunk, _chunks(texts, self.chunk_size), workers,
+                                 args=(max_length, self.use_hazm), initializer=_init_encoder, initargs=(vocab,))
+
+    def fit_encode(self, texts: Iterable[str], max_length: int = 128) -> np.ndarray:
+        """fit + encode with a single tokenization pass over the texts"""
+        parts = list(_parallel(_tokenize_chunk, _chunks(texts, self.chunk_size), self._workers_for(texts),
+                               args=(self.use_hazm,)))
+        counts: Counter = Counter()
+        for words, word_counts, _, _ in parts:
+            counts.update(dict(zip(words, word_counts.tolist())))
+        self._rank(counts)
+
+        encoded = []
+        for words, _, flat, lengths in parts:
+            # شناسه‌ی محلی -> سراسری؛ کلمات خارج از num_words صفر می‌شوند و حذف می‌شوند
+            lookup = np.array([self.word_index[word] for word in words], dtype=np.int32)
+            lookup[lookup >= self.num_words] = 0
+            encoded.append(_pad_flat(lookup[flat], lengths, max_length))
+        return np.concatenate(encoded) if encoded else np.zeros((0, max_length), dtype=np.int32)
+
+    def to_json(self) -> str:
+        return json.dumps({**self.settings(), "word_index": self.word_index}, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, data: str, workers: int = WORKERS) -> "PersianTextEncoder":
+        config = json.loads(data)
+        encoder = cls(num_words=config["num_words"], use_hazm=config.get("hazm", False), workers=workers)
+        encoder.word_index = config["word_index"]
+        return encoder
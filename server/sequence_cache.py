@@ -0,0 +1,111 @@
+"""
+On-disk cache of fitted tokenizers and padded sequences for the Persian ML System
+کلید هر ورودی از hash محتوای دیتاست و تنظیمات tokenizer ساخته می‌شود؛ آرایه‌ها به‌صورت .npy با mmap خوانده می‌شوند
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.getenv("ML_SEQUENCE_CACHE_DIR", "cache/sequences")
+# با تغییر نحوه‌ی پیش‌پردازش افزایش داده می‌شود تا ورودی‌های قدیمی استفاده نشوند
+CACHE_VERSION = 4
+
+HASH_CHUNK_SIZE = 1 << 20
+
+
+class SequenceCache:
+    """Fitted tokenizer + int32 sequences per (dataset content, settings)
+
+    Each entry is a directory with meta.json (tokenizer JSON, label vocabulary,
+    settings), one .npy file per whole array and one <name>/ directory of
+    numbered .npy files per chunked array. Chunks are written as they are
+    produced, so an entry can be larger than memory. Entries are written to a
+    temporary directory and renamed into place, so readers never see a partial
+    entry.
+    Dataset hashes are memoized by (size, mtime), so an unchanged file is not
+    re-read; any change to the file produces a new key.
+    """
+
+    def __init__(self, root: str = CACHE_DIR):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._hashes_path = self.root / "hashes.json"
+        self._lock = threading.Lock()
+        try:
+            self._hashes = json.loads(self._hashes_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self._hashes = {}
+
+    def dataset_hash(self, dataset_path: str) -> str:
+        path = Path(dataset_path).resolve()
+        stat = path.stat()
+        with self._lock:
+            memo = self._hashes.get(str(path))
+            if memo and memo["size"] == stat.st_size and memo["mtime"] == stat.st_mtime_ns:
+                return memo["sha256"]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+
+        with self._lock:
+            self._hashes[str(path)] = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "sha256": digest.hexdigest()}
+            temp = self._hashes_path.with_suffix(".tmp")
+            temp.write_text(json.dumps(self._hashes, indent=2), encoding="utf-8")
+            temp.replace(self._hashes_path)
+        return digest.hexdigest()
+
+    def key(self, dataset_path: str, **settings: Any) -> str:
+        payload = {"dataset": self.dataset_hash(dataset_path), "version": CACHE_VERSION, **settings}
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()[:32]
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        """meta.json fields plus memory-mapped arrays (a list of chunks for chunked ones), or None on a miss"""
+        entry = self.root / key
+        try:
+            meta = json.loads((entry / "meta.json").read_text(encoding="utf-8"))
+            arrays = {path.stem: np.load(path, mmap_mode="r") for path in entry.glob("*.npy")}
+            arrays.update({
+                path.name: [np.load(chunk, mmap_mode="r") for chunk in sorted(path.glob("*.npy"))]
+                for path in entry.iterdir() if path.is_dir()})
+        except (OSError, ValueError) as e:
+            if entry.exists():
+                logger.warning(f"⚠️ Ignoring unreadable sequence cache entry {key}: {e}")
+            return None
+        logger.info(f"♻️ Sequence cache hit {key}")
+        return {**meta, **arrays}
+
+    def save(self, key: str, meta: Dict[str, Any], chunks: Iterable[Dict[str, np.ndarray]] = (),
+             **arrays: np.ndarray):
+        """Write an entry; `chunks` yields {name: array} parts that are saved one at a time"""
+        entry = self.root / key
+        temp = Path(tempfile.mkdtemp(dir=self.root, prefix=f".{key}-"))
+        try:
+            (temp / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+            for name, array in arrays.items():
+                np.save(temp / f"{name}.npy", np.ascontiguousarray(array, dtype=np.int32))
+            for index, parts in enumerate(chunks):
+                for name, array in parts.items():
+                    (temp / name).mkdir(exist_ok=True)
+                    np.save(temp / name / f"{index:06d}.npy", np.ascontiguousarray(array, dtype=np.int32))
+            try:
+                temp.rename(entry)
+            except OSError:
+                # یک process دیگر همین ورودی را زودتر ساخته است
+                shutil.rmtree(temp, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(temp, ignore_errors=True)
+            raise
+        logger.info(f"💾 Cached sequences {key}")
@@ -0,0 +1,160 @@
+"""
+System resource sampler for the ML Training Platform
+CPU، حافظه، I/O دیسک و (در صورت وجود) GPU در فواصل ثابت نمونه‌برداری و در یک ring buffer نگه داشته می‌شوند
+endpoint های health و metrics فقط آخرین نمونه را برمی‌گردانند
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from collections import deque
+from datetime import datetime
+from importlib import metadata
+from typing import Any, Deque, Dict, List, Optional
+
+import psutil
+from loguru import logger
+
+SAMPLE_INTERVAL = float(os.getenv("SYSTEM_SAMPLE_INTERVAL", "2"))
+HISTORY_SIZE = int(os.getenv("SYSTEM_HISTORY_SIZE", "300"))
+
+# مقدار None یعنی «نامشخص» (NVML در دسترس نیست یا GPU ای وجود ندارد)، نه مصرف صفر
+GPU_UNAVAILABLE: Dict[str, Any] = {"gpu": None, "gpuMemoryUsedGb": None, "gpuMemoryTotalGb": None}
+
+
+class GpuProbe:
+    """GPU statistics through NVML; torch is never imported into the server process
+
+    NVML comes from the nvidia-ml-py package (imported as pynvml). Without
+    it, GPU availability is probed once in a short-lived subprocess and
+    utilization and memory are reported as None (unavailable), not 0.
+    """
+
+    def __init__(self):
+        self.available = False
+        self.count = 0
+        self._nvml = None
+        try:
+            self.torch_version: Optional[str] = metadata.version("torch")
+        except metadata.PackageNotFoundError:
+            self.torch_version = None
+
+        try:
+            import pynvml
+            pynvml.nvmlInit()
+            self._nvml = pynvml
+            self.count = pynvml.nvmlDeviceGetCount()
+        except Exception:
+            self._nvml = None
+            if self.torch_version is not None:
+                self.count = self._torch_device_count()
+            if self.count:
+                logger.info("GPU found but NVML could not be loaded (pip install nvidia-ml-py); "
+                            "GPU utilization is reported as unavailable")
+        self.available = self.count > 0
+
+    @staticmethod
+    def _torch_device_count() -> int:
+        try:
+            result = subprocess.run(
+                [sys.executable, "-c", "import torch; print(torch.cuda.device_count())"],
+                capture_output=True, text=True, timeout=120)
+            return int(result.stdout.strip() or 0)
+        except (OSError, ValueError, subprocess.TimeoutExpired) as e:
+            logger.warning(f"GPU probe failed: {str(e)}")
+            return 0
+
+    def sample(self) -> Dict[str, Any]:
+        if self._nvml is None or not self.available:
+            return dict(GPU_UNAVAILABLE)
+
+        used = total = utilization = 0.0
+        for index in range(self.count):
+            handle = self._nvml.nvmlDeviceGetHandleByIndex(index)
+            memory = self._nvml.nvmlDeviceGetMemoryInfo(handle)
+            used += memory.used
+            total += memory.total
+            utilization += self._nvml.nvmlDeviceGetUtilizationRates(handle).gpu
+        return {
+            "gpu": utilization / self.count,
+            "gpuMemoryUsedGb": used / 1024**3,
+            "gpuMemoryTotalGb": total / 1024**3,
+        }
+
+
+class SystemMonitor:
+    """Samples system resources on a fixed interval into a ring buffer"""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL, history_size: int = HISTORY_SIZE):
+        self.interval = interval
+        self.history: Deque[Dict[str, Any]] = deque(maxlen=history_size)
+        self.gpu: Optional[GpuProbe] = None
+        self._task: Optional[asyncio.Task] = None
+        self._last_io = psutil.disk_io_counters()
+        self._last_time = time.monotonic()
+        psutil.cpu_percent(interval=None)
+
+    def start(self):
+        # اولین نمونه بدون GPU گرفته می‌شود تا endpoint ها از همان ابتدا داده داشته باشند
+        self.history.append(self.sample())
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            # بررسی GPU (NVML یا subprocess) کند است و نباید event loop را متوقف کند
+            self.gpu = await loop.run_in_executor(None, GpuProbe)
+            while True:
+                await asyncio.sleep(self.interval)
+                try:
+                    self.history.append(await loop.run_in_executor(None, self.sample))
+                except Exception as e:
+                    logger.warning(f"System sample failed: {str(e)}")
+        except asyncio.CancelledError:
+            pass
+
+    def sample(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        elapsed = max(now - self._last_time, 1e-6)
+        memory = psutil.virtual_memory()
+        io = psutil.disk_io_counters()
+
+        snapshot = {
+            "timestamp": datetime.now().isoformat(),
+            "cpu": psutil.cpu_percent(interval=None),
+            "memory": memory.percent,
+            "memoryUsedGb": (memory.total - memory.available) / 1024**3,
+            "memoryTotalGb": memory.total / 1024**3,
+            "diskReadMBps": 0.0,
+            "diskWriteMBps": 0.0,
+        }
+        if io is not None and self._last_io is not None:
+            snapshot["diskReadMBps"] = (io.read_bytes - self._last_io.read_bytes) / elapsed / 1024**2
+            snapshot["diskWriteMBps"] = (io.write_bytes - self._last_io.write_bytes) / elapsed / 1024**2
+        self._last_io, self._last_time = io, now
+
+        if self.gpu is not None:
+            snapshot.update(self.gpu.sample())
+        else:
+            snapshot.update(GPU_UNAVAILABLE)
+        return snapshot
+
+    def latest(self) -> Dict[str, Any]:
+        if not self.history:
+            self.history.append(self.sample())
+        return self.history[-1]
+
+    def recent(self, seconds: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Samples from the last `seconds` (whole buffer when None), oldest first"""
+        if seconds is None:
+            return list(self.history)
+        count = min(len(self.history), int(seconds / self.interval) + 1)
+        return list(self.history)[-count:] if count else []
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
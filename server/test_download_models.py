@@ -0,0 +1,178 @@
+"""
+Tests for download_models.py against a local stand-in for the Hugging Face file server
+یک پوشه‌ی موقت با http.server سرو می‌شود (همان مسیرهای /api/models و /resolve/ که دانلودر استفاده می‌کند)
+Usage: python -m pytest server/test_download_models.py   (or: cd server && python -m unittest test_download_models)
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
+
+import download_models
+
+MODEL_ID = "test-org/tiny-model"
+MODEL_INFO = {"id": MODEL_ID, "type": "base", "size": "3MB", "params": "0"}
+CONFIG = b'{"model_type": "bert"}'
+# بزرگ‌تر از CHUNK_SIZE تا قطع اتصال بعد از نوشتن اولین chunk رخ دهد
+WEIGHTS = os.urandom(download_models.CHUNK_SIZE * 2 + 12345)
+
+
+class FileServer:
+    """Serves a directory with Range support; can cut a file short or serve wrong bytes"""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.requests = []
+        self.truncate = {}
+        self.corrupt = set()
+        server = self
+
+        class Handler(SimpleHTTPRequestHandler):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, directory=str(root), **kwargs)
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                name = self.path.split("?")[0]
+                server.requests.append((name, self.headers.get("Range")))
+                path = Path(self.translate_path(name))
+                if path.is_dir():
+                    path = path / "index.json"
+                if not path.is_file():
+                    return self.send_error(404)
+                data = path.read_bytes()
+                if path.name in server.corrupt:
+                    data = bytes(len(data))
+
+                start = 0
+                if self.headers.get("Range"):
+                    start = int(self.headers["Range"].split("=")[1].split("-")[0])
+                    if start >= len(data):
+                        return self.send_error(416)
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+                else:
+                    self.send_response(200)
+                body = data[start:]
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                cut = server.truncate.pop(path.name, None)
+                if cut is not None:
+                    # اتصال وسط فایل قطع می‌شود (فقط یک بار)
+                    self.wfile.write(body[:cut])
+                    self.wfile.flush()
+                    self.close_connection = True
+                    return
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.endpoint = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def file_requests(self, name: str):
+        return [rng for path, rng in self.requests if path.endswith(f"/resolve/main/{name}")]
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def publish(root: Path, model_id: str, files: dict):
+    """Lay out files and the /api/models listing the downloader reads"""
+    siblings = []
+    for name, data in files.items():
+        path = root / model_id / "resolve" / "main" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        if len(data) > 1000:
+            siblings.append({"rfilename": name, "size": len(data),
+                             "lfs": {"sha256": hashlib.sha256(data).hexdigest(), "size": len(data)}})
+        else:
+            blob_id = hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+            siblings.append({"rfilename": name, "size": len(data), "blobId": blob_id})
+    listing = root / "api" / "models" / model_id / "revision" / "main"
+    listing.mkdir(parents=True, exist_ok=True)
+    (listing / "index.json").write_text(json.dumps({"siblings": siblings}), encoding="utf-8")
+
+
+class DownloadModelTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp(prefix="download-models-test-"))
+        publish(self.tmp / "hub", MODEL_ID, {"config.json": CONFIG, "model.safetensors": WEIGHTS})
+        self.server = FileServer(self.tmp / "hub")
+        self.downloader = download_models.ModelDownloader(
+            base_path=str(self.tmp / "models"), endpoint=self.server.endpoint, workers=2,
+            cache_dir=str(self.tmp / "cache"), safetensors=False)
+        # فاصله‌ی بین تلاش‌ها در تست لازم نیست
+        patcher = mock.patch.object(download_models.time, "sleep")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.downloader.close()
+        self.server.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def download(self) -> bool:
+        return self.downloader.download_model("tiny", MODEL_INFO)
+
+    def weights_blob(self) -> Path:
+        return self.downloader.store.path(hashlib.sha256(WEIGHTS).hexdigest())
+
+    def test_resumes_from_partial_file_with_range(self):
+        part = self.weights_blob().with_name(self.weights_blob().name + ".part")
+        part.write_bytes(WEIGHTS[:1000])
+
+        self.assertTrue(self.download())
+        self.assertEqual(self.server.file_requests("model.safetensors"), ["bytes=1000-"])
+        self.assertEqual((self.tmp / "models" / "tiny" / "model.safetensors").read_bytes(), WEIGHTS)
+        self.assertFalse(part.exists())
+
+    def test_resumes_after_connection_drops_mid_file(self):
+        self.server.truncate["model.safetensors"] = download_models.CHUNK_SIZE + 5000
+
+        self.assertTrue(self.download())
+        ranges = self.server.file_requests("model.safetensors")
+        self.assertEqual(ranges[0], None)
+        self.assertEqual(len(ranges), 2)
+        self.assertTrue(ranges[1].startswith("bytes=") and ranges[1] != "bytes=0-")
+        self.assertEqual((self.tmp / "models" / "tiny" / "model.safetensors").read_bytes(), WEIGHTS)
+
+    def test_rejects_checksum_mismatch(self):
+        self.server.corrupt.add("model.safetensors")
+
+        self.assertFalse(self.download())
+        self.assertEqual(len(self.server.file_requests("model.safetensors")), download_models.MAX_RETRIES)
+        self.assertFalse(self.weights_blob().exists())
+        self.assertFalse(self.downloader.is_complete("tiny"))
+
+    def test_skips_already_complete_model(self):
+        self.assertTrue(self.download())
+        self.server.requests.clear()
+
+        self.assertTrue(self.download())
+        self.assertEqual(self.server.requests, [])
+
+    def test_refetches_file_removed_from_complete_model(self):
+        self.assertTrue(self.download())
+        (self.tmp / "models" / "tiny" / "config.json").unlink()
+        self.server.requests.clear()
+
+        self.assertTrue(self.download())
+        # blob هنوز در store است؛ فقط listing دوباره خوانده می‌شود
+        self.assertEqual(self.server.file_requests("config.json"), [])
+        self.assertEqual((self.tmp / "models" / "tiny" / "config.json").read_bytes(), CONFIG)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+"""
+Tests for job_store.py against a temporary SQLite database
+دیتابیس با همان جدول training_jobs که real-backend.js می‌سازد آماده می‌شود (دیتابیس مشترک)
+Usage: python -m pytest server/test_job_store.py   (or: cd server && python -m unittest test_job_store)
+"""
+
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+import job_store
+
+# جدول training_jobs در real-backend.js (بدون ستون‌هایی که فقط این server اضافه می‌کند)
+NODE_TRAINING_JOBS = """
+    CREATE TABLE training_jobs (
+        id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        model_type TEXT NOT NULL,
+        dataset_path TEXT,
+        base_model TEXT,
+        status TEXT DEFAULT 'pending',
+        progress REAL DEFAULT 0,
+        current_epoch INTEGER DEFAULT 0,
+        total_epochs INTEGER DEFAULT 10,
+        accuracy REAL DEFAULT 0,
+        loss REAL DEFAULT 0,
+        learning_rate REAL DEFAULT 0.001,
+        batch_size INTEGER DEFAULT 32,
+        validation_split REAL DEFAULT 0.2,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        started_at DATETIME,
+        completed_at DATETIME,
+        error_message TEXT,
+        config_json TEXT,
+        metrics_json TEXT
+    )
+"""
+
+
+class ReconcileTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp(prefix="job-store-test-"))
+        self.db_path = str(self.tmp / "ml_system.db")
+        conn = sqlite3.connect(self.db_path)
+        with conn:
+            conn.execute(NODE_TRAINING_JOBS)
+            conn.executemany(
+                "INSERT INTO training_jobs (id, name, model_type, status) VALUES (?, ?, ?, ?)",
+                [("job-2", "node", "generative", "running"),
+                 ("job-3", "node", "translation", "pending"),
+                 ("job-py-queued", "python", "training", "queued"),
+                 ("job-py-training", "python", "training", "training"),
+                 ("job-py-paused", "python", "training", "paused"),
+                 ("job-py-done", "python", "training", "completed")])
+        conn.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def statuses(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return dict(conn.execute("SELECT id, status FROM training_jobs"))
+        finally:
+            conn.close()
+
+    def test_fails_only_this_servers_interrupted_jobs(self):
+        store = job_store.JobStore(self.db_path)
+        store.close()
+
+        self.assertEqual(self.statuses(), {
+            "job-2": "running",
+            "job-3": "pending",
+            "job-py-queued": "failed",
+            "job-py-training": "failed",
+            "job-py-paused": "failed",
+            "job-py-done": "completed",
+        })
+
+    def test_foreign_jobs_keep_their_fields(self):
+        store = job_store.JobStore(self.db_path)
+        store.close()
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            row = conn.execute(
+                "SELECT message, error_message, completed_at FROM training_jobs WHERE id = 'job-2'").fetchone()
+        finally:
+            conn.close()
+        self.assertEqual(row, (None, None, None))
+
+
+class CheckpointCountTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp(prefix="job-store-test-"))
+        self.store = job_store.JobStore(str(self.tmp / "ml_system.db"))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    async def test_replacing_a_checkpoint_keeps_the_count(self):
+        checkpoint = {"id": "ckpt-1", "name": "epoch 1", "metrics": {"loss": 0.5}}
+        await self.store.add_checkpoint("job-1", checkpoint)
+        await self.store.add_checkpoint("job-1", dict(checkpoint, metrics={"loss": 0.4}))
+        self.assertEqual(self.store.checkpoint_count(), 1)
+
+        self.assertTrue(await self.store.delete_checkpoint("ckpt-1"))
+        self.assertFalse(await self.store.delete_checkpoint("ckpt-1"))
+        self.assertEqual(self.store.checkpoint_count(), 0)
+
+    async def test_save_reads_an_evicted_status_from_the_database(self):
+        job = {"id": "job-1", "name": "python", "type": "training", "status": "completed"}
+        self.store.create(job)
+        self.store._finished.clear()
+
+        await self.store.save(dict(job, status="failed"))
+        self.assertEqual(self.store._status_counts["completed"], 0)
+        self.assertEqual(self.store._status_counts["failed"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
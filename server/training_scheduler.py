@@ -0,0 +1,284 @@
+"""
+Training scheduler for the ML Training Platform
+job ها در صف قرار می‌گیرند و در یک pool محدود از worker process ها اجرا می‌شوند
+دستورهای pause / resume / stop از طریق stdin به worker ارسال می‌شوند
+رویدادهای پیشرفت به‌صورت JSON lines خوانده می‌شوند: از stdout در training_worker.py و از یک pipe جداگانه (--progress-fd) در ml/trainer.py
+"""
+
+import asyncio
+import json
+import os
+import sys
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set
+
+from loguru import logger
+
+MAX_WORKERS = int(os.getenv("TRAINING_MAX_WORKERS", "2"))
+MAX_QUEUED_JOBS = int(os.getenv("TRAINING_MAX_QUEUED_JOBS", "100"))
+OUTPUT_DIR = Path(os.getenv("TRAINING_OUTPUT_DIR", "./checkpoints"))
+STOP_GRACE_SECONDS = float(os.getenv("TRAINING_STOP_GRACE_SECONDS", "10"))
+
+CONTROL_COMMANDS = ("pause", "resume", "stop")
+
+WORKER_SCRIPT = Path(__file__).resolve().parent / "training_worker.py"
+TRAINER_SCRIPT = Path(__file__).resolve().parent.parent / "ml" / "trainer.py"
+
+EventHandler = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+
+def uses_progress_fd(config: Dict[str, Any]) -> bool:
+    """ml/trainer.py reports on a dedicated pipe; training_worker.py on stdout"""
+    return config.get("config", {}).get("runner") == "hf"
+
+
+def build_command(job_id: str, config: Dict[str, Any], progress_fd: Optional[int] = None) -> List[str]:
+    """Command line for the worker process that runs a job"""
+    settings = config.get("config", {})
+    if uses_progress_fd(config):
+        return [
+            sys.executable, str(TRAINER_SCRIPT),
+            "--model", config.get("checkpointPath") or config.get("baseModel") or "",
+            "--dataset", config["datasets"][0],
+            "--output", str(OUTPUT_DIR / job_id),
+            "--epochs", str(settings.get("epochs", 3)),
+            "--lr", str(settings.get("learningRate", 2e-5)),
+            "--batch", str(settings.get("batchSize", 4)),
+            "--fp16", "1" if settings.get("fp16", True) else "0",
+            "--control-stdin",
+            *(["--progress-fd", str(progress_fd)] if progress_fd is not None else []),
+        ]
+    return [sys.executable, str(WORKER_SCRIPT), "--job-id", job_id, "--config", json.dumps(config)]
+
+
+def parse_worker_line(line: str) -> Optional[Dict[str, Any]]:
+    """Turn one JSON line from a worker into an event (other output is ignored)"""
+    if not line.startswith("{"):
+        return None
+    try:
+        event = json.loads(line)
+    except ValueError:
+        return None
+    return event if isinstance(event, dict) and "event" in event else None
+
+
+class TrainingScheduler:
+    """Queues training jobs and runs them on a bounded pool of worker processes"""
+
+    def __init__(self, on_event: EventHandler, max_workers: int = MAX_WORKERS,
+                 max_queued_jobs: int = MAX_QUEUED_JOBS):
+        self.max_workers = max(1, max_workers)
+        self.max_queued_jobs = max_queued_jobs
+        self._on_event = on_event
+        # صف جداگانه برای هر owner؛ dispatch به‌صورت round-robin بین owner ها
+        self._queues: "OrderedDict[str, Deque[Dict[str, Any]]]" = OrderedDict()
+        self._running: Dict[str, asyncio.Task] = {}
+        self._processes: Dict[str, asyncio.subprocess.Process] = {}
+        # job های صف که pause شده‌اند dispatch نمی‌شوند
+        self._held: Set[str] = set()
+        self._stopping: Set[str] = set()
+        # دستوری که قبل از بالا آمدن process رسیده است
+        self._pending_control: Dict[str, str] = {}
+
+    @property
+    def queued_count(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    @property
+    def running_count(self) -> int:
+        return len(self._running)
+
+    def submit(self, job_id: str, config: Dict[str, Any], owner: str = "default"):
+        """Queue a job; raises RuntimeError when the queue is full"""
+        if self.queued_count >= self.max_queued_jobs:
+            raise RuntimeError("Training queue is full")
+
+        self._queues.setdefault(owner, deque()).append({"id": job_id, "config": config})
+        self._dispatch()
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """Position of a queued job in dispatch order (0 = next)"""
+        for position, entry in enumerate(self._dispatch_order()):
+            if entry["id"] == job_id:
+                return position
+        return None
+
+    def _dispatch_order(self) -> List[Dict[str, Any]]:
+        queues = [list(queue) for queue in self._queues.values()]
+        order = []
+        for depth in range(max((len(queue) for queue in queues), default=0)):
+            order.extend(queue[depth] for queue in queues if depth < len(queue))
+        return order
+
+    def _next_job(self) -> Optional[Dict[str, Any]]:
+        for owner in list(self._queues):
+            queue = self._queues[owner]
+            self._queues.move_to_end(owner)
+            entry = next((entry for entry in queue if entry["id"] not in self._held), None)
+            if entry is not None:
+                queue.remove(entry)
+                if not queue:
+                    del self._queues[owner]
+                return entry
+        return None
+
+    def _remove_queued(self, job_id: str) -> bool:
+        for owner, queue in list(self._queues.items()):
+            for entry in queue:
+                if entry["id"] == job_id:
+                    queue.remove(entry)
+                    if not queue:
+                        del self._queues[owner]
+                    return True
+        return False
+
+    async def control(self, job_id: str, command: str) -> bool:
+        """Send pause/resume/stop to a queued or running job; False if the job is not active"""
+        if command not in CONTROL_COMMANDS:
+            raise ValueError(f"Unknown control command: {command}")
+
+        if job_id in self._running:
+            if command == "stop":
+                self._stopping.add(job_id)
+            process = self._processes.get(job_id)
+            if process is None:
+                self._pending_control[job_id] = command
+            else:
+                await self._send_control(job_id, process, command)
+            return True
+
+        if command == "stop":
+            if not self._remove_queued(job_id):
+                return False
+            self._held.discard(job_id)
+            await self._on_event(job_id, {"event": "stopped", "message": "Training stopped before start"})
+            return True
+
+        if self.queue_position(job_id) is None:
+            return False
+        if command == "pause":
+            self._held.add(job_id)
+            await self._on_event(job_id, {"event": "paused"})
+        else:
+            self._held.discard(job_id)
+            await self._on_event(job_id, {"event": "resumed", "queued": True})
+            self._dispatch()
+        return True
+
+    async def _send_control(self, job_id: str, process: asyncio.subprocess.Process, command: str):
+        try:
+            process.stdin.write(f"{command}\n".encode())
+            await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        if command == "stop":
+            asyncio.create_task(self._enforce_stop(job_id, process))
+
+    async def _enforce_stop(self, job_id: str, process: asyncio.subprocess.Process):
+        """Terminate a worker that ignores stop for longer than the grace period"""
+        try:
+            await asyncio.wait_for(process.wait(), STOP_GRACE_SECONDS)
+        except asyncio.TimeoutError:
+            logger.warning(f"Training job {job_id} ignored stop, terminating pid={process.pid}")
+            process.terminate()
+            try:
+                await asyncio.wait_for(process.wait(), 5)
+            except asyncio.TimeoutError:
+                process.kill()
+
+    def _dispatch(self):
+        while len(self._running) < self.max_workers:
+            entry = self._next_job()
+            if entry is None:
+                return
+            task = asyncio.create_task(self._run_job(entry["id"], entry["config"]))
+            self._running[entry["id"]] = task
+
+    async def _run_job(self, job_id: str, config: Dict[str, Any]):
+        stderr_tail: Deque[str] = deque(maxlen=20)
+        finished = False
+        progress_read = progress_write = None
+        transport = None
+        try:
+            if uses_progress_fd(config):
+                progress_read, progress_write = os.pipe()
+            process = await asyncio.create_subprocess_exec(
+                *build_command(job_id, config, progress_write),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                pass_fds=(progress_write,) if progress_write is not None else (),
+            )
+            if progress_write is not None:
+                # فقط worker باید سر نوشتن pipe را باز نگه دارد تا با پایان آن EOF برسد
+                os.close(progress_write)
+                progress_write = None
+            self._processes[job_id] = process
+            logger.info(f"Training job {job_id} dispatched to worker pid={process.pid}")
+            if job_id in self._pending_control:
+                await self._send_control(job_id, process, self._pending_control.pop(job_id))
+
+            async def drain_stderr():
+                async for raw in process.stderr:
+                    stderr_tail.append(raw.decode(errors="replace").rstrip())
+
+            async def consume(stream: asyncio.StreamReader):
+                nonlocal finished
+                async for raw in stream:
+                    event = parse_worker_line(raw.decode(errors="replace").strip())
+                    if event is None:
+                        continue
+                    if event["event"] == "log":
+                        logger.log(event.get("level", "info").upper(), f"[{job_id}] {event.get('message', '')}")
+                        continue
+                    finished = finished or event["event"] in ("completed", "failed", "stopped")
+                    await self._on_event(job_id, event)
+
+            stderr_task = asyncio.create_task(drain_stderr())
+            streams = [process.stdout]
+            if progress_read is not None:
+                reader = asyncio.StreamReader()
+                transport, _ = await asyncio.get_running_loop().connect_read_pipe(
+                    lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(progress_read, "rb", 0))
+                progress_read = None
+                streams.append(reader)
+            await asyncio.gather(*(consume(stream) for stream in streams))
+
+            returncode = await process.wait()
+            await stderr_task
+
+            if not finished:
+                if job_id in self._stopping:
+                    await self._on_event(job_id, {"event": "stopped", "message": "Training stopped"})
+                elif returncode == 0:
+                    await self._on_event(job_id, {"event": "completed", "message": "Training completed successfully!"})
+                else:
+                    error = stderr_tail[-1] if stderr_tail else f"Worker exited with code {returncode}"
+                    await self._on_event(job_id, {"event": "failed", "error": error})
+
+        except Exception as e:
+            logger.error(f"Training job {job_id} worker error: {str(e)}")
+            await self._on_event(job_id, {"event": "failed", "error": str(e)})
+
+        finally:
+            for fd in (progress_read, progress_write):
+                if fd is not None:
+                    os.close(fd)
+            if transport is not None:
+                transport.close()
+            self._processes.pop(job_id, None)
+            self._running.pop(job_id, None)
+            self._stopping.discard(job_id)
+            self._pending_control.pop(job_id, None)
+            self._dispatch()
+
+    async def shutdown(self):
+        """Terminate running workers and drop queued jobs"""
+        self._queues.clear()
+        self._stopping.update(self._processes)
+        for process in list(self._processes.values()):
+            if process.returncode is None:
+                process.terminate()
+        if self._running:
+            await asyncio.gather(*self._running.values(), return_exceptions=True)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Training worker process
+اجرای یک job آموزشی در یک process جداگانه؛ پیشرفت به‌صورت JSON lines روی stdout گزارش می‌شود
+دستورهای کنترلی (pause / resume / stop) هر کدام در یک خط از stdin خوانده می‌شوند
+Usage: python training_worker.py --job-id JOB_ID --config '<TrainingConfig JSON>'
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from datetime import datetime
+
+
+def emit(event: str, **fields):
+    """Write one progress event for the scheduler"""
+    sys.stdout.write(json.dumps({"event": event, **fields}) + "\n")
+    sys.stdout.flush()
+
+
+class ControlChannel:
+    """Pause/resume/stop commands from the scheduler, checked at step boundaries"""
+
+    def __init__(self, stream=sys.stdin):
+        self.stop_requested = threading.Event()
+        self.resumed = threading.Event()
+        self.resumed.set()
+        self._stream = stream
+        threading.Thread(target=self._listen, daemon=True).start()
+
+    def _listen(self):
+        for line in self._stream:
+            command = line.strip()
+            if command == "pause":
+                self.resumed.clear()
+            elif command == "resume":
+                self.resumed.set()
+            elif command == "stop":
+                self.stop()
+        # scheduler رفته است؛ ادامه‌ی کار فقط منابع را هدر می‌دهد
+        self.stop()
+
+    def stop(self):
+        self.stop_requested.set()
+        self.resumed.set()
+
+    def checkpoint(self, step: int) -> bool:
+        """Block while paused; return False when the job should stop"""
+        if not self.resumed.is_set() and not self.stop_requested.is_set():
+            emit("paused", step=step)
+            self.resumed.wait()
+            if not self.stop_requested.is_set():
+                emit("resumed", step=step)
+        return not self.stop_requested.is_set()
+
+
+def run(job_id: str, config: dict, control: ControlChannel):
+    """Run training process with fault tolerance"""
+    settings = config.get("config", {})
+
+    # Training configuration
+    epochs = settings.get("epochs", 10)
+    batch_size = settings.get("batchSize", 32)
+    learning_rate = settings.get("learningRate", 0.001)
+
+    # Enable fault tolerance
+    enable_auto_recovery = settings.get("enableAutoRecovery", True)
+    save_checkpoint_every = settings.get("saveCheckpointEvery", 100)
+
+    # Simulate training
+    total_steps = epochs * 100  # Simplified
+
+    emit("started", totalSteps=total_steps, batchSize=batch_size)
+
+    for step in range(total_steps):
+        if not control.checkpoint(step):
+            emit("stopped", step=step, message=f"Training stopped at step {step}")
+            return
+
+        # Simulate training step
+        time.sleep(0.1)  # Simulate computation
+
+        # Update metrics
+        train_loss = 2.0 - (step / total_steps) * 1.5  # Decreasing loss
+        val_loss = train_loss + 0.1
+
+        emit(
+            "progress",
+            progress=(step / total_steps) * 100,
+            message=f"Training epoch {step // 100 + 1}/{epochs}...",
+            metrics={
+                "epoch": step // 100,
+                "step": step,
+                "trainLoss": train_loss,
+                "valLoss": val_loss,
+                "learningRate": learning_rate * (1 - step / total_steps),  # LR decay
+                "throughput": 125.5,
+                "gradientNorm": 0.5 + (step % 10) * 0.05
+            }
+        )
+
+        # Save checkpoint
+        if step % save_checkpoint_every == 0 and step > 0:
+            checkpoint_id = f"ckpt-{job_id}-{step}"
+            emit("checkpoint", checkpoint={
+                "id": checkpoint_id,
+                "name": f"{config['modelName']}-step-{step}",
+                "path": f"/checkpoints/{checkpoint_id}.pt",
+                "createdAt": datetime.now().isoformat(),
+                "size": 524288000,  # 500MB
+                "metrics": {
+                    "valLoss": val_loss,
+                    "epoch": step // 100
+                },
+                "isBest": val_loss < 0.5
+            })
+
+        # Simulate random failure for testing auto-recovery
+        if enable_auto_recovery and step == total_steps // 2:
+            emit("log", level="warning", message=f"Simulating failure at step {step}")
+            # Auto-recovery would kick in here
+            time.sleep(2)
+            emit("log", level="info", message="Auto-recovery completed")
+
+    emit("completed", message="Training completed successfully!")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run one training job")
+    parser.add_argument("--job-id", required=True)
+    parser.add_argument("--config", required=True, help="TrainingConfig as JSON")
+    args = parser.parse_args()
+
+    try:
+        run(args.job_id, json.loads(args.config), ControlChannel())
+    except Exception as e:
+        emit("failed", error=str(e))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()